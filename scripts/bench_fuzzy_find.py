@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Compare fuzzy_match_paths with fuzzywuzzy's process.extract on a file list.
+
+Usage:
+    python bench_fuzzy_find.py [--root ROOT] [--repeat N] [--synthetic N] [--limit N] [QUERY...]
+
+sparc_cli must be importable, e.g. after `pip install -e .`.
+"""
+
+import argparse
+import random
+import string
+import time
+from typing import Callable, List
+
+from fuzzywuzzy import process
+
+from sparc_cli.project_files import get_project_files
+from sparc_cli.text.fuzzy import fuzzy_match_paths
+
+
+def synthetic_paths(count: int, seed: int = 0) -> List[str]:
+    """Random paths shaped like a source tree."""
+    rng = random.Random(seed)
+    words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(500)]
+    return [
+        '/'.join(rng.choices(words, k=rng.randint(1, 5))) + '/' + rng.choice(words) + rng.choice(['.py', '.md', '.ts'])
+        for _ in range(count)
+    ]
+
+
+def best_time(function: Callable[[], object], repeat: int) -> float:
+    """Fastest of repeat runs, in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    """Main entry point for the script."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--root', default='.', help='Project to list files from (default: current directory)')
+    parser.add_argument('queries', nargs='*', default=['config', 'agent utils', 'readme'])
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per query; the fastest counts')
+    parser.add_argument('--synthetic', type=int, help='Use this many random paths instead of ROOT')
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_intermixed_args()
+
+    paths = synthetic_paths(args.synthetic) if args.synthetic else get_project_files(args.root)
+    print(f"{len(paths)} paths, best of {args.repeat} runs")
+    print(f"{'query':<20} {'extract ms':>12} {'matcher ms':>12} {'speedup':>8}  top match")
+    for query in args.queries:
+        old = best_time(lambda: process.extract(query, paths, limit=args.limit), args.repeat)
+        new = best_time(lambda: fuzzy_match_paths(query, paths, limit=args.limit), args.repeat)
+        top = fuzzy_match_paths(query, paths, limit=1)
+        print(f"{query:<20} {old:>12.1f} {new:>12.1f} {old / new:>7.1f}x  {top[0][0] if top else '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ from .__version__ import __version__
 from .console.formatting import print_stage_header, print_task_header, print_error
 from .console.output import print_agent_output
 from .text.processing import truncate_output
-from .agent_utils import run_agent_with_retry
+from .agent_utils import run_agent_with_retry, arun_agent_with_retry
 
 __all__ = [
     'print_stage_header',
@@ -11,5 +11,6 @@ __all__ = [
     'truncate_output',
     'print_error',
     'run_agent_with_retry',
+    'arun_agent_with_retry',
     '__version__'
 ]
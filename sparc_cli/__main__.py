@@ -1,16 +1,24 @@
 import argparse
 import sys
 import uuid
+from dataclasses import fields
 from rich.panel import Panel
 from rich.console import Console
 from sparc_cli.console.formatting import print_interrupt
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.prebuilt import create_react_agent
 from sparc_cli.env import validate_environment
-from sparc_cli.tools.memory import _global_memory, get_related_files, get_memory_value
+from sparc_cli.tools.memory import (
+    _global_memory,
+    get_related_files,
+    get_memory_value,
+    set_memory_limits,
+    set_prompt_budgets,
+    MEMORY_LIMITS,
+    PROMPT_TOKEN_BUDGETS
+)
 from sparc_cli.tools.human import ask_human
-from sparc_cli.console.formatting import print_stage_header, print_error
+from sparc_cli.console.formatting import print_stage_header, print_error, print_trace_summary
 from sparc_cli.agent_utils import (
+    get_agent,
     run_agent_with_retry,
     run_research_agent,
     run_planning_agent
@@ -21,13 +29,41 @@ from sparc_cli.prompts import (
     EXPERT_PROMPT_SECTION_PLANNING,
     HUMAN_PROMPT_SECTION_PLANNING,
 )
-from sparc_cli.llm import initialize_llm
+from sparc_cli.llm import initialize_llm, configure_client_pool, set_provider_rate_limit, ClientPoolConfig
+from sparc_cli.session import SessionStore
+from sparc_cli.checkpoint import configure_checkpointer, DEFAULT_KEEP_CHECKPOINTS
+from sparc_cli.compaction import DEFAULT_MAX_PROMPT_TOKENS, DEFAULT_KEEP_TOOL_RESULTS, DEFAULT_TOOL_RESULT_MAX_TOKENS
+from sparc_cli.tools.agent import RESEARCH_BATCH_CONCURRENCY
+from sparc_cli.scheduler import DEFAULT_TASK_CONCURRENCY
+from sparc_cli.search_index import DEFAULT_INDEX_DB, get_search_index
+from sparc_cli.tools.ripgrep import SEARCH_ENGINES
+from sparc_cli.tracing import (
+    JsonlSpanExporter,
+    OpenTelemetrySpanExporter,
+    configure_tracing,
+    shutdown_tracing,
+    summarize_spans,
+    trace_span
+)
 
 from sparc_cli.tool_configs import (
     get_planning_tools,
     get_chat_tools
 )
 
+LLM_POOL_SETTINGS = [field.name for field in fields(ClientPoolConfig)]
+PROVIDERS = ['anthropic', 'openai', 'openrouter', 'openai-compatible']
+
+def parse_overrides(parser, flag: str, items: list, valid_keys) -> dict:
+    """Parse repeated KEY=N overrides, exiting with a usage error if any is invalid."""
+    overrides = {}
+    for item in items:
+        key, _, value = item.partition('=')
+        if key not in valid_keys or not value.isdigit() or int(value) < 1:
+            parser.error(f"Invalid {flag} '{item}': expected KEY=N with KEY one of {', '.join(valid_keys)} and N >= 1")
+        overrides[key] = int(value)
+    return overrides
+
 def parse_arguments():
     parser = argparse.ArgumentParser(
         description='SPARC CLI - AI Agent for executing programming and research tasks',
@@ -36,6 +72,8 @@ def parse_arguments():
 Examples:
     sparc -m "Add error handling to the database module"
     sparc -m "Explain the authentication flow" --research-only
+    sparc -m "Add rate limiting" --session rate-limit
+    sparc --session rate-limit --resume
         '''
     )
     parser.add_argument(
@@ -57,7 +95,7 @@ Examples:
         '--provider',
         type=str,
         default='anthropic',
-        choices=['anthropic', 'openai', 'openrouter', 'openai-compatible'],
+        choices=PROVIDERS,
         help='The LLM provider to use'
     )
     parser.add_argument(
@@ -92,8 +130,145 @@ Examples:
         action='store_true',
         help='Enable chat mode with direct human interaction (implies --hil)'
     )
+    parser.add_argument(
+        '--session',
+        type=str,
+        metavar='ID',
+        help='Persist agent memory under this session ID so the run can be resumed'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Resume the session given by --session, skipping stages that already finished'
+    )
+    parser.add_argument(
+        '--checkpoint-db',
+        type=str,
+        default=':memory:',
+        metavar='PATH',
+        help='SQLite file for agent conversation checkpoints (default: in-memory database)'
+    )
+    parser.add_argument(
+        '--keep-checkpoints',
+        type=int,
+        default=DEFAULT_KEEP_CHECKPOINTS,
+        metavar='N',
+        help=f'Checkpoints kept per agent thread (default: {DEFAULT_KEEP_CHECKPOINTS})'
+    )
+    parser.add_argument(
+        '--memory-limit',
+        action='append',
+        default=[],
+        metavar='TYPE=N',
+        help=f"Override a memory limit for this run (can be repeated). Types: {', '.join(MEMORY_LIMITS)}"
+    )
+    parser.add_argument(
+        '--prompt-budget',
+        action='append',
+        default=[],
+        metavar='SECTION=TOKENS',
+        help=f"Override the token budget of a memory section in prompts (can be repeated). Sections: {', '.join(PROMPT_TOKEN_BUDGETS)}"
+    )
+    parser.add_argument(
+        '--max-prompt-tokens',
+        type=int,
+        default=None,
+        metavar='N',
+        help=f'Token limit for initial agent prompts; memory sections are compacted to fit (default: {DEFAULT_MAX_PROMPT_TOKENS})'
+    )
+    parser.add_argument(
+        '--keep-tool-results',
+        type=int,
+        default=None,
+        metavar='K',
+        help=f'Most recent tool results always sent to the model in full (default: {DEFAULT_KEEP_TOOL_RESULTS})'
+    )
+    parser.add_argument(
+        '--tool-result-tokens',
+        type=int,
+        default=None,
+        metavar='N',
+        help=f'Older tool results above this size are elided from model calls; 0 elides all (default: {DEFAULT_TOOL_RESULT_MAX_TOKENS})'
+    )
+    parser.add_argument(
+        '--research-concurrency',
+        type=int,
+        default=None,
+        metavar='N',
+        help=f'Maximum research agents a research batch runs at once (default: {RESEARCH_BATCH_CONCURRENCY})'
+    )
+    parser.add_argument(
+        '--task-concurrency',
+        type=int,
+        default=None,
+        metavar='N',
+        help=f'Maximum planned tasks implemented at once (default: {DEFAULT_TASK_CONCURRENCY})'
+    )
+    parser.add_argument(
+        '--rate-limit',
+        action='append',
+        default=[],
+        metavar='PROVIDER=RPM',
+        help=f"Limit requests per minute to a provider across all agents (can be repeated). Providers: {', '.join(PROVIDERS)}"
+    )
+    parser.add_argument(
+        '--llm-pool',
+        action='append',
+        default=[],
+        metavar='SETTING=N',
+        help=f"Tune LLM client connection pooling (can be repeated). Settings: {', '.join(LLM_POOL_SETTINGS)}"
+    )
+    parser.add_argument(
+        '--search-engine',
+        choices=SEARCH_ENGINES,
+        default=None,
+        help="Default engine of ripgrep_search: 'rg' scans every file, 'index' only the files a trigram index says may match (default: rg)"
+    )
+    parser.add_argument(
+        '--rebuild-index',
+        action='store_true',
+        help=f'Rebuild the trigram search index in {DEFAULT_INDEX_DB} and exit'
+    )
+    parser.add_argument(
+        '--trace',
+        type=str,
+        default=None,
+        metavar='PATH',
+        help='Trace stages, agent runs, model and tool calls to a JSONL file and print a timing summary at the end'
+    )
+    parser.add_argument(
+        '--trace-otel',
+        action='store_true',
+        help='Also send trace spans to the OpenTelemetry tracer provider (requires opentelemetry-api)'
+    )
     
     args = parser.parse_args()
+
+    args.memory_limit = parse_overrides(parser, '--memory-limit', args.memory_limit, MEMORY_LIMITS)
+    args.prompt_budget = parse_overrides(parser, '--prompt-budget', args.prompt_budget, PROMPT_TOKEN_BUDGETS)
+    args.llm_pool = parse_overrides(parser, '--llm-pool', args.llm_pool, LLM_POOL_SETTINGS)
+    args.rate_limit = parse_overrides(parser, '--rate-limit', args.rate_limit, PROVIDERS)
+
+    if args.resume and not args.session:
+        parser.error("--resume requires --session")
+
+    if args.keep_checkpoints < 1:
+        parser.error("--keep-checkpoints must be at least 1")
+
+    if args.max_prompt_tokens is not None and args.max_prompt_tokens < 1:
+        parser.error("--max-prompt-tokens must be at least 1")
+
+    if args.keep_tool_results is not None and args.keep_tool_results < 0:
+        parser.error("--keep-tool-results must not be negative")
+
+    if args.tool_result_tokens is not None and args.tool_result_tokens < 0:
+        parser.error("--tool-result-tokens must not be negative")
+
+    if args.research_concurrency is not None and args.research_concurrency < 1:
+        parser.error("--research-concurrency must be at least 1")
+
+    if args.task_concurrency is not None and args.task_concurrency < 1:
+        parser.error("--task-concurrency must be at least 1")
     
     # Set hil=True when chat mode is enabled
     if args.chat:
@@ -115,11 +290,6 @@ Examples:
 # Create console instance
 console = Console()
 
-# Create individual memory objects for each agent
-research_memory = MemorySaver()
-planning_memory = MemorySaver()
-implementation_memory = MemorySaver()
-
 
 def is_informational_query() -> bool:
     """Determine if the current query is informational based on implementation_requested state."""
@@ -131,8 +301,47 @@ def is_stage_requested(stage: str) -> bool:
         return _global_memory.get('implementation_requested', False)
     return False
 
+def open_session(args) -> SessionStore:
+    """Open the session given by --session, restoring its memory when resuming.
+
+    When resuming without -m, the session's stored base task is used.
+    Without --resume, any previous state stored under the session ID is discarded.
+    """
+    session = SessionStore(args.session)
+    if args.resume:
+        if not session.exists():
+            session.close()
+            print_error(f"No session found with ID '{args.session}'")
+            sys.exit(1)
+        session.restore()
+        if not args.message:
+            args.message = session.base_task
+        console.print(Panel(
+            f"Resumed session [bold]{args.session}[/bold]",
+            title="💾 Session",
+            border_style="green"
+        ))
+    else:
+        session.reset()
+    session.start(args.message)
+    return session
+
+def create_span_exporters(args) -> list:
+    """Create the trace exporters requested by --trace and --trace-otel, exiting if one is unavailable."""
+    exporters = []
+    try:
+        if args.trace:
+            exporters.append(JsonlSpanExporter(args.trace))
+        if args.trace_otel:
+            exporters.append(OpenTelemetrySpanExporter())
+    except (ImportError, OSError) as e:
+        print_error(f"Cannot enable tracing: {e}")
+        sys.exit(1)
+    return exporters
+
 def main():
     """Main entry point for the sparc command line tool."""
+    session = None
     try:
         args = parse_arguments()
 
@@ -141,6 +350,29 @@ def main():
             from sparc_cli.non_interactive import handle_non_interactive
             handle_non_interactive()
             return
+
+        if args.rebuild_index:
+            with console.status("Rebuilding search index..."):
+                update = get_search_index().rebuild()
+            console.print(Panel(
+                f"Indexed {update.indexed} of {update.files} files in {DEFAULT_INDEX_DB}",
+                title="🔎 Search Index",
+                border_style="green"
+            ))
+            return
+
+        if args.memory_limit:
+            set_memory_limits(args.memory_limit)
+        if args.prompt_budget:
+            set_prompt_budgets(args.prompt_budget)
+        if args.llm_pool:
+            configure_client_pool(**args.llm_pool)
+        for provider, requests_per_minute in args.rate_limit.items():
+            set_provider_rate_limit(provider, requests_per_minute)
+        checkpointer = configure_checkpointer(args.checkpoint_db, args.keep_checkpoints)
+        if args.trace or args.trace_otel:
+            configure_tracing(create_span_exporters(args))
+
         expert_enabled, expert_missing = validate_environment(args)  # Will exit if main env vars missing
         
         if expert_missing:
@@ -155,6 +387,9 @@ def main():
         # Create the base model after validation
         model = initialize_llm(args.provider, args.model)
 
+        if args.session:
+            session = open_session(args)
+
         # If no message is provided, default to chat mode
         if not args.message:
             args.chat = True
@@ -167,13 +402,6 @@ def main():
             # Get initial request from user
             initial_request = ask_human.invoke({"question": "What would you like help with?"})
 
-            # Create chat agent with appropriate tools
-            chat_agent = create_react_agent(
-                model,
-                get_chat_tools(expert_enabled=expert_enabled),
-                checkpointer=MemorySaver()
-            )
-            
             # Run chat agent with CHAT_PROMPT
             config = {
                 "configurable": {"thread_id": uuid.uuid4()},
@@ -183,16 +411,34 @@ def main():
                 "hil": True,  # Always true in chat mode
                 "initial_request": initial_request
             }
+            if args.max_prompt_tokens:
+                config['max_prompt_tokens'] = args.max_prompt_tokens
+            if args.research_concurrency:
+                config['research_concurrency'] = args.research_concurrency
+            if args.keep_tool_results is not None:
+                config['keep_tool_results'] = args.keep_tool_results
+            if args.tool_result_tokens is not None:
+                config['tool_result_max_tokens'] = args.tool_result_tokens
+            if args.search_engine:
+                config['search_engine'] = args.search_engine
             
             # Store config in global memory
             _global_memory['config'] = config
             _global_memory['config']['expert_provider'] = args.expert_provider
             _global_memory['config']['expert_model'] = args.expert_model
             
+            # Create chat agent with appropriate tools
+            chat_agent = get_agent(
+                model,
+                get_chat_tools(expert_enabled=expert_enabled),
+                checkpointer=checkpointer
+            )
+            
             # Run chat agent in a loop
             while True:
                 try:
-                    run_agent_with_retry(chat_agent, CHAT_PROMPT.format(initial_request=initial_request), config)
+                    with trace_span('chat', 'stage'):
+                        run_agent_with_retry(chat_agent, CHAT_PROMPT.format(initial_request=initial_request), config)
                     # Get next request from user
                     initial_request = ask_human.invoke({"question": "What else would you like help with?"})
                 except KeyboardInterrupt:
@@ -206,6 +452,18 @@ def main():
             "research_only": args.research_only,
             "cowboy_mode": args.cowboy_mode
         }
+        if args.max_prompt_tokens:
+            config['max_prompt_tokens'] = args.max_prompt_tokens
+        if args.research_concurrency:
+            config['research_concurrency'] = args.research_concurrency
+        if args.task_concurrency:
+            config['task_concurrency'] = args.task_concurrency
+        if args.keep_tool_results is not None:
+            config['keep_tool_results'] = args.keep_tool_results
+        if args.tool_result_tokens is not None:
+            config['tool_result_max_tokens'] = args.tool_result_tokens
+        if args.search_engine:
+            config['search_engine'] = args.search_engine
     
         # Store config in global memory for access by is_informational_query
         _global_memory['config'] = config
@@ -218,34 +476,53 @@ def main():
         _global_memory['config']['expert_provider'] = args.expert_provider
         _global_memory['config']['expert_model'] = args.expert_model
         
+        # Each stage runs on its own checkpointer thread, deleted when the stage ends
+        stage_config = {key: value for key, value in config.items() if key != 'configurable'}
+
         # Run research stage
-        print_stage_header("Research Stage")
-        
-        run_research_agent(
-            base_task,
-            model,
-            expert_enabled=expert_enabled,
-            research_only=args.research_only,
-            hil=args.hil,
-            memory=research_memory,
-            config=config
-        )
-        
-        # Proceed with planning and implementation if not an informational query
-        if not is_informational_query():
-            # Run planning agent
-            run_planning_agent(
+        if session and session.is_stage_completed('research'):
+            print_stage_header("Skipping Research Stage")
+        else:
+            print_stage_header("Research Stage")
+            
+            run_research_agent(
                 base_task,
                 model,
                 expert_enabled=expert_enabled,
+                research_only=args.research_only,
                 hil=args.hil,
-                memory=planning_memory,
-                config=config
+                memory=checkpointer,
+                config=stage_config
             )
+            if session:
+                session.complete_stage('research')
+        
+        # Proceed with planning and implementation if not an informational query
+        if not is_informational_query():
+            if session and session.is_stage_completed('planning'):
+                print_stage_header("Skipping Planning Stage")
+            else:
+                # Run planning agent
+                run_planning_agent(
+                    base_task,
+                    model,
+                    expert_enabled=expert_enabled,
+                    hil=args.hil,
+                    memory=checkpointer,
+                    config=stage_config
+                )
+                if session:
+                    session.complete_stage('planning')
 
     except KeyboardInterrupt:
         print_interrupt("Operation cancelled by user")
         sys.exit(1)
+    finally:
+        if session:
+            session.close()
+        spans = shutdown_tracing()
+        if spans:
+            print_trace_summary(summarize_spans(spans))
 
 if __name__ == "__main__":
     main()
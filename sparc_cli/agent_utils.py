@@ -1,8 +1,15 @@
 """Utility functions for working with agents."""
 
+import asyncio
+import contextvars
+import inspect
+import json
 import time
 import uuid
-from typing import Optional, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Any, List, Tuple, Union
 
 import signal
 import threading
@@ -33,14 +40,26 @@ from langgraph.checkpoint.memory import MemorySaver
 
 from langchain_core.messages import HumanMessage
 from langchain_core.messages import BaseMessage
-from anthropic import APIError, APITimeoutError, RateLimitError, InternalServerError
 from rich.console import Console
 from rich.markdown import Markdown
 from rich.panel import Panel
 
+from sparc_cli.checkpoint import get_checkpointer
+from sparc_cli.llm import release_loop_clients
+from sparc_cli.compaction import (
+    CompactablePrompt,
+    ToolHistoryCompactor,
+    DEFAULT_KEEP_TOOL_RESULTS,
+    DEFAULT_MAX_PROMPT_TOKENS,
+    DEFAULT_TOOL_RESULT_MAX_TOKENS
+)
+from sparc_cli.retry import CircuitOpenError, RetryPolicy, error_status_code, get_circuit_breaker
+from sparc_cli.text.tokens import count_tokens
+from sparc_cli.tracing import trace_span, traced_config
 from sparc_cli.tools.memory import (
     _global_memory,
-    get_memory_value,
+    get_memory_store,
+    get_packed_memory_value,
     get_related_files,
 )
 from sparc_cli.tool_configs import get_research_tools
@@ -53,6 +72,107 @@ from sparc_cli.prompts import (
 
 console = Console()
 
+# Retries for agent runs: capped, jittered backoff that honors Retry-After.
+# The circuit breaker of the run's provider is shared by all agents.
+AGENT_RETRY_POLICY = RetryPolicy(max_retries=20, base_delay=1.0, max_delay=60.0)
+
+# Maximum number of compiled agent graphs kept by get_agent()
+AGENT_CACHE_SIZE = 16
+
+# (model key, tool IDs, config) -> (compiled graph, tools kept alive so their IDs stay unique)
+_agent_cache: "OrderedDict[Tuple[Any, ...], Tuple[Any, List[Any]]]" = OrderedDict()
+_agent_cache_lock = threading.Lock()
+
+# Whether create_react_agent takes a pre_model_hook (langgraph-prebuilt 0.1.8+)
+_SUPPORTS_PRE_MODEL_HOOK = 'pre_model_hook' in inspect.signature(create_react_agent).parameters
+
+def _model_key(model) -> Tuple[str, str]:
+    """Identify a chat model by its class and provider/model settings."""
+    params = dict(getattr(model, '_identifying_params', None) or {'id': id(model)})
+    for attr in ('openai_api_base', 'anthropic_api_url', 'base_url'):
+        if getattr(model, attr, None) is not None:
+            params[attr] = getattr(model, attr)
+    model_class = type(model)
+    return f"{model_class.__module__}.{model_class.__qualname__}", json.dumps(params, sort_keys=True, default=str)
+
+def get_agent(model, tools: List[Any], checkpointer: Optional[Any] = None):
+    """Get a ReAct agent for a model and toolset, reusing a compiled graph when possible.
+
+    Graphs are compiled without a checkpointer and cached by model (class and
+    identifying parameters), tool identity and the current run config, so a
+    config change never reuses a stale graph. The least recently used graph
+    is dropped beyond AGENT_CACHE_SIZE entries. Each call gets a cheap copy
+    bound to its own checkpointer.
+
+    Old, large tool results are elided from model calls by a
+    ToolHistoryCompactor configured from the 'keep_tool_results' and
+    'tool_result_max_tokens' config keys. With a langgraph too old for
+    pre-model hooks, tool results are sent in full.
+
+    Args:
+        model: The LLM model to use
+        tools: Tools available to the agent
+        checkpointer: Checkpointer for the returned agent
+
+    Returns:
+        The compiled agent graph
+    """
+    key = (
+        _model_key(model),
+        tuple(id(tool) for tool in tools),
+        json.dumps(_global_memory.get('config', {}), sort_keys=True, default=str)
+    )
+    with _agent_cache_lock:
+        entry = _agent_cache.get(key)
+        if entry is not None:
+            _agent_cache.move_to_end(key)
+
+    if entry is None:
+        run_config = _global_memory.get('config', {})
+        compactor = ToolHistoryCompactor(
+            keep_recent=run_config.get('keep_tool_results', DEFAULT_KEEP_TOOL_RESULTS),
+            max_tokens=run_config.get('tool_result_max_tokens', DEFAULT_TOOL_RESULT_MAX_TOKENS)
+        )
+        if _SUPPORTS_PRE_MODEL_HOOK:
+            agent = create_react_agent(model, tools, pre_model_hook=compactor)
+        else:
+            agent = create_react_agent(model, tools)
+        entry = (agent, list(tools))
+        with _agent_cache_lock:
+            _agent_cache[key] = entry
+            while len(_agent_cache) > AGENT_CACHE_SIZE:
+                _agent_cache.popitem(last=False)
+
+    return entry[0].copy(update={'checkpointer': checkpointer})
+
+def clear_agent_cache() -> None:
+    """Drop all cached agent graphs."""
+    with _agent_cache_lock:
+        _agent_cache.clear()
+
+def _runner_config(thread_id: str, config: Optional[dict]) -> dict:
+    """Build the run config for a runner's checkpointer thread.
+
+    The caller's 'configurable' is dropped: tools pass the session config,
+    which in chat mode carries the chat's thread, and a sub-agent must not
+    load or write that thread's history.
+    """
+    run_config = {"recursion_limit": 100}
+    if config:
+        run_config.update((key, value) for key, value in config.items() if key != 'configurable')
+    run_config["configurable"] = {"thread_id": thread_id}
+    return run_config
+
+def _run_agent_thread(agent, prompt: Union[str, CompactablePrompt], run_config: dict, memory, owns_thread: bool,
+                      stage: str) -> Optional[str]:
+    """Run an agent as a traced stage, deleting its checkpointer thread afterwards if the runner created it."""
+    try:
+        with trace_span(stage, 'stage'):
+            return run_agent_with_retry(agent, prompt, run_config)
+    finally:
+        if owns_thread:
+            memory.delete_thread(run_config["configurable"]["thread_id"])
+
 def run_research_agent(
     base_task_or_query: str,
     model,
@@ -91,9 +211,10 @@ def run_research_agent(
     """
     # Initialize memory if not provided
     if memory is None:
-        memory = MemorySaver()
+        memory = get_checkpointer() or MemorySaver()
 
-    # Set up thread ID
+    # Set up thread ID; threads created here are deleted when the run ends
+    owns_thread = thread_id is None
     if thread_id is None:
         thread_id = str(uuid.uuid4())
 
@@ -105,42 +226,41 @@ def run_research_agent(
     )
 
     # Create agent
-    agent = create_react_agent(model, tools, checkpointer=memory)
+    agent = get_agent(model, tools, checkpointer=memory)
 
     # Format prompt sections
     expert_section = EXPERT_PROMPT_SECTION_RESEARCH if expert_enabled else ""
     human_section = HUMAN_PROMPT_SECTION_RESEARCH if hil else ""
     
     # Get research context from memory
-    key_facts = _global_memory.get("key_facts", "")
-    code_snippets = _global_memory.get("code_snippets", "")
-    related_files = _global_memory.get("related_files", "")
+    key_facts = get_packed_memory_value('key_facts')
+    code_snippets = get_packed_memory_value('key_snippets')
+    related_files = "\n".join(get_related_files())
     
     # Build prompt
-    prompt = (RESEARCH_ONLY_PROMPT if research_only else RESEARCH_PROMPT).format(
-        base_task=base_task_or_query,
-        research_only_note='' if research_only else ' Only request implementation if the user explicitly asked for changes to be made.',
-        expert_section=expert_section,
-        human_section=human_section,
-        key_facts=key_facts,
-        code_snippets=code_snippets,
-        related_files=related_files
+    prompt = CompactablePrompt(
+        RESEARCH_ONLY_PROMPT if research_only else RESEARCH_PROMPT,
+        dict(
+            base_task=base_task_or_query,
+            research_only_note='' if research_only else ' Only request implementation if the user explicitly asked for changes to be made.',
+            expert_section=expert_section,
+            human_section=human_section,
+            key_facts=key_facts,
+            code_snippets=code_snippets,
+            related_files=related_files
+        ),
+        sections={'code_snippets': 'key_snippets', 'key_facts': 'key_facts'}
     )
 
     # Set up configuration
-    run_config = {
-         "configurable": {"thread_id": thread_id},
-        "recursion_limit": 100
-    }
-    if config:
-        run_config.update(config)
+    run_config = _runner_config(thread_id, config)
 
     # Display console message if provided
     if console_message:
         console.print(Panel(Markdown(console_message), title="🔬 Looking into it..."))
 
     # Run agent with retry logic
-    return run_agent_with_retry(agent, prompt, run_config)
+    return _run_agent_thread(agent, prompt, run_config, memory, owns_thread, 'research')
 
 def run_planning_agent(
     base_task: str,
@@ -168,9 +288,10 @@ def run_planning_agent(
     """
     # Initialize memory if not provided
     if memory is None:
-        memory = MemorySaver()
+        memory = get_checkpointer() or MemorySaver()
 
-    # Set up thread ID
+    # Set up thread ID; threads created here are deleted when the run ends
+    owns_thread = thread_id is None
     if thread_id is None:
         thread_id = str(uuid.uuid4())
 
@@ -178,35 +299,34 @@ def run_planning_agent(
     tools = get_planning_tools(expert_enabled=expert_enabled)
 
     # Create agent
-    agent = create_react_agent(model, tools, checkpointer=memory)
+    agent = get_agent(model, tools, checkpointer=memory)
 
     # Format prompt sections
     expert_section = EXPERT_PROMPT_SECTION_PLANNING if expert_enabled else ""
     human_section = HUMAN_PROMPT_SECTION_PLANNING if hil else ""
     
     # Build prompt
-    planning_prompt = PLANNING_PROMPT.format(
-        expert_section=expert_section,
-        human_section=human_section,
-        base_task=base_task,
-        research_notes=get_memory_value('research_notes'),
-        related_files="\n".join(get_related_files()),
-        key_facts=get_memory_value('key_facts'),
-        key_snippets=get_memory_value('key_snippets'),
-        research_only_note='' if config.get('research_only') else ' Only request implementation if the user explicitly asked for changes to be made.'
+    planning_prompt = CompactablePrompt(
+        PLANNING_PROMPT,
+        dict(
+            expert_section=expert_section,
+            human_section=human_section,
+            base_task=base_task,
+            research_notes=get_packed_memory_value('research_notes'),
+            related_files="\n".join(get_related_files()),
+            key_facts=get_packed_memory_value('key_facts'),
+            key_snippets=get_packed_memory_value('key_snippets'),
+            research_only_note='' if config.get('research_only') else ' Only request implementation if the user explicitly asked for changes to be made.'
+        ),
+        sections={'key_snippets': 'key_snippets', 'research_notes': 'research_notes', 'key_facts': 'key_facts'}
     )
 
     # Set up configuration
-    run_config = {
-        "configurable": {"thread_id": thread_id},
-        "recursion_limit": 100
-    }
-    if config:
-        run_config.update(config)
+    run_config = _runner_config(thread_id, config)
 
     # Run agent with retry logic
     print_stage_header("Planning Stage")
-    return run_agent_with_retry(agent, planning_prompt, run_config)
+    return _run_agent_thread(agent, planning_prompt, run_config, memory, owns_thread, 'planning')
 
 def run_task_implementation_agent(
     base_task: str,
@@ -239,9 +359,10 @@ def run_task_implementation_agent(
     """
     # Initialize memory if not provided
     if memory is None:
-        memory = MemorySaver()
+        memory = get_checkpointer() or MemorySaver()
 
-    # Set up thread ID
+    # Set up thread ID; threads created here are deleted when the run ends
+    owns_thread = thread_id is None
     if thread_id is None:
         thread_id = str(uuid.uuid4())
 
@@ -249,81 +370,153 @@ def run_task_implementation_agent(
     tools = get_implementation_tools(expert_enabled=expert_enabled)
 
     # Create agent
-    agent = create_react_agent(model, tools, checkpointer=memory)
+    agent = get_agent(model, tools, checkpointer=memory)
 
     # Build prompt
-    prompt = IMPLEMENTATION_PROMPT.format(
-        base_task=base_task,
-        task=task,
-        tasks=tasks,
-        plan=plan,
-        related_files=related_files,
-        key_facts=get_memory_value('key_facts'),
-        key_snippets=get_memory_value('key_snippets'),
-        expert_section=EXPERT_PROMPT_SECTION_IMPLEMENTATION if expert_enabled else "",
-        human_section=HUMAN_PROMPT_SECTION_IMPLEMENTATION if _global_memory.get('config', {}).get('hil', False) else ""
+    prompt = CompactablePrompt(
+        IMPLEMENTATION_PROMPT,
+        dict(
+            base_task=base_task,
+            task=task,
+            tasks=tasks,
+            plan=plan,
+            related_files=related_files,
+            key_facts=get_packed_memory_value('key_facts'),
+            key_snippets=get_packed_memory_value('key_snippets'),
+            expert_section=EXPERT_PROMPT_SECTION_IMPLEMENTATION if expert_enabled else "",
+            human_section=HUMAN_PROMPT_SECTION_IMPLEMENTATION if _global_memory.get('config', {}).get('hil', False) else ""
+        ),
+        sections={'key_snippets': 'key_snippets', 'key_facts': 'key_facts'}
     )
 
     # Set up configuration
-    run_config = {
-        "configurable": {"thread_id": thread_id},
-        "recursion_limit": 100
-    }
-    if config:
-        run_config.update(config)
+    run_config = _runner_config(thread_id, config)
 
     # Run agent with retry logic
-    return run_agent_with_retry(agent, prompt, run_config)
+    return _run_agent_thread(agent, prompt, run_config, memory, owns_thread, 'implementation')
 
-_CONTEXT_STACK = []
-_INTERRUPT_CONTEXT = None
+class AgentCancelGroup:
+    """Agent runs that Ctrl-C cancels together, see agent_cancel_group()."""
 
-def _request_interrupt(signum, frame):
-    global _INTERRUPT_CONTEXT
-    if _CONTEXT_STACK:
-        _INTERRUPT_CONTEXT = _CONTEXT_STACK[-1]
-
-class InterruptibleSection:
-    def __enter__(self):
-        _CONTEXT_STACK.append(self)
-        return self
-    
-    def __exit__(self, exc_type, exc_value, traceback):
-        _CONTEXT_STACK.remove(self)
+    def __init__(self):
+        self.cancelled = False
 
-def check_interrupt():
-    if _CONTEXT_STACK and _INTERRUPT_CONTEXT is _CONTEXT_STACK[-1]:
-        raise KeyboardInterrupt("Interrupt requested")
+_cancel_group: contextvars.ContextVar[Optional[AgentCancelGroup]] = contextvars.ContextVar(
+    'sparc_agent_cancel_group', default=None
+)
 
-def run_agent_with_retry(agent, prompt: str, config: dict) -> Optional[str]:
-    original_handler = None
-    if threading.current_thread() is threading.main_thread():
-        original_handler = signal.getsignal(signal.SIGINT)
-        signal.signal(signal.SIGINT, _request_interrupt)
+@contextmanager
+def agent_cancel_group():
+    """Make agent runs started in this context (and copies of it) one cancel group.
 
-    max_retries = 20
-    base_delay = 1
+    Cancelling any run of the group cancels all of them, and runs of the group
+    started afterwards raise KeyboardInterrupt right away.
+
+    Yields:
+        The AgentCancelGroup
+    """
+    group = AgentCancelGroup()
+    token = _cancel_group.set(group)
+    try:
+        yield group
+    finally:
+        _cancel_group.reset(token)
 
-    with InterruptibleSection():
+# Agent runs started through the sync API, innermost last: (cancel group, event loop, task)
+_RUNNING_AGENTS: List[Tuple[AgentCancelGroup, asyncio.AbstractEventLoop, "asyncio.Task[Any]"]] = []
+_running_agents_lock = threading.Lock()
+
+def cancel_innermost_agent() -> bool:
+    """Cancel the most recently started agent run, with the rest of its cancel group.
+
+    Returns:
+        True if a running agent was cancelled
+    """
+    with _running_agents_lock:
+        if not _RUNNING_AGENTS:
+            return False
+        group = _RUNNING_AGENTS[-1][0]
+        group.cancelled = True
+        runs = [(loop, task) for run_group, loop, task in _RUNNING_AGENTS if run_group is group]
+    for loop, task in runs:
         try:
-            # Track agent execution depth
-            current_depth = _global_memory.get('agent_depth', 0)
-            _global_memory['agent_depth'] = current_depth + 1
-            
-            for attempt in range(max_retries):
-                check_interrupt()
+            loop.call_soon_threadsafe(task.cancel)
+        except RuntimeError:
+            pass  # The run finished and closed its loop meanwhile
+    return True
+
+def _request_interrupt(signum, frame):
+    if not cancel_innermost_agent():
+        raise KeyboardInterrupt
+
+def _fit_prompt(prompt: Union[str, CompactablePrompt], max_tokens: int) -> str:
+    """Render a prompt within a token limit, compacting memory sections if needed."""
+    if not isinstance(prompt, CompactablePrompt):
+        return prompt
+    text = prompt.render(max_tokens)
+    if count_tokens(text) < count_tokens(prompt.render()):
+        print_error(f"Prompt compacted to fit within {max_tokens} tokens: lower-priority memory was left out.")
+    return text
+
+async def arun_agent_with_retry(agent, prompt: Union[str, CompactablePrompt], config: dict) -> Optional[str]:
+    """Run an agent on a prompt with agent.astream(), retrying transient API errors with backoff.
+
+    The token count of the prompt is checked before the first call.
+    Compactable prompts over the limit (config 'max_prompt_tokens', falling
+    back to the run config in memory) have their memory sections shrunk
+    rather than their text cut.
+
+    Transient errors are retried per AGENT_RETRY_POLICY; other errors are
+    raised at once. Calls count against the circuit breaker of the configured
+    provider, and a run waits while another agent has found it failing.
+
+    Cancel the task running this coroutine to stop the agent; the
+    cancellation is raised from the stream or the backoff sleep.
+
+    When tracing is on, the run is traced with its retries, and its model
+    and tool calls as child spans.
+    """
+    memory_store = get_memory_store()
+    provider = _global_memory.get('config', {}).get('provider', 'anthropic')
+    policy = AGENT_RETRY_POLICY
+    breaker = get_circuit_breaker(provider)
+    policy.on_call(provider)
+
+    max_prompt_tokens = config.get(
+        'max_prompt_tokens',
+        _global_memory.get('config', {}).get('max_prompt_tokens', DEFAULT_MAX_PROMPT_TOKENS)
+    )
+    compactable = prompt if isinstance(prompt, CompactablePrompt) else None
+    prompt = _fit_prompt(prompt, max_prompt_tokens)
+
+    try:
+        # Track agent execution depth
+        depth = memory_store.increment('agent_depth')
+
+        # Model and tool calls are traced as children of this run
+        with trace_span('agent', 'agent', provider=provider, depth=depth) as span:
+            config = traced_config(config)
+            attempt = 0
+            while True:
+                wait = breaker.acquire()
+                if wait:
+                    # Another agent found the provider failing; wait for its circuit to half-open
+                    if attempt >= policy.max_retries:
+                        raise CircuitOpenError(provider, wait)
+                    print_error(f"{provider} is failing repeatedly. Waiting {wait:.0f}s before retrying... (Attempt {attempt+1}/{policy.max_retries})")
+                    await asyncio.sleep(wait)
+                    span.add('retries')
+                    attempt += 1
+                    continue
+
+                start = time.monotonic()
                 try:
-                    for chunk in agent.stream({"messages": [HumanMessage(content=prompt)]}, config):
-                        check_interrupt()
+                    async for chunk in agent.astream({"messages": [HumanMessage(content=prompt)]}, config):
                         print_agent_output(chunk)
-                    if not config.get('chat_mode'):
-                        return "Agent run completed successfully"
-                    return None
-                except KeyboardInterrupt:
-                    raise
-                except (InternalServerError, APITimeoutError, RateLimitError, APIError) as e:
+                except Exception as e:
                     error_str = str(e).lower()
-                    if 'prompt is too long' in error_str or 'token limit exceeded' in error_str:
+                    if error_status_code(e) is not None and ('prompt is too long' in error_str or 'token limit exceeded' in error_str):
+                        breaker.release()
                         # Extract current and max tokens from error message
                         import re
                         match = re.search(r'(\d+)\s*tokens?\s*>\s*(\d+)\s*maximum', error_str)
@@ -332,6 +525,13 @@ def run_agent_with_retry(agent, prompt: str, config: dict) -> Optional[str]:
                             max_tokens = int(match.group(2))
                             # Calculate reduction ratio to get under limit with 10% buffer
                             reduction_ratio = (max_tokens * 0.9) / current_tokens
+                            if compactable is not None:
+                                # Shrink memory sections, keeping the template and task intact
+                                compacted = _fit_prompt(compactable, int(count_tokens(prompt) * reduction_ratio))
+                                if count_tokens(compacted) < count_tokens(prompt):
+                                    prompt = compacted
+                                    continue
+                                raise RuntimeError(f"Prompt is too long even with memory sections compacted: {e}")
                             # Truncate prompt
                             words = prompt.split()
                             new_length = int(len(words) * reduction_ratio)
@@ -339,17 +539,81 @@ def run_agent_with_retry(agent, prompt: str, config: dict) -> Optional[str]:
                             print_error(f"Prompt truncated to fit within token limit. Continuing with shortened prompt...")
                             continue
 
-                    if attempt == max_retries - 1:
-                        raise RuntimeError(f"Max retries ({max_retries}) exceeded. Last error: {e}")
-                    delay = base_delay * (2 ** attempt)
-                    print_error(f"Encountered {e.__class__.__name__}: {e}. Retrying in {delay}s... (Attempt {attempt+1}/{max_retries})")
-                    start = time.monotonic()
-                    while time.monotonic() - start < delay:
-                        check_interrupt()
-                        time.sleep(0.1)
+                    if not policy.on_failure(provider, breaker, attempt, e):
+                        if policy.is_retryable(e):
+                            raise RuntimeError(f"Max retries ({policy.max_retries}) exceeded. Last error: {e}") from e
+                        raise
+                    delay = policy.delay(attempt, e)
+                    print_error(f"Encountered {e.__class__.__name__}: {e}. Retrying in {delay:.1f}s... (Attempt {attempt+1}/{policy.max_retries})")
+                    await asyncio.sleep(delay)
+                    span.add('retries')
+                    attempt += 1
+                    continue
+                except BaseException:
+                    breaker.release()
+                    raise
+
+                policy.on_success(provider, breaker, time.monotonic() - start)
+                if not config.get('chat_mode'):
+                    return "Agent run completed successfully"
+                return None
+    finally:
+        # Reset depth tracking
+        memory_store.increment('agent_depth', -1)
+
+def _run_coroutine(coro) -> Any:
+    """Run a coroutine to completion on a private event loop in this thread.
+
+    The task is registered as the innermost running agent, so Ctrl-C cancels
+    it along with its cancel group (see cancel_innermost_agent()). Its
+    cancellation is raised as KeyboardInterrupt, which is what callers of the
+    sync API expect.
+
+    Connections the pooled LLM clients opened on the loop are closed with it.
+    """
+    group = _cancel_group.get() or AgentCancelGroup()
+    loop = asyncio.new_event_loop()
+    try:
+        # The task runs in a copy of this thread's context, memory store included
+        task = loop.create_task(coro)
+        with _running_agents_lock:
+            if group.cancelled:
+                task.cancel()
+            _RUNNING_AGENTS.append((group, loop, task))
+        try:
+            return loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            raise KeyboardInterrupt("Agent run cancelled") from None
         finally:
-            # Reset depth tracking
-            _global_memory['agent_depth'] = _global_memory.get('agent_depth', 1) - 1
-            
-            if original_handler and threading.current_thread() is threading.main_thread():
-                signal.signal(signal.SIGINT, original_handler)
+            with _running_agents_lock:
+                _RUNNING_AGENTS.remove((group, loop, task))
+    finally:
+        loop.run_until_complete(release_loop_clients())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+def run_agent_with_retry(agent, prompt: Union[str, CompactablePrompt], config: dict) -> Optional[str]:
+    """Run an agent on a prompt, retrying transient API errors with backoff.
+
+    Sync wrapper around arun_agent_with_retry(). Ctrl-C cancels the innermost
+    running agent, which raises KeyboardInterrupt here.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        # This thread already runs an event loop; drive the agent from another thread
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='sparc-agent') as pool:
+            return pool.submit(context.run, run_agent_with_retry, agent, prompt, config).result()
+
+    original_handler = None
+    if threading.current_thread() is threading.main_thread():
+        original_handler = signal.getsignal(signal.SIGINT)
+        signal.signal(signal.SIGINT, _request_interrupt)
+    try:
+        return _run_coroutine(arun_agent_with_retry(agent, prompt, config))
+    finally:
+        if original_handler is not None:
+            signal.signal(signal.SIGINT, original_handler)
@@ -0,0 +1,177 @@
+"""Fit agent prompts into a token limit before they are sent.
+
+Prompts are rendered from a template whose memory sections (key snippets,
+research notes, key facts) can be re-packed with smaller token budgets. When a
+prompt is over the limit, sections are shrunk in COMPACTION_ORDER until it
+fits; the template text and the task itself are never cut.
+
+Within an agent loop, ToolHistoryCompactor keeps old tool results from being
+re-sent on every model call: large results older than the most recent few are
+replaced with short stubs in the model input, while the full messages stay in
+the agent state where recall_tool_output can fetch them again.
+"""
+
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, ToolMessage
+
+from sparc_cli.text.tokens import count_tokens, estimate_tokens
+from sparc_cli.tools.memory import get_packed_memory_value
+
+# Memory sections shrunk first to last when a prompt is over its limit
+COMPACTION_ORDER = ('key_snippets', 'research_notes', 'key_facts')
+
+# Token limit for the initial prompt of an agent, leaving room for the
+# conversation that follows. Override with the 'max_prompt_tokens' config key.
+DEFAULT_MAX_PROMPT_TOKENS = 100000
+
+# Most recent tool results always sent in full. Override with the
+# 'keep_tool_results' config key.
+DEFAULT_KEEP_TOOL_RESULTS = 5
+
+# Older tool results above this many tokens are replaced with a stub. Override
+# with the 'tool_result_max_tokens' config key; 0 elides every older result.
+DEFAULT_TOOL_RESULT_MAX_TOKENS = 500
+
+# Characters of an elided result shown in its stub
+_STUB_PREVIEW_CHARS = 200
+
+
+class CompactablePrompt:
+    """A prompt template whose memory sections can shrink to fit a token limit.
+
+    Example:
+        prompt = CompactablePrompt(
+            PLANNING_PROMPT,
+            {'base_task': task, 'key_facts': facts, ...},
+            sections={'key_facts': 'key_facts', 'key_snippets': 'key_snippets'}
+        )
+        text = prompt.render(max_tokens=100000)
+    """
+
+    def __init__(self, template: str, fields: Mapping[str, Any], sections: Mapping[str, str]):
+        """Create a compactable prompt.
+
+        Args:
+            template: Prompt template using str.format() fields
+            fields: Values of all template fields
+            sections: Template field to memory key for fields that may be re-packed
+        """
+        self.template = template
+        self.fields = dict(fields)
+        self.sections = dict(sections)
+
+    def __str__(self) -> str:
+        return self.render()
+
+    def render(self, max_tokens: Optional[int] = None) -> str:
+        """Render the prompt, compacting memory sections if it exceeds max_tokens.
+
+        Sections are re-packed with just enough budget to remove the overflow,
+        in COMPACTION_ORDER; a section is re-packed with smaller budgets until
+        the prompt fits or the section is empty. If the prompt still does not
+        fit once every section is empty, it is returned as small as it can get.
+
+        Args:
+            max_tokens: Token limit (default: no limit)
+
+        Returns:
+            The rendered prompt
+        """
+        values: Dict[str, Any] = dict(self.fields)
+        prompt = self.template.format(**values)
+        if max_tokens is None:
+            return prompt
+
+        tokens = count_tokens(prompt)
+        fields_by_key = {key: field for field, key in self.sections.items()}
+        for key in COMPACTION_ORDER:
+            field = fields_by_key.get(key)
+            if field is None:
+                continue
+            budget = None
+            # Packing budgets are in estimate_tokens() units and only approximate
+            # the tokenizer, so shrink the section until the prompt fits or the
+            # section is empty
+            while tokens > max_tokens:
+                section = str(values[field])
+                section_tokens = count_tokens(section)
+                if not section_tokens:
+                    break
+                target = max(section_tokens - (tokens - max_tokens), 0)
+                next_budget = target * estimate_tokens(section) // section_tokens
+                if budget is not None:
+                    next_budget = min(next_budget, budget - 1)
+                budget = max(next_budget, 0)
+                values[field] = get_packed_memory_value(key, budget) if budget else ""
+                prompt = self.template.format(**values)
+                tokens = count_tokens(prompt)
+        return prompt
+
+
+class ToolHistoryCompactor:
+    """Pre-model hook that elides old, large tool results from the model input.
+
+    The newest keep_recent tool results are always sent verbatim. Older ones
+    over max_tokens are replaced with a stub naming the tool, the result's
+    size, a short preview and how to fetch it again. The agent state itself is
+    not changed.
+
+    Example:
+        compactor = ToolHistoryCompactor(keep_recent=5, max_tokens=500)
+        agent = create_react_agent(model, tools, pre_model_hook=compactor)
+    """
+
+    def __init__(self, keep_recent: int = DEFAULT_KEEP_TOOL_RESULTS,
+                 max_tokens: int = DEFAULT_TOOL_RESULT_MAX_TOKENS):
+        if keep_recent < 0 or max_tokens < 0:
+            raise ValueError("keep_recent and max_tokens must not be negative")
+        self.keep_recent = keep_recent
+        self.max_tokens = max_tokens
+        # (tool call ID, content length) -> stub, or None if kept; tool results never change
+        self._stubs: Dict[Tuple[str, int], Optional[ToolMessage]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, state: Mapping[str, Any]) -> Dict[str, List[BaseMessage]]:
+        return {"llm_input_messages": self.compact(state["messages"])}
+
+    def compact(self, messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+        """Return the messages with old, large tool results replaced by stubs."""
+        tool_positions = [index for index, message in enumerate(messages) if isinstance(message, ToolMessage)]
+        older = tool_positions[:len(tool_positions) - self.keep_recent] if self.keep_recent else tool_positions
+        if not older:
+            return list(messages)
+
+        compacted = list(messages)
+        for index in older:
+            stub = self._stub(messages[index])
+            if stub is not None:
+                compacted[index] = stub
+        return compacted
+
+    def _stub(self, message: ToolMessage) -> Optional[ToolMessage]:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        key = (message.tool_call_id, len(content))
+        with self._lock:
+            if key in self._stubs:
+                return self._stubs[key]
+
+        tokens = count_tokens(content)
+        stub = None
+        if tokens > self.max_tokens:
+            preview = content[:_STUB_PREVIEW_CHARS].rstrip()
+            if len(content) > _STUB_PREVIEW_CHARS:
+                preview += " ..."
+            stub = message.model_copy(update={"content": (
+                f"[Earlier output of {message.name or 'tool'} elided: {tokens} tokens, "
+                f"{content.count(chr(10)) + 1} lines. "
+                f"Call recall_tool_output with tool_call_id=\"{message.tool_call_id}\" if you need it again.]\n"
+                f"{preview}"
+            )})
+
+        with self._lock:
+            if len(self._stubs) >= 4096:
+                self._stubs.clear()
+            self._stubs[key] = stub
+        return stub
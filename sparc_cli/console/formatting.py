@@ -1,6 +1,8 @@
 from rich.console import Console
 from rich.panel import Panel
 from rich.markdown import Markdown
+from rich.table import Table
+from typing import Any, Dict, List
 
 console = Console()
 
@@ -19,7 +21,9 @@ def print_stage_header(stage: str) -> None:
         'debug stage': '🐛',
         'testing stage': '🧪',
         'research subtasks': '📚',
-        'skipping implementation stage': '⏭️'
+        'skipping implementation stage': '⏭️',
+        'skipping research stage': '⏭️',
+        'skipping planning stage': '⏭️'
     }
 
     # Format stage name to Title Case and normalize for mapping lookup
@@ -57,3 +61,27 @@ def print_interrupt(message: str) -> None:
     """
     print() # Give space for "^C"
     console.print(Panel(Markdown(message), title="Interrupted", border_style="yellow bold"))
+
+def print_trace_summary(rows: List[Dict[str, Any]]) -> None:
+    """Print a table of where the time of a traced run went.
+
+    Args:
+        rows: Span totals by kind and name, as returned by summarize_spans()
+    """
+    table = Table(title="⏱️ Trace Summary", title_justify="left")
+    for column in ("Kind", "Name", "Calls", "Errors", "Total (s)", "Avg (s)", "Max (s)", "Tokens in", "Tokens out", "Retries"):
+        table.add_column(column, justify="left" if column in ("Kind", "Name") else "right")
+    for row in rows:
+        table.add_row(
+            row['kind'],
+            row['name'],
+            str(row['count']),
+            str(row['errors']) if row['errors'] else "",
+            f"{row['total']:.2f}",
+            f"{row['avg']:.2f}",
+            f"{row['max']:.2f}",
+            str(row['tokens_in']) if row['tokens_in'] else "",
+            str(row['tokens_out']) if row['tokens_out'] else "",
+            str(row['retries']) if row['retries'] else ""
+        )
+    console.print(table)
@@ -1,11 +1,293 @@
+import asyncio
+import hashlib
 import os
+import threading
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.language_models import BaseChatModel
+from langchain_core.rate_limiters import InMemoryRateLimiter
+
+from sparc_cli.tracing import trace_span
+
+@dataclass
+class ClientPoolConfig:
+    """Connection settings for pooled LLM clients."""
+    max_connections: int = 20  # Concurrent connections per client
+    max_keepalive_connections: int = 10  # Idle connections kept open for reuse
+    keepalive_expiry: float = 60  # Seconds an idle connection stays open
+    connect_timeout: float = 10  # Seconds to establish a connection
+    request_timeout: float = 600  # Seconds for a whole request
+
+class RequestCounter(BaseCallbackHandler):
+    """Count model calls and failures made through a pooled client."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[Any], **kwargs: Any) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        with self._lock:
+            self.errors += 1
+
+class PooledClient(NamedTuple):
+    """A shared LLM client and the resources it owns."""
+    model: BaseChatModel
+    counter: RequestCounter
+    provider: str
+    model_name: str
+    base_url: Optional[str]
+    http_clients: Tuple[Any, ...]  # httpx clients to close with the model
+
+_pool_config = ClientPoolConfig()
+# (client class, provider, model, base URL, API key hash) -> PooledClient
+_clients: Dict[Tuple[Any, ...], PooledClient] = {}
+_clients_lock = threading.Lock()
+# provider -> rate limiter shared by all of its clients
+_rate_limiters: Dict[str, InMemoryRateLimiter] = {}
+
+def configure_client_pool(**settings: Any) -> ClientPoolConfig:
+    """Change connection settings for pooled LLM clients.
+
+    Existing clients are closed so the next initialize_llm() call picks up
+    the new settings.
+
+    Args:
+        **settings: Fields of ClientPoolConfig to change
+
+    Returns:
+        The updated configuration
+
+    Raises:
+        ValueError: If a setting is unknown or not positive
+    """
+    valid = {field.name for field in fields(ClientPoolConfig)}
+    for name, value in settings.items():
+        if name not in valid:
+            raise ValueError(f"Unknown client pool setting: {name}")
+        if value <= 0:
+            raise ValueError(f"Client pool setting {name} must be positive")
+    for name, value in settings.items():
+        setattr(_pool_config, name, value)
+    close_clients()
+    return _pool_config
+
+def set_provider_rate_limit(provider: str, requests_per_minute: Optional[int]) -> None:
+    """Limit the request rate to a provider across all of its pooled clients.
+
+    The limit is shared by every agent using the provider, including
+    concurrent sub-agents, and applies to existing and future clients.
+
+    Args:
+        provider: Provider name, as passed to initialize_llm()
+        requests_per_minute: Maximum requests per minute, or None to remove the limit
+
+    Raises:
+        ValueError: If requests_per_minute is not positive
+    """
+    if requests_per_minute is not None and requests_per_minute < 1:
+        raise ValueError("requests_per_minute must be at least 1")
+    limiter = None
+    if requests_per_minute is not None:
+        limiter = InMemoryRateLimiter(
+            requests_per_second=requests_per_minute / 60,
+            check_every_n_seconds=0.1,
+            max_bucket_size=1
+        )
+    with _clients_lock:
+        if limiter is None:
+            _rate_limiters.pop(provider, None)
+        else:
+            _rate_limiters[provider] = limiter
+        for client in _clients.values():
+            if client.provider == provider:
+                client.model.rate_limiter = limiter
+
+def close_clients() -> None:
+    """Close and forget all pooled LLM clients."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        for http_client in client.http_clients:
+            if isinstance(http_client, LoopBoundAsyncClient):
+                http_client.close_all()
+            else:
+                http_client.close()
+
+def get_client_stats() -> List[Dict[str, Any]]:
+    """Get request counters of the pooled LLM clients.
+
+    Returns:
+        One dict per client with provider, model, base_url, requests and errors
+    """
+    with _clients_lock:
+        clients = list(_clients.values())
+    return [
+        {
+            'provider': client.provider,
+            'model': client.model_name,
+            'base_url': client.base_url,
+            'requests': client.counter.requests,
+            'errors': client.counter.errors
+        }
+        for client in clients
+    ]
+
+class LoopBoundAsyncClient(httpx.AsyncClient):
+    """An httpx.AsyncClient that keeps a separate connection pool per event loop.
+
+    Async connections belong to the loop that opened them, but pooled models
+    are shared by agents running on different loops (one per thread, and a
+    new one per sync run). Requests are sent through a client owned by the
+    running loop; call release_loop_clients() before closing a loop.
+    """
+
+    def __init__(self, limits: httpx.Limits, timeout: httpx.Timeout):
+        super().__init__(limits=limits, timeout=timeout)
+        self._limits = limits
+        self._loop_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._loop_clients_lock = threading.Lock()
+
+    def _loop_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._loop_clients_lock:
+            client = self._loop_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(limits=self._limits, timeout=self.timeout)
+                self._loop_clients[loop] = client
+            return client
+
+    async def send(self, request: httpx.Request, **kwargs: Any) -> httpx.Response:
+        return await self._loop_client().send(request, **kwargs)
+
+    async def release_loop(self) -> None:
+        """Close the connections opened on the running loop."""
+        with self._loop_clients_lock:
+            client = self._loop_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def close_all(self) -> None:
+        """Close the connections of every loop, each on its own loop, and this client."""
+        with self._loop_clients_lock:
+            loop_clients = list(self._loop_clients.items())
+            self._loop_clients.clear()
+        for loop, client in loop_clients:
+            _aclose_on_loop(client, loop)
+        _aclose_on_loop(super(), None)
+
+def _aclose_on_loop(client: Any, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """Call client.aclose() on loop, or on this thread's loop (or a new one) if loop is None."""
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    loop = loop or running
+    if loop is None:
+        asyncio.run(client.aclose())
+    elif loop.is_closed():
+        return  # Should not happen: loops release their clients before closing
+    elif loop is running:
+        loop.create_task(client.aclose())
+    elif loop.is_running():
+        future = asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        try:
+            future.result(timeout=_pool_config.connect_timeout)
+        except Exception:
+            future.cancel()
+    else:
+        loop.run_until_complete(client.aclose())
+
+async def release_loop_clients() -> None:
+    """Close the pooled clients' connections opened on the running event loop.
+
+    Call this before closing a loop that ran agents; the clients themselves
+    stay usable from other loops.
+    """
+    with _clients_lock:
+        clients = list(_clients.values())
+    for client in clients:
+        for http_client in client.http_clients:
+            if isinstance(http_client, LoopBoundAsyncClient):
+                await http_client.release_loop()
+
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(_pool_config.request_timeout, connect=_pool_config.connect_timeout)
+
+def _http_clients() -> Tuple[httpx.Client, LoopBoundAsyncClient]:
+    """Create sync and async HTTP clients with the configured pool settings."""
+    limits = httpx.Limits(
+        max_connections=_pool_config.max_connections,
+        max_keepalive_connections=_pool_config.max_keepalive_connections,
+        keepalive_expiry=_pool_config.keepalive_expiry
+    )
+    timeout = _http_timeout()
+    return httpx.Client(limits=limits, timeout=timeout), LoopBoundAsyncClient(limits=limits, timeout=timeout)
+
+def _pooled_client(provider: str, model_name: str, api_key: Optional[str], base_url: Optional[str] = None) -> BaseChatModel:
+    """Get the shared client for a provider, model, endpoint and API key, creating it if needed.
+
+    OpenAI-compatible clients get HTTP clients with the configured connection
+    limits and keep-alive. Anthropic clients manage their own connection pool,
+    which is reused along with the client, and get the configured timeout.
+    """
+    client_class = ChatAnthropic if provider == "anthropic" else ChatOpenAI
+    key_hash = hashlib.sha256((api_key or '').encode()).hexdigest()
+    key = (client_class, provider, model_name, base_url, key_hash)
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None:
+            return client.model
+
+        counter = RequestCounter()
+        if provider == "anthropic":
+            http_clients = ()
+            model = client_class(
+                api_key=api_key,
+                model_name=model_name,
+                default_request_timeout=_pool_config.request_timeout,
+                callbacks=[counter],
+                rate_limiter=_rate_limiters.get(provider),
+            )
+        else:
+            http_clients = _http_clients()
+            kwargs = {}
+            if base_url is not None:
+                kwargs['base_url'] = base_url
+            model = client_class(
+                api_key=api_key,
+                model=model_name,
+                timeout=_http_timeout(),
+                http_client=http_clients[0],
+                http_async_client=http_clients[1],
+                callbacks=[counter],
+                rate_limiter=_rate_limiters.get(provider),
+                **kwargs
+            )
+        _clients[key] = PooledClient(model, counter, provider, model_name, base_url, http_clients)
+        return model
 
 def initialize_llm(provider: str, model_name: str) -> BaseChatModel:
     """Initialize a language model client based on the specified provider and model.
 
+    Clients are shared process-wide: calls with the same provider, model,
+    endpoint and API key return the same client and reuse its connections.
+
     Note: Environment variables must be validated before calling this function.
     Use validate_environment() to ensure all required variables are set.
 
@@ -19,34 +301,23 @@ def initialize_llm(provider: str, model_name: str) -> BaseChatModel:
     Raises:
         ValueError: If the provider is not supported
     """
-    if provider == "openai":
-        return ChatOpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            model=model_name,
-        )
-    elif provider == "anthropic":
-        return ChatAnthropic(
-            api_key=os.getenv("ANTHROPIC_API_KEY"),
-            model_name=model_name,
-        )
-    elif provider == "openrouter":
-        return ChatOpenAI(
-            api_key=os.getenv("OPENROUTER_API_KEY"),
-            base_url="https://openrouter.ai/api/v1",
-            model=model_name,
-        )
-    elif provider == "openai-compatible":
-        return ChatOpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            base_url=os.getenv("OPENAI_API_BASE"),
-            model=model_name,
-        )
-    else:
-        raise ValueError(f"Unsupported provider: {provider}")
+    with trace_span('initialize_llm', 'llm_init', provider=provider, model=model_name):
+        if provider == "openai":
+            return _pooled_client(provider, model_name, os.getenv("OPENAI_API_KEY"))
+        elif provider == "anthropic":
+            return _pooled_client(provider, model_name, os.getenv("ANTHROPIC_API_KEY"))
+        elif provider == "openrouter":
+            return _pooled_client(provider, model_name, os.getenv("OPENROUTER_API_KEY"), "https://openrouter.ai/api/v1")
+        elif provider == "openai-compatible":
+            return _pooled_client(provider, model_name, os.getenv("OPENAI_API_KEY"), os.getenv("OPENAI_API_BASE"))
+        else:
+            raise ValueError(f"Unsupported provider: {provider}")
 
 def initialize_expert_llm(provider: str = "openai", model_name: str = "o1-preview") -> BaseChatModel:
     """Initialize an expert language model client based on the specified provider and model.
 
+    Clients are shared process-wide, see initialize_llm().
+
     Note: Environment variables must be validated before calling this function.
     Use validate_environment() to ensure all required variables are set.
 
@@ -61,27 +332,14 @@ def initialize_expert_llm(provider: str = "openai", model_name: str = "o1-previe
     Raises:
         ValueError: If the provider is not supported
     """
-    if provider == "openai":
-        return ChatOpenAI(
-            api_key=os.getenv("EXPERT_OPENAI_API_KEY"),
-            model=model_name,
-        )
-    elif provider == "anthropic":
-        return ChatAnthropic(
-            api_key=os.getenv("EXPERT_ANTHROPIC_API_KEY"),
-            model_name=model_name,
-        )
-    elif provider == "openrouter":
-        return ChatOpenAI(
-            api_key=os.getenv("EXPERT_OPENROUTER_API_KEY"),
-            base_url="https://openrouter.ai/api/v1",
-            model=model_name,
-        )
-    elif provider == "openai-compatible":
-        return ChatOpenAI(
-            api_key=os.getenv("EXPERT_OPENAI_API_KEY"),
-            base_url=os.getenv("EXPERT_OPENAI_API_BASE"),
-            model=model_name,
-        )
-    else:
-        raise ValueError(f"Unsupported provider: {provider}")
+    with trace_span('initialize_expert_llm', 'llm_init', provider=provider, model=model_name):
+        if provider == "openai":
+            return _pooled_client(provider, model_name, os.getenv("EXPERT_OPENAI_API_KEY"))
+        elif provider == "anthropic":
+            return _pooled_client(provider, model_name, os.getenv("EXPERT_ANTHROPIC_API_KEY"))
+        elif provider == "openrouter":
+            return _pooled_client(provider, model_name, os.getenv("EXPERT_OPENROUTER_API_KEY"), "https://openrouter.ai/api/v1")
+        elif provider == "openai-compatible":
+            return _pooled_client(provider, model_name, os.getenv("EXPERT_OPENAI_API_KEY"), os.getenv("EXPERT_OPENAI_API_BASE"))
+        else:
+            raise ValueError(f"Unsupported provider: {provider}")
@@ -0,0 +1,162 @@
+"""Cached listing of the files in a project, shared by the file search tools.
+
+Listing a large repository (tracked plus untracked files) means walking the
+whole working tree. The listing is kept per project root and reused until the
+git index, an ignore file or one of the listed directories changes: staging,
+committing or checking out rewrites `.git/index`, editing a `.gitignore` or
+`.git/info/exclude` changes which untracked files are listed, and adding,
+removing or renaming a file changes the mtime of its directory. Checking that costs one stat per
+directory instead of a walk. (A file added to a directory that held no
+listed files, such as a previously empty one, shows up once anything else
+changes.)
+"""
+
+import fnmatch
+import functools
+import os
+import re
+import subprocess
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Directories never listed (.sparc holds sparc's own databases)
+SKIP_DIRS = {'.git', '.sparc'}
+
+
+class PathMatcher:
+    """Include/exclude glob patterns compiled into one regex each.
+
+    A path matches if it matches any include pattern (or there are none) and
+    no exclude pattern. Patterns use fnmatch syntax against the whole
+    relative path, where `*` also matches `/`.
+
+    Example:
+        matcher = PathMatcher(include=['src/*'], exclude=['*.pyc'])
+        sources = matcher.filter(get_project_files())
+    """
+
+    def __init__(self, include: Optional[Iterable[str]] = None, exclude: Iterable[str] = ()):
+        self._include = _compile(tuple(include)) if include else None
+        self._exclude = _compile(tuple(exclude))
+
+    def __call__(self, path: str) -> bool:
+        if self._include is not None and not self._include.match(path):
+            return False
+        return self._exclude is None or not self._exclude.match(path)
+
+    def filter(self, paths: Iterable[str]) -> List[str]:
+        """The paths that match, in order."""
+        return [path for path in paths if self(path)]
+
+
+@functools.lru_cache(maxsize=64)
+def _compile(patterns: Tuple[str, ...]) -> Optional["re.Pattern[str]"]:
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{fnmatch.translate(pattern)})' for pattern in patterns))
+
+
+@dataclass
+class _Listing:
+    files: List[str]
+    # The git index and ignore files, whose changes alter git's listing; empty outside a repository
+    git_files: List[str]
+    # Directories holding listed files, and their mtimes when listed
+    dirs: List[str]
+    stamp: Tuple[int, ...]
+
+
+_listings: Dict[str, _Listing] = {}
+_listings_lock = threading.Lock()
+
+
+def _mtime_ns(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return -1
+
+
+def _stamp(root: str, git_files: Sequence[str], dirs: Sequence[str]) -> Tuple[int, ...]:
+    stamps = [_mtime_ns(os.path.join(root, directory)) for directory in dirs]
+    stamps.extend(_mtime_ns(path) for path in git_files)
+    return tuple(stamps)
+
+
+def _git_listing(root: str) -> Optional[Tuple[List[str], List[str]]]:
+    """Tracked and untracked, not ignored files and the git files they depend on, or None outside a repository.
+
+    Those are the index and the ignore files: .git/info/exclude and every
+    .gitignore, listed or not (the root's may ignore itself).
+    """
+    try:
+        git_dir = subprocess.run(
+            ['git', 'rev-parse', '--absolute-git-dir'], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        output = subprocess.run(
+            ['git', 'ls-files', '-z', '--cached', '--others', '--exclude-standard'],
+            cwd=root, capture_output=True, check=True
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    paths = output.decode('utf-8', errors='surrogateescape').split('\0')
+    files = list(dict.fromkeys(path for path in paths if path and path.split('/', 1)[0] not in SKIP_DIRS))
+    git_files = [os.path.join(git_dir, 'index'), os.path.join(git_dir, 'info', 'exclude')]
+    gitignores = {path for path in files if path.rpartition('/')[2] == '.gitignore'}
+    gitignores.add('.gitignore')
+    git_files.extend(os.path.join(root, path) for path in sorted(gitignores))
+    return files, git_files
+
+
+def _walk_listing(root: str) -> List[str]:
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if name not in SKIP_DIRS]
+        rel = os.path.relpath(dirpath, root)
+        prefix = '' if rel == '.' else rel.replace(os.sep, '/') + '/'
+        files.extend(prefix + name for name in filenames)
+    return files
+
+
+def _parent_dirs(files: Iterable[str]) -> List[str]:
+    """The root and every directory on the way to a listed file."""
+    dirs = {'.'}
+    for path in files:
+        parent = path.rpartition('/')[0]
+        while parent and parent not in dirs:
+            dirs.add(parent)
+            parent = parent.rpartition('/')[0]
+    return sorted(dirs)
+
+
+def get_project_files(root: str = '.') -> List[str]:
+    """List the files of a project, reusing the last listing if nothing changed.
+
+    In a git repository these are the tracked files plus untracked files
+    that are not ignored, as `git ls-files` reports them; elsewhere, every
+    file. Files under SKIP_DIRS are left out. Paths are relative to root and use
+    `/` separators.
+
+    Returns:
+        The file paths; do not modify the list
+    """
+    key = os.path.realpath(root)
+    with _listings_lock:
+        listing = _listings.get(key)
+    if listing is not None and _stamp(root, listing.git_files, listing.dirs) == listing.stamp:
+        return listing.files
+
+    git = _git_listing(root)
+    files, git_files = git if git is not None else (_walk_listing(root), [])
+    dirs = _parent_dirs(files)
+    listing = _Listing(files=files, git_files=git_files, dirs=dirs, stamp=_stamp(root, git_files, dirs))
+    with _listings_lock:
+        _listings[key] = listing
+    return files
+
+
+def clear_project_files_cache() -> None:
+    """Forget all cached listings."""
+    with _listings_lock:
+        _listings.clear()
@@ -553,9 +553,11 @@ Guidelines:
         Use emit_plan to store the high-level implementation plan.
         For each sub-task, use emit_task to store a step-by-step description.
             The description should be only as detailed as warranted by the complexity of the request.
+            Pass depends_on with the IDs of earlier tasks that must be finished first, and files with the paths the task will create or modify.
         You may use delete_tasks or swap_task_order to adjust the task list/order as you plan.
 
-    Once you are absolutely sure you are completed planning, you may begin to call request_task_implementation one-by-one for each task to implement the plan.
+    Once you are absolutely sure you are completed planning, call run_planned_tasks to implement the plan; independent tasks that touch different files run concurrently.
+      Alternatively, call request_task_implementation one-by-one for each task.
     If you have any doubt about the correctness or thoroughness of the plan, consult the expert (if expert is available) for verification.
 
 {expert_section}
@@ -0,0 +1,366 @@
+"""Retry policy, circuit breakers and retry metrics shared by agents and tools.
+
+A RetryPolicy decides whether an error is worth retrying and how long to
+wait: exponential backoff capped at max_delay, randomized with jitter, or the
+wait the server asked for in a Retry-After header. Circuit breakers are
+process-wide and keyed by name (a provider such as 'anthropic', or
+'scrape:<host>'), so concurrent agents stop calling a failing provider
+together instead of each retrying on its own.
+"""
+
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type, TypeVar
+
+import anthropic
+import httpx
+import openai
+
+T = TypeVar('T')
+
+# HTTP statuses worth retrying: timeout, conflict, rate limit, server errors
+# (529 is Anthropic's "overloaded")
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+
+_CONNECTION_ERRORS: Tuple[Type[BaseException], ...] = (
+    anthropic.APIConnectionError,  # includes APITimeoutError
+    openai.APIConnectionError,
+    httpx.TransportError,  # includes timeouts
+    ConnectionError,
+    TimeoutError
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is refused because its circuit breaker is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit '{name}' is open after repeated failures; retry in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def _error_response(error: BaseException) -> Optional[Any]:
+    """The HTTP response attached to an error or the error that caused it."""
+    while error is not None:
+        response = getattr(error, 'response', None)
+        if response is not None:
+            return response
+        error = error.__cause__
+    return None
+
+
+def error_status_code(error: BaseException) -> Optional[int]:
+    """HTTP status code of an API error, if it has one."""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(_error_response(error), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Check whether an error is likely to succeed on retry.
+
+    Connection failures, timeouts and retryable HTTP statuses are transient;
+    other API errors (bad request, authentication, not found, ...) are not.
+    """
+    if isinstance(error, _CONNECTION_ERRORS) or isinstance(error.__cause__, _CONNECTION_ERRORS):
+        return True
+    return error_status_code(error) in RETRYABLE_STATUS_CODES
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the server asked to wait before retrying, from the error's response headers.
+
+    Supports `retry-after-ms` and `retry-after` in seconds or as an HTTP date.
+    """
+    headers = getattr(_error_response(error), 'headers', None)
+    if not headers:
+        return None
+    try:
+        value = headers.get('retry-after-ms')
+        if value is not None:
+            return max(float(value) / 1000, 0.0)
+        value = headers.get('retry-after')
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(retry_at.timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class RetryStats:
+    """Retry and latency counters for one name."""
+    calls: int = 0
+    successes: int = 0
+    failures: int = 0
+    retries: int = 0
+    rejected: int = 0  # Calls refused by an open circuit
+    total_latency: float = 0.0  # Seconds spent in successful attempts
+    max_latency: float = 0.0
+
+
+_stats: Dict[str, RetryStats] = {}
+_stats_lock = threading.Lock()
+
+
+def _record(name: str, **counts: float) -> None:
+    with _stats_lock:
+        stats = _stats.setdefault(name, RetryStats())
+        latency = counts.pop('latency', None)
+        for counter, value in counts.items():
+            setattr(stats, counter, getattr(stats, counter) + value)
+        if latency is not None:
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+
+
+def get_retry_stats() -> Dict[str, Dict[str, float]]:
+    """Get retry and latency counters, keyed by provider or breaker name.
+
+    Returns:
+        Dict of name to calls, successes, failures, retries, rejected,
+        avg_latency and max_latency (seconds)
+    """
+    with _stats_lock:
+        return {
+            name: {
+                'calls': stats.calls,
+                'successes': stats.successes,
+                'failures': stats.failures,
+                'retries': stats.retries,
+                'rejected': stats.rejected,
+                'avg_latency': stats.total_latency / stats.successes if stats.successes else 0.0,
+                'max_latency': stats.max_latency
+            }
+            for name, stats in _stats.items()
+        }
+
+
+def reset_retry_stats() -> None:
+    """Clear all retry counters."""
+    with _stats_lock:
+        _stats.clear()
+
+
+class CircuitBreaker:
+    """Stop calling a failing service for a while.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    are refused for reset_timeout seconds. Then a single trial call is let
+    through (half-open): success closes the circuit, failure opens it again.
+    Thread-safe.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """'closed', 'open' or 'half_open'."""
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return 'open'
+            return 'half_open'
+
+    def acquire(self) -> float:
+        """Ask to make a call.
+
+        Returns:
+            0 if the call may go ahead, otherwise seconds to wait before asking again
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if self._trial_running:
+                # Another caller is probing the service; check back shortly
+                return min(1.0, self.reset_timeout)
+            self._trial_running = True
+            return 0.0
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release(self) -> None:
+        """End a call that neither succeeded nor failed in a way that counts (e.g. cancelled)."""
+        with self._lock:
+            self._trial_running = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Get the process-wide circuit breaker for a provider or service."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def reset_circuit_breakers() -> None:
+    """Forget all circuit breakers and their state."""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+@dataclass
+class RetryPolicy:
+    """When and how long to wait before retrying a failed call.
+
+    The wait before retry n (0-based) is at most min(max_delay,
+    base_delay * 2**n). With jitter=1.0 ("full jitter") it is drawn uniformly
+    from [0, cap]; smaller values randomize only that fraction of the cap. A
+    Retry-After header from the server takes precedence when it asks for a
+    longer wait, up to max_retry_after.
+
+    Example:
+        policy = RetryPolicy(max_retries=5, max_delay=30)
+        response = policy.call(lambda: client.get(url), name=f"scrape:{host}")
+    """
+    max_retries: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+    jitter: float = 1.0
+    max_retry_after: float = 300.0
+    is_retryable: Callable[[BaseException], bool] = field(default=is_transient_error)
+
+    def should_retry(self, attempt: int, error: BaseException) -> bool:
+        """Check whether to retry after attempt number `attempt` (0-based) failed."""
+        return attempt < self.max_retries and self.is_retryable(error)
+
+    def delay(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """Seconds to wait before retrying after attempt `attempt` (0-based) failed."""
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        wait = cap * (1 - self.jitter * random.random())
+        requested = retry_after(error) if error is not None else None
+        if requested is not None:
+            wait = max(wait, min(requested, self.max_retry_after))
+        return wait
+
+    def call(self, fn: Callable[[], T], name: str = 'default', breaker: Optional[CircuitBreaker] = None) -> T:
+        """Call fn, retrying per this policy.
+
+        Args:
+            fn: The call to make
+            name: Key for metrics and, unless breaker is given, the shared circuit breaker
+            breaker: Circuit breaker to use instead of get_circuit_breaker(name)
+
+        Returns:
+            The result of fn
+
+        Raises:
+            The last error of fn, or CircuitOpenError if the circuit stayed open
+        """
+        breaker = breaker or get_circuit_breaker(name)
+        self.on_call(name)
+        attempt = 0
+        last_error: Optional[BaseException] = None
+        while True:
+            wait = breaker.acquire()
+            if wait:
+                _record(name, rejected=1, failures=1)
+                raise CircuitOpenError(breaker.name, wait) from last_error
+            start = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                if not self.on_failure(name, breaker, attempt, e):
+                    raise
+                last_error = e
+                time.sleep(self.delay(attempt, e))
+                attempt += 1
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            self.on_success(name, breaker, time.monotonic() - start)
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable[T]], name: str = 'default',
+                    breaker: Optional[CircuitBreaker] = None) -> T:
+        """Async version of call(); fn returns a new awaitable on each attempt."""
+        breaker = breaker or get_circuit_breaker(name)
+        self.on_call(name)
+        attempt = 0
+        last_error: Optional[BaseException] = None
+        while True:
+            wait = breaker.acquire()
+            if wait:
+                _record(name, rejected=1, failures=1)
+                raise CircuitOpenError(breaker.name, wait) from last_error
+            start = time.monotonic()
+            try:
+                result = await fn()
+            except Exception as e:
+                if not self.on_failure(name, breaker, attempt, e):
+                    raise
+                last_error = e
+                await asyncio.sleep(self.delay(attempt, e))
+                attempt += 1
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            self.on_success(name, breaker, time.monotonic() - start)
+            return result
+
+    def on_call(self, name: str) -> None:
+        """Record the start of a call, however many attempts it takes."""
+        _record(name, calls=1)
+
+    def on_failure(self, name: str, breaker: CircuitBreaker, attempt: int, error: BaseException) -> bool:
+        """Record a failed attempt with the breaker and metrics.
+
+        Only transient errors count against the breaker; any other error
+        shows the service is up.
+
+        Returns:
+            Whether to retry
+        """
+        if self.is_retryable(error):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        if self.should_retry(attempt, error):
+            _record(name, retries=1)
+            return True
+        _record(name, failures=1)
+        return False
+
+    def on_success(self, name: str, breaker: CircuitBreaker, latency: float) -> None:
+        """Record a successful attempt that took `latency` seconds."""
+        breaker.record_success()
+        _record(name, successes=1, latency=latency)
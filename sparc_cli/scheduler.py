@@ -0,0 +1,228 @@
+"""Run planned tasks concurrently while respecting their dependencies.
+
+Tasks declare the tasks they depend on and the files they write. A task is
+started once all of its prerequisites have completed and none of its files is
+held by a running task; tasks that declare no files take every lock and run
+alone. Ready tasks on the longest remaining dependency chain start first, so
+a plan finishes in roughly critical-path time instead of the sum of its tasks.
+When a task fails, every task that depends on it is skipped.
+"""
+
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from typing_extensions import Literal, TypedDict
+
+# Default number of implementation agents run_planned_tasks runs at once
+DEFAULT_TASK_CONCURRENCY = 4
+
+TaskStatus = Literal['completed', 'failed', 'skipped', 'cancelled']
+TaskEvent = Literal['started', 'completed', 'failed', 'skipped', 'cancelled']
+
+
+@dataclass
+class TaskNode:
+    """A task in the dependency graph."""
+    id: int
+    description: str
+    depends_on: List[int] = field(default_factory=list)
+    files: List[str] = field(default_factory=list)
+
+
+class TaskOutcome(TypedDict):
+    status: TaskStatus
+    reason: Optional[str]
+    result: Any
+
+
+def _check_graph(nodes: Dict[int, TaskNode]) -> None:
+    """Raise ValueError for unknown prerequisites or dependency cycles."""
+    for node in nodes.values():
+        unknown = [dep for dep in node.depends_on if dep not in nodes]
+        if unknown:
+            raise ValueError(f"Task #{node.id} depends on unknown task(s): {unknown}")
+
+    visiting: Set[int] = set()
+    done: Set[int] = set()
+
+    def visit(task_id: int, path: List[int]) -> None:
+        if task_id in done:
+            return
+        if task_id in visiting:
+            cycle = path[path.index(task_id):] + [task_id]
+            raise ValueError("Task dependency cycle: " + " -> ".join(f"#{i}" for i in cycle))
+        visiting.add(task_id)
+        for dep in nodes[task_id].depends_on:
+            visit(dep, path + [task_id])
+        visiting.discard(task_id)
+        done.add(task_id)
+
+    for task_id in nodes:
+        visit(task_id, [])
+
+
+def critical_path_lengths(nodes: Iterable[TaskNode]) -> Dict[int, int]:
+    """Length in tasks of the longest dependency chain starting at each task.
+
+    A task nothing depends on has length 1; a task with a dependent that has
+    length n has at least length n + 1.
+    """
+    nodes = {node.id: node for node in nodes}
+    _check_graph(nodes)
+    dependents: Dict[int, List[int]] = {task_id: [] for task_id in nodes}
+    for node in nodes.values():
+        for dep in node.depends_on:
+            dependents[dep].append(node.id)
+
+    lengths: Dict[int, int] = {}
+
+    def length(task_id: int) -> int:
+        if task_id not in lengths:
+            lengths[task_id] = 1 + max((length(child) for child in dependents[task_id]), default=0)
+        return lengths[task_id]
+
+    for task_id in nodes:
+        length(task_id)
+    return lengths
+
+
+class TaskScheduler:
+    """Run a task graph on a thread pool with per-file write locks.
+
+    Example:
+        scheduler = TaskScheduler(nodes, run=implement, max_workers=4,
+                                  on_event=lambda event, node, outcome: print(event, node.id))
+        outcomes = scheduler.run()
+
+    `run` is called with a TaskNode in a worker thread. The task failed if it
+    raises, or if it returns a dict with a false 'success' value (its 'reason'
+    becomes the failure reason). `on_task_done`, if given, is called in the
+    scheduling thread as soon as a task finishes and before its dependents
+    start, so it can publish the task's results to them.
+    """
+
+    def __init__(
+        self,
+        nodes: Iterable[TaskNode],
+        run: Callable[[TaskNode], Any],
+        max_workers: int = DEFAULT_TASK_CONCURRENCY,
+        on_event: Optional[Callable[[TaskEvent, TaskNode, Optional[TaskOutcome]], None]] = None,
+        on_task_done: Optional[Callable[[TaskNode, TaskOutcome], None]] = None
+    ):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.nodes: Dict[int, TaskNode] = {node.id: node for node in nodes}
+        self._priority = critical_path_lengths(self.nodes.values())
+        self._run = run
+        self.max_workers = max_workers
+        self._on_event = on_event
+        self._on_task_done = on_task_done
+
+        self.outcomes: Dict[int, TaskOutcome] = {}
+        self._held_files: Set[str] = set()
+        self._exclusive = False
+
+    def _emit(self, event: TaskEvent, node: TaskNode, outcome: Optional[TaskOutcome] = None) -> None:
+        if self._on_event is not None:
+            self._on_event(event, node, outcome)
+
+    def _can_lock(self, node: TaskNode, running: bool) -> bool:
+        if self._exclusive:
+            return False
+        if not node.files:
+            return not running
+        return self._held_files.isdisjoint(node.files)
+
+    def _lock(self, node: TaskNode) -> None:
+        if node.files:
+            self._held_files.update(node.files)
+        else:
+            self._exclusive = True
+
+    def _unlock(self, node: TaskNode) -> None:
+        if node.files:
+            self._held_files.difference_update(node.files)
+        else:
+            self._exclusive = False
+
+    def _finish(self, node: TaskNode, outcome: TaskOutcome) -> None:
+        self.outcomes[node.id] = outcome
+        if self._on_task_done is not None:
+            self._on_task_done(node, outcome)
+        self._emit(outcome['status'], node, outcome)
+
+    def _skip_dependents(self, failed: TaskNode) -> None:
+        pending = [failed.id]
+        while pending:
+            failed_id = pending.pop()
+            for node in self.nodes.values():
+                if node.id in self.outcomes or failed_id not in node.depends_on:
+                    continue
+                self._finish(node, TaskOutcome(
+                    status='skipped', reason=f"prerequisite task #{failed_id} did not complete", result=None
+                ))
+                pending.append(node.id)
+
+    def _call(self, node: TaskNode) -> TaskOutcome:
+        try:
+            result = self._run(node)
+        except Exception as e:
+            return TaskOutcome(status='failed', reason=f"error: {str(e)}", result=None)
+        if isinstance(result, dict) and not result.get('success', True):
+            return TaskOutcome(status='failed', reason=result.get('reason'), result=result)
+        return TaskOutcome(status='completed', reason=None, result=result)
+
+    def _ready(self) -> List[TaskNode]:
+        ready = [
+            node for node in self.nodes.values()
+            if node.id not in self.outcomes
+            and all(self.outcomes.get(dep, {}).get('status') == 'completed' for dep in node.depends_on)
+        ]
+        # Longest remaining chain first, then plan order
+        return sorted(ready, key=lambda node: (-self._priority[node.id], node.id))
+
+    def run(self) -> Dict[int, TaskOutcome]:
+        """Run every task and return the outcome of each, keyed by task ID.
+
+        On KeyboardInterrupt, tasks that have not started are marked
+        cancelled, running tasks are waited for, and the interrupt is raised.
+        A running task that ends with an error or interrupt (e.g. its agent was
+        cancelled along with the others) is marked cancelled as well.
+        """
+        running: Dict[Future, TaskNode] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='sparc-task') as pool:
+            try:
+                while len(self.outcomes) < len(self.nodes):
+                    started = {node.id for node in running.values()}
+                    for node in self._ready():
+                        if len(running) >= self.max_workers:
+                            break
+                        if node.id in started or not self._can_lock(node, bool(running)):
+                            continue
+                        self._lock(node)
+                        self._emit('started', node)
+                        # Tasks run in a copy of the caller's context (e.g. its current trace span)
+                        running[pool.submit(contextvars.copy_context().run, self._call, node)] = node
+
+                    done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        node = running.pop(future)
+                        self._unlock(node)
+                        outcome = future.result()
+                        self._finish(node, outcome)
+                        if outcome['status'] != 'completed':
+                            self._skip_dependents(node)
+            except KeyboardInterrupt:
+                for node in self.nodes.values():
+                    if node.id not in self.outcomes and node not in running.values():
+                        self._finish(node, TaskOutcome(status='cancelled', reason="interrupted", result=None))
+                for future, node in running.items():
+                    try:
+                        outcome = future.result()
+                    except BaseException:
+                        outcome = TaskOutcome(status='cancelled', reason="interrupted", result=None)
+                    self._finish(node, outcome)
+                raise
+        return self.outcomes
@@ -0,0 +1,401 @@
+"""Persistent trigram index that narrows code searches to candidate files.
+
+Every indexed file is broken into the (ASCII-lowercased) 3-byte sequences it
+contains. A search pattern is turned into a query over the trigrams any match
+must contain, e.g. `get_(user|group)_id` needs "get", "et_", ... and either
+"use"... or "gro"...; only files holding them are handed to rg. Patterns the
+index cannot narrow (short literals, bare character classes, syntax it does
+not understand or that rg's regex dialect reads differently) fall back to
+searching every file, so results never differ from a plain rg run.
+
+The index is stored in SQLite under `.sparc/` and brought up to date before
+each query: files whose size or mtime changed are re-indexed, deleted files
+are dropped. Files over MAX_INDEXED_FILE_BYTES are always searched; binary
+files never are.
+"""
+
+import array
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sparc_cli.project_files import get_project_files
+
+try:  # Python 3.11+
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:
+    import sre_constants
+    import sre_parse
+
+DEFAULT_INDEX_DB = os.path.join('.sparc', 'search_index.db')
+
+# Larger files are not indexed and always searched
+MAX_INDEXED_FILE_BYTES = 1024 * 1024
+
+# Files re-indexed between writes of the posting lists, bounding memory use
+UPDATE_BATCH_FILES = 500
+
+# File status
+_INDEXED, _UNINDEXED, _BINARY = 0, 1, 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    trigrams BLOB
+);
+CREATE TABLE IF NOT EXISTS postings (
+    trigram BLOB PRIMARY KEY,
+    files BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+# A trigram query: ('lit', literal, ignore_case), ('and', parts), ('or', parts),
+# or None for "any file"
+Query = Optional[Tuple[Any, ...]]
+
+
+@dataclass
+class IndexUpdate:
+    """What an index update changed."""
+    files: int = 0  # Files in the index afterwards
+    indexed: int = 0  # Files (re-)indexed
+    removed: int = 0  # Files dropped
+
+
+def file_trigrams(data: bytes) -> Set[bytes]:
+    """Distinct ASCII-lowercased trigrams of file contents."""
+    data = data.lower()
+    return {data[i:i + 3] for i in range(len(data) - 2)}
+
+
+def _literal_trigrams(literal: str, ignore_case: bool) -> Set[bytes]:
+    grams = file_trigrams(literal.encode('utf-8'))
+    if ignore_case:
+        # Non-ASCII letters are not case-folded in the index
+        grams = {gram for gram in grams if max(gram) < 0x80}
+    return grams
+
+
+def _sequence_query(items: Iterable[Tuple[object, object]], ignore_case: bool) -> Query:
+    """Query for a parsed regex sequence: each literal run and required group must match."""
+    parts: List[Query] = []
+    run: List[str] = []
+
+    def flush() -> None:
+        if run:
+            parts.append(('lit', ''.join(run), ignore_case))
+            run.clear()
+
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        flush()
+        if op is sre_constants.SUBPATTERN:
+            add_flags = av[1] if len(av) == 4 else 0
+            parts.append(_sequence_query(av[-1], ignore_case or bool(add_flags & sre_constants.SRE_FLAG_IGNORECASE)))
+        elif op is sre_constants.BRANCH:
+            parts.append(('or', [_sequence_query(branch, ignore_case) for branch in av[1]]))
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            parts.append(_sequence_query(av[2], ignore_case))
+        # Anything else (classes, wildcards, anchors, optional parts) breaks literal runs
+    flush()
+    parts = [part for part in parts if part is not None]
+    return ('and', parts) if parts else None
+
+
+# Escapes that Python and rg's Rust regex both read as the same class or assertion
+_SHARED_ESCAPES = frozenset('dDwWsSbBAnrtfv')
+# Repeat bounds: {m}, {m,} or {m,n}
+_REPEAT_RE = re.compile(r'\{\d+(,\d*)?\}')
+# Inline flag groups both read alike; x (verbose) and others differ
+_FLAGS_RE = re.compile(r'\(\?[ims]*(-[ims]+)?[:)]')
+
+
+def _shares_python_syntax(pattern: str) -> bool:
+    """Whether Python's regex parser reads a pattern the way rg does.
+
+    Only plain literals, escaped punctuation, simple escapes and classes,
+    groups, alternation and repeats are accepted. Anything else (POSIX or
+    nested classes, class set operations, \\< and \\> word boundaries,
+    \\b{...}, \\x{...}, \\p{...}, lookarounds, verbose mode, ...) may be
+    read differently, so the index must not narrow the search for it.
+    """
+    i = 0
+    in_class = False
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            escaped = pattern[i + 1:i + 2]
+            if not escaped:
+                return False
+            if escaped == 'x':
+                if not re.fullmatch(r'[0-9a-fA-F]{2}', pattern[i + 2:i + 4]):
+                    return False
+                i += 4
+                continue
+            if escaped.isalnum() and escaped not in _SHARED_ESCAPES:
+                return False
+            if escaped in '<>' or (escaped == 'b' and pattern[i + 2:i + 3] == '{'):
+                return False
+            if not escaped.isascii():
+                return False
+            i += 2
+            continue
+        if in_class:
+            if char == '[' or pattern[i:i + 2] in ('&&', '--', '~~'):
+                return False
+            if char == ']':
+                in_class = False
+            i += 1
+            continue
+        if char == '[':
+            in_class = True
+            i += 1
+            # A ] right after [ or [^ is a literal in both dialects
+            if pattern[i:i + 1] == '^':
+                i += 1
+            if pattern[i:i + 1] == ']':
+                i += 1
+            continue
+        if char == '{':
+            repeat = _REPEAT_RE.match(pattern, i)
+            if not repeat:
+                return False
+            i = repeat.end()
+            continue
+        if char == '(' and pattern[i + 1:i + 2] == '?':
+            if pattern.startswith('(?P<', i):
+                i += 4
+                continue
+            flags = _FLAGS_RE.match(pattern, i)
+            if not flags:
+                return False
+            i = flags.end()
+            continue
+        i += 1
+    return not in_class
+
+
+def regex_query(pattern: str, ignore_case: bool = False) -> Query:
+    """Trigram query that every file matching a regex satisfies, or None if there is none.
+
+    Patterns rg's regex dialect may read differently from Python's get None.
+    """
+    if not _shares_python_syntax(pattern):
+        return None
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, OverflowError, RecursionError):
+        return None
+    ignore_case = ignore_case or bool(parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE)
+    return _sequence_query(parsed, ignore_case)
+
+
+class TrigramIndex:
+    """On-disk trigram index of the files under a directory. Thread-safe.
+
+    Example:
+        index = TrigramIndex('.')
+        index.update()
+        paths = index.candidates(r'def (load|save)_config')
+        if paths is not None:
+            cmd.extend(paths)  # Search only these
+    """
+
+    def __init__(self, root: str = '.', db_path: Optional[str] = None):
+        """Open (and create if needed) the index of a directory.
+
+        Args:
+            root: Directory whose files are indexed; paths are relative to it
+            db_path: SQLite file (default: .sparc/search_index.db under root), or ':memory:'
+        """
+        self.root = root
+        self.db_path = db_path or os.path.join(root, DEFAULT_INDEX_DB)
+        db_dir = os.path.dirname(self.db_path) if self.db_path != ':memory:' else ''
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        if self.db_path != ':memory:':
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._conn.close()
+
+    def list_files(self) -> List[str]:
+        """Files to index: the project files of the root (see get_project_files())."""
+        return get_project_files(self.root)
+
+    def rebuild(self) -> IndexUpdate:
+        """Drop the index and build it from scratch."""
+        with self._lock:
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("DELETE FROM postings")
+            self._conn.commit()
+        return self.update()
+
+    def update(self) -> IndexUpdate:
+        """Re-index new and changed files and drop deleted ones."""
+        current: Dict[str, Tuple[int, int]] = {}
+        for path in self.list_files():
+            try:
+                stat = os.stat(os.path.join(self.root, path))
+            except OSError:
+                continue
+            current[path] = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            stored = {
+                path: (file_id, (mtime_ns, size))
+                for file_id, path, mtime_ns, size in self._conn.execute("SELECT id, path, mtime_ns, size FROM files")
+            }
+            removed = [file_id for path, (file_id, _) in stored.items() if path not in current]
+            changed = [path for path, stat in current.items() if path not in stored or stored[path][1] != stat]
+            if not removed and not changed:
+                return IndexUpdate(files=len(current))
+
+            # trigram -> (file IDs to add, file IDs to remove)
+            deltas: Dict[bytes, Tuple[Set[int], Set[int]]] = {}
+            for file_id in removed:
+                self._forget(file_id, deltas)
+                self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+            for count, path in enumerate(changed, 1):
+                file_id = stored[path][0] if path in stored else None
+                if file_id is not None:
+                    self._forget(file_id, deltas)
+                self._index_file(path, current[path], file_id, deltas)
+                if count % UPDATE_BATCH_FILES == 0:
+                    self._write_postings(deltas)
+            self._write_postings(deltas)
+            self._conn.commit()
+        return IndexUpdate(files=len(current), indexed=len(changed), removed=len(removed))
+
+    def _forget(self, file_id: int, deltas: Dict[bytes, Tuple[Set[int], Set[int]]]) -> None:
+        row = self._conn.execute("SELECT trigrams FROM files WHERE id = ?", (file_id,)).fetchone()
+        blob = row[0] if row and row[0] else b''
+        for i in range(0, len(blob), 3):
+            adds, removes = deltas.setdefault(blob[i:i + 3], (set(), set()))
+            adds.discard(file_id)
+            removes.add(file_id)
+
+    def _index_file(self, path: str, stat: Tuple[int, int], file_id: Optional[int],
+                    deltas: Dict[bytes, Tuple[Set[int], Set[int]]]) -> None:
+        grams: Set[bytes] = set()
+        status = _UNINDEXED
+        if stat[1] <= MAX_INDEXED_FILE_BYTES:
+            try:
+                with open(os.path.join(self.root, path), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                data = None
+            if data is not None:
+                if b'\0' in data[:8192]:
+                    status = _BINARY
+                else:
+                    status = _INDEXED
+                    grams = file_trigrams(data)
+
+        blob = b''.join(sorted(grams)) if status == _INDEXED else None
+        if file_id is None:
+            file_id = self._conn.execute(
+                "INSERT INTO files (path, mtime_ns, size, status, trigrams) VALUES (?, ?, ?, ?, ?)",
+                (path, stat[0], stat[1], status, blob)
+            ).lastrowid
+        else:
+            self._conn.execute(
+                "UPDATE files SET mtime_ns = ?, size = ?, status = ?, trigrams = ? WHERE id = ?",
+                (stat[0], stat[1], status, blob, file_id)
+            )
+        for gram in grams:
+            adds, removes = deltas.setdefault(gram, (set(), set()))
+            removes.discard(file_id)
+            adds.add(file_id)
+
+    def _write_postings(self, deltas: Dict[bytes, Tuple[Set[int], Set[int]]]) -> None:
+        for gram, (adds, removes) in deltas.items():
+            row = self._conn.execute("SELECT files FROM postings WHERE trigram = ?", (gram,)).fetchone()
+            file_ids = set(array.array('I', row[0])) if row else set()
+            file_ids = (file_ids - removes) | adds
+            if file_ids:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO postings (trigram, files) VALUES (?, ?)",
+                    (gram, array.array('I', sorted(file_ids)).tobytes())
+                )
+            elif row:
+                self._conn.execute("DELETE FROM postings WHERE trigram = ?", (gram,))
+        deltas.clear()
+
+    def _posting(self, gram: bytes) -> Set[int]:
+        row = self._conn.execute("SELECT files FROM postings WHERE trigram = ?", (gram,)).fetchone()
+        return set(array.array('I', row[0])) if row else set()
+
+    def _evaluate(self, query: Query) -> Optional[Set[int]]:
+        """File IDs that may satisfy a query, or None for any file."""
+        if query is None:
+            return None
+        op = query[0]
+        if op == 'lit':
+            grams = _literal_trigrams(query[1], query[2])
+            if not grams:
+                return None
+            postings = sorted((self._posting(gram) for gram in grams), key=len)
+            result = postings[0]
+            for posting in postings[1:]:
+                if not result:
+                    break
+                result &= posting
+            return result
+        results = [self._evaluate(part) for part in query[1]]
+        if op == 'or':
+            if any(result is None for result in results):
+                return None
+            return set().union(*results)
+        result = None
+        for part in results:
+            if part is not None:
+                result = part if result is None else result & part
+        return result
+
+    def candidates(self, pattern: str, ignore_case: bool = False) -> Optional[List[str]]:
+        """Files that may contain a match of a regex, per the index as last updated.
+
+        Files too large to index are always included; binary files never are.
+
+        Returns:
+            Sorted paths relative to the root, or None if the index cannot
+            narrow the search (search every file instead)
+        """
+        query = regex_query(pattern, ignore_case)
+        with self._lock:
+            file_ids = self._evaluate(query)
+            if file_ids is None:
+                return None
+            rows = self._conn.execute("SELECT id, path, status FROM files WHERE status != ?", (_BINARY,)).fetchall()
+        return sorted(path for file_id, path, status in rows if status == _UNINDEXED or file_id in file_ids)
+
+
+_indexes: Dict[str, TrigramIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_search_index(root: str = '.') -> TrigramIndex:
+    """Get the process-wide index of a directory, opening it if needed."""
+    key = os.path.realpath(root)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = TrigramIndex(root)
+        return index
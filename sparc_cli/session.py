@@ -0,0 +1,243 @@
+"""Durable SQLite-backed storage for agent memory and stage progress.
+
+A session mirrors the persistent parts of `_global_memory` into a SQLite
+database so an interrupted run can be resumed without repeating completed
+stages. Writes are batched: a background thread periodically flushes only the
+memory categories that changed since the last flush.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sparc_cli.tools.memory import (
+    MemoryStore,
+    export_memory,
+    get_memory_store,
+    load_memory,
+    use_memory_store,
+    PERSISTENT_MEMORY_KEYS
+)
+
+DEFAULT_SESSION_DB = os.path.join('.sparc', 'sessions.db')
+DEFAULT_FLUSH_INTERVAL = 2.0  # Seconds between write-behind flushes
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    base_task TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS memory (
+    session_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (session_id, key)
+);
+CREATE TABLE IF NOT EXISTS stages (
+    session_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    completed_at TEXT NOT NULL,
+    PRIMARY KEY (session_id, stage)
+);
+"""
+
+
+class SessionStore:
+    """Persist memory for a named session in SQLite (WAL mode).
+
+    Example:
+        session = SessionStore("my-session")
+        if resume:
+            session.restore()
+        session.start(base_task)
+        ...
+        session.complete_stage("research")
+        session.close()
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        db_path: str = DEFAULT_SESSION_DB,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        store: Optional[MemoryStore] = None
+    ):
+        """Open (and create if needed) the session database.
+
+        Args:
+            session_id: Name of the session
+            db_path: Path to the SQLite database file
+            flush_interval: Seconds between background flushes of changed memory
+            store: Memory store to persist (default: the current context's store)
+        """
+        self.session_id = session_id
+        self.store = store if store is not None else get_memory_store()
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # Last written state per key: (container, version, serialized value)
+        self._written: Dict[str, Tuple[Any, Optional[int], str]] = {}
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().isoformat()
+
+    def exists(self) -> bool:
+        """Check whether the session has been started before."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM sessions WHERE id = ?", (self.session_id,)
+            ).fetchone()
+        return row is not None
+
+    @property
+    def base_task(self) -> Optional[str]:
+        """The base task recorded for this session, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT base_task FROM sessions WHERE id = ?", (self.session_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def reset(self) -> None:
+        """Delete all stored memory and stage progress for this session."""
+        with self._lock, self._conn:
+            for table, column in (('memory', 'session_id'), ('stages', 'session_id'), ('sessions', 'id')):
+                self._conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (self.session_id,))
+            self._written.clear()
+
+    def restore(self) -> None:
+        """Load the stored memory of this session into global memory."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM memory WHERE session_id = ?", (self.session_id,)
+            ).fetchall()
+        with use_memory_store(self.store):
+            load_memory({key: json.loads(value) for key, value in rows})
+        # Restored values are already persisted
+        self._written.clear()
+        for key, value in rows:
+            container = self.store.get(key)
+            self._written[key] = (container, getattr(container, 'version', None), value)
+
+    def start(self, base_task: Optional[str] = None) -> None:
+        """Record the session and start background write-behind flushing.
+
+        Args:
+            base_task: The task being worked on, kept for resuming without -m
+        """
+        now = self._now()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sessions (id, base_task, created_at, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET base_task = COALESCE(excluded.base_task, base_task), "
+                "updated_at = excluded.updated_at",
+                (self.session_id, base_task, now, now)
+            )
+
+        if self._flusher is None and self.flush_interval > 0:
+            self._stop.clear()
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name=f"sparc-session-{self.session_id}", daemon=True
+            )
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self) -> int:
+        """Write memory categories changed since the last flush in one transaction.
+
+        Versioned containers are skipped without serializing when their
+        version is unchanged.
+
+        Returns:
+            Number of memory keys written
+        """
+        with self._flush_lock:
+            with use_memory_store(self.store), self.store.lock:
+                pending = self._collect_changes()
+            return self._write(pending)
+
+    def _collect_changes(self) -> List[Tuple[str, Any, Optional[int], str]]:
+        pending = []
+        for key in PERSISTENT_MEMORY_KEYS:
+            if key not in self.store:
+                continue
+            container = self.store[key]
+            version = getattr(container, 'version', None)
+            written = self._written.get(key)
+            if (written is not None and version is not None
+                    and written[0] is container and written[1] == version):
+                continue
+            serialized = json.dumps(export_memory([key]).get(key), default=str)
+            if written is not None and written[2] == serialized:
+                self._written[key] = (container, version, serialized)
+                continue
+            pending.append((key, container, version, serialized))
+        return pending
+
+    def _write(self, pending: List[Tuple[str, Any, Optional[int], str]]) -> int:
+        if not pending:
+            return 0
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO memory (session_id, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id, key) DO UPDATE SET value = excluded.value",
+                [(self.session_id, key, serialized) for key, _, _, serialized in pending]
+            )
+            self._conn.execute(
+                "UPDATE sessions SET updated_at = ? WHERE id = ?", (self._now(), self.session_id)
+            )
+        for key, container, version, serialized in pending:
+            self._written[key] = (container, version, serialized)
+        return len(pending)
+
+    def complete_stage(self, stage: str) -> None:
+        """Flush memory and mark a stage as completed."""
+        self.flush()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stages (session_id, stage, completed_at) VALUES (?, ?, ?)",
+                (self.session_id, stage, self._now())
+            )
+
+    def is_stage_completed(self, stage: str) -> bool:
+        """Check whether a stage was completed in this session."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM stages WHERE session_id = ? AND stage = ?", (self.session_id, stage)
+            ).fetchone()
+        return row is not None
+
+    def close(self) -> None:
+        """Stop background flushing, write pending changes and close the database."""
+        if self._flusher is not None:
+            self._stop.set()
+            self._flusher.join()
+            self._flusher = None
+        try:
+            self.flush()
+        finally:
+            self._conn.close()
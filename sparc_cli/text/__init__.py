@@ -1,3 +1,4 @@
 from .processing import truncate_output
+from .tokens import estimate_tokens, count_tokens, set_tokenizer, tiktoken_tokenizer
 
-__all__ = ['truncate_output']
+__all__ = ['truncate_output', 'estimate_tokens', 'count_tokens', 'set_tokenizer', 'tiktoken_tokenizer']
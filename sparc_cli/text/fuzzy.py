@@ -0,0 +1,108 @@
+"""Fuzzy matching of file paths.
+
+Paths are first prefiltered cheaply: a path is only scored if the query's
+characters appear in it in order, or it contains at least half of the
+query's character bigrams. Survivors are scored against both their basename
+and their full path, with basename hits ranked higher, and the best results
+are picked with a heap instead of sorting everything.
+
+Scoring uses rapidfuzz when it is installed (batched, in C) and fuzzywuzzy
+otherwise. Scores are 0-100 in both cases.
+"""
+
+import heapq
+import re
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from fuzzywuzzy import fuzz as _fuzzywuzzy
+
+try:
+    from rapidfuzz import fuzz as _rapidfuzz, process as _rapidfuzz_process, utils as _rapidfuzz_utils
+except ImportError:  # Optional; much faster on large repositories
+    _rapidfuzz = None
+
+# Full-path scores count this much relative to basename scores
+PATH_WEIGHT = 0.9
+
+
+def _bigrams(text: str) -> List[str]:
+    return list(dict.fromkeys(text[i:i + 2] for i in range(len(text) - 1)))
+
+
+def prefilter(query: str, paths: Sequence[str]) -> List[int]:
+    """Indexes of the paths worth scoring for a query.
+
+    A path qualifies if it contains the query's characters in order
+    (case-insensitively), or at least half of the query's bigrams.
+    """
+    query = query.lower()
+    subsequence = re.compile('.*?'.join(map(re.escape, query)), re.DOTALL)
+    bigrams = _bigrams(query)
+    needed = (len(bigrams) + 1) // 2
+    selected = []
+    for index, path in enumerate(paths):
+        path = path.lower()
+        if subsequence.search(path):
+            selected.append(index)
+        elif needed and sum(bigram in path for bigram in bigrams) >= needed:
+            selected.append(index)
+    return selected
+
+
+def _score_all(query: str, choices: Sequence[str]) -> List[float]:
+    """WRatio of the query against each choice."""
+    if _rapidfuzz is not None:
+        scores = [0.0] * len(choices)
+        for _, score, index in _rapidfuzz_process.extract(
+            query, choices, scorer=_rapidfuzz.WRatio, processor=_rapidfuzz_utils.default_process, limit=None
+        ):
+            scores[index] = score
+        return scores
+    return [_fuzzywuzzy.WRatio(query, choice) for choice in choices]
+
+
+def fuzzy_match_paths(
+    query: str,
+    paths: Sequence[str],
+    limit: int = 10,
+    threshold: int = 0,
+    scorer: Optional[Callable[[str, Sequence[str]], List[float]]] = None
+) -> List[Tuple[str, int]]:
+    """Find the paths that best match a query.
+
+    A path's score is the better of its basename score and its weighted
+    full-path score; an exact basename or stem match scores 100. Paths the
+    prefilter rejects do not match at all.
+
+    Args:
+        query: What to look for, e.g. "user model" or "cfgldr"
+        paths: Candidate paths, '/'-separated
+        limit: Maximum number of results
+        threshold: Minimum score (0-100) of a result
+        scorer: Scores a query against a list of strings (default: WRatio)
+
+    Returns:
+        Up to limit (path, score) tuples, best first; ties go to the shorter path
+    """
+    if not query or limit < 1:
+        return []
+    score_all = scorer or _score_all
+    candidates = [paths[index] for index in prefilter(query, paths)]
+    if not candidates:
+        return []
+
+    basenames = [path.rsplit('/', 1)[-1] for path in candidates]
+    base_scores = score_all(query, basenames)
+    path_scores = score_all(query, candidates)
+    lowered = query.lower()
+
+    scored = []
+    for path, basename, base_score, path_score in zip(candidates, basenames, base_scores, path_scores):
+        basename = basename.lower()
+        if basename == lowered or basename.rsplit('.', 1)[0] == lowered:
+            score = 100
+        else:
+            score = round(max(base_score, path_score * PATH_WEIGHT))
+        if score >= threshold and score > 0:
+            scored.append((path, score))
+    return heapq.nlargest(limit, scored, key=lambda match: (match[1], -len(match[0])))
@@ -0,0 +1,71 @@
+import math
+from typing import Callable, Optional
+
+# Average number of characters per token for English prose and source code
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a string.
+
+    Uses a fast character-count heuristic rather than a real tokenizer, which
+    is accurate enough for budgeting prompt sections.
+
+    Args:
+        text: The text to measure
+
+    Returns:
+        Estimated token count (0 for empty text)
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+# Tokenizer used by count_tokens(); None means the estimate_tokens() heuristic
+_tokenizer: Optional[Callable[[str], int]] = None
+
+def set_tokenizer(tokenizer: Optional[Callable[[str], int]]) -> None:
+    """Set the tokenizer used by count_tokens().
+
+    Args:
+        tokenizer: Function returning the token count of a string, or None to
+                   use the estimate_tokens() heuristic
+    """
+    global _tokenizer
+    _tokenizer = tokenizer
+
+def count_tokens(text: str) -> int:
+    """Count the tokens in a string with the configured tokenizer.
+
+    Falls back to estimate_tokens() when no tokenizer is set or it fails.
+
+    Args:
+        text: The text to measure
+
+    Returns:
+        Token count (0 for empty text)
+    """
+    if not text:
+        return 0
+    tokenizer = _tokenizer
+    if tokenizer is not None:
+        try:
+            return tokenizer(text)
+        except Exception:
+            pass
+    return estimate_tokens(text)
+
+def tiktoken_tokenizer(encoding_name: str = 'cl100k_base') -> Optional[Callable[[str], int]]:
+    """Create a tokenizer backed by tiktoken, for use with set_tokenizer().
+
+    Args:
+        encoding_name: tiktoken encoding to use
+
+    Returns:
+        The tokenizer, or None if tiktoken or the encoding is unavailable
+    """
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(encoding_name)
+    except Exception:
+        return None
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
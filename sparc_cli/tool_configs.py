@@ -6,12 +6,15 @@ from sparc_cli.tools import (
     emit_key_snippets, delete_key_snippets, deregister_related_files, delete_tasks, read_file_tool,
     fuzzy_find_project_files, ripgrep_search, list_directory_tree,
     swap_task_order, monorepo_detected, existing_project_detected, ui_detected,
-    task_completed, plan_implementation_completed
+    task_completed, plan_implementation_completed, read_memory, recall_tool_output
 )
 from sparc_cli.tools.math.evaluator import CalculatorTool, SymbolicSolverTool
 from sparc_cli.tools.scrape import scrape_url_tool
 from sparc_cli.tools.memory import one_shot_completed
-from sparc_cli.tools.agent import request_research, request_implementation, request_research_and_implementation, request_task_implementation
+from sparc_cli.tools.agent import (
+    request_research, request_research_batch, request_implementation,
+    request_research_and_implementation, request_task_implementation, run_planned_tasks
+)
 
 # Read-only tools that don't modify system state
 def get_read_only_tools(human_interaction: bool = False) -> list:
@@ -23,6 +26,8 @@ def get_read_only_tools(human_interaction: bool = False) -> list:
         emit_key_snippets,
         delete_key_snippets,
         deregister_related_files,
+        read_memory,
+        recall_tool_output,
         list_directory_tree,
         read_file_tool,
         fuzzy_find_project_files,
@@ -67,6 +72,7 @@ def get_research_tools(research_only: bool = False, expert_enabled: bool = True,
     
     # Add chat-specific tools
     tools.append(request_research)
+    tools.append(request_research_batch)
     
     return tools
 
@@ -82,6 +88,7 @@ def get_planning_tools(expert_enabled: bool = True) -> list:
         emit_task,
         swap_task_order,
         request_task_implementation,
+        run_planned_tasks,
         plan_implementation_completed
     ]
     tools.extend(planning_tools)
@@ -118,11 +125,14 @@ def get_chat_tools(expert_enabled: bool = True) -> list:
     tools = [
         ask_human,
         request_research,
+        request_research_batch,
         request_research_and_implementation,
         emit_key_facts,
         delete_key_facts,
         delete_key_snippets,
         deregister_related_files,
+        read_memory,
+        recall_tool_output,
         scrape_url_tool,
         CalculatorTool(),
         SymbolicSolverTool()
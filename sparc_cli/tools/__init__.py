@@ -14,11 +14,12 @@ from .write_file import write_file_tool
 from .fuzzy_find import fuzzy_find_project_files
 from .list_directory import list_directory_tree
 from .ripgrep import ripgrep_search
+from .history import recall_tool_output
 from .memory import (
     delete_tasks, emit_research_notes, emit_plan, emit_task, get_memory_value, emit_key_facts,
     request_implementation, delete_key_facts,
     emit_key_snippets, delete_key_snippets, emit_related_files, swap_task_order, task_completed,
-    plan_implementation_completed, deregister_related_files
+    plan_implementation_completed, deregister_related_files, read_memory
 )
 
 __all__ = [
@@ -39,6 +40,8 @@ __all__ = [
     'get_memory_value',
     'list_directory_tree',
     'read_file_tool',
+    'read_memory',
+    'recall_tool_output',
     'request_implementation',
     'run_programming_task',
     'run_shell_command',
@@ -1,23 +1,40 @@
 """Tools for spawning and managing sub-agents."""
 
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.tools import tool
-from typing import Dict, Any, Union, List
+from typing import Dict, Any, Union, List, Optional, Tuple
 from typing_extensions import TypeAlias
 
-ResearchResult = Dict[str, Union[str, bool, Dict[int, Any], List[Any], None]]
+ResearchResult = Dict[str, Union[str, bool, Dict[str, Any], List[Any], None]]
 from rich.console import Console
 from sparc_cli.tools.memory import _global_memory
 from sparc_cli.console.formatting import print_error, print_interrupt
-from .memory import get_memory_value, get_related_files, get_work_log, reset_work_log
+from .memory import (
+    get_related_file_paths, get_work_log, reset_work_log, work_span,
+    snapshot_memory, diff_memory, render_memory_diff, MemorySnapshot, MemoryDiff, MEMORY_HANDLE,
+    MemoryStore, fork_memory_store, get_memory_store, merge_memory, use_memory_store, log_work_event
+)
 from ..llm import initialize_llm
+from ..scheduler import DEFAULT_TASK_CONCURRENCY, TaskNode, TaskOutcome, TaskScheduler
 from ..console import print_task_header
 
 CANCELLED_BY_USER_REASON = "The operation was explicitly cancelled by the user. This typically is an indication that the action requested was not aligned with the user request."
 
 RESEARCH_AGENT_RECURSION_LIMIT = 2
 
+# Default number of research agents request_research_batch runs at once
+RESEARCH_BATCH_CONCURRENCY = 4
+
 console = Console()
 
+def _memory_payload(snapshot: MemorySnapshot) -> Dict[str, Any]:
+    """Memory changes made since the snapshot, plus a handle to the full view."""
+    return {
+        "memory_changes": render_memory_diff(diff_memory(snapshot)),
+        "memory_handle": MEMORY_HANDLE
+    }
+
 @tool("request_research")
 def request_research(query: str) -> ResearchResult:
     """Spawn a research-only agent to investigate the given query.
@@ -31,6 +48,7 @@ def request_research(query: str) -> ResearchResult:
     # Initialize model from config
     config = _global_memory.get('config', {})
     model = initialize_llm(config.get('provider', 'anthropic'), config.get('model', 'claude-3-5-sonnet-20241022'))
+    snapshot = snapshot_memory()
     
     # Check recursion depth
     current_depth = _global_memory.get('agent_depth', 0)
@@ -38,10 +56,7 @@ def request_research(query: str) -> ResearchResult:
         print_error("Maximum research recursion depth reached")
         return {
             "completion_message": "Research stopped - maximum recursion depth reached",
-            "key_facts": get_memory_value("key_facts"),
-            "related_files": get_related_files(),
-            "research_notes": get_memory_value("research_notes"),
-            "key_snippets": get_memory_value("key_snippets"),
+            **_memory_payload(snapshot),
             "success": False,
             "reason": "max_depth_exceeded"
         }
@@ -52,14 +67,15 @@ def request_research(query: str) -> ResearchResult:
     try:
         # Run research agent
         from ..agent_utils import run_research_agent
-        result = run_research_agent(
-            query,
-            model,
-            expert_enabled=True,
-            research_only=True,
-            hil=config.get('hil', False),
-            console_message=query
-        )
+        with work_span('agent', f"Research: {query}", tool='request_research'):
+            result = run_research_agent(
+                query,
+                model,
+                expert_enabled=True,
+                research_only=True,
+                hil=config.get('hil', False),
+                console_message=query
+            )
     except KeyboardInterrupt:
         print_interrupt("Research interrupted by user")
         success = False
@@ -84,14 +100,113 @@ def request_research(query: str) -> ResearchResult:
     return {
         "work_log": work_log,
         "completion_message": completion_message,
-        "key_facts": get_memory_value("key_facts"),
-        "related_files": get_related_files(),
-        "research_notes": get_memory_value("research_notes"),
-        "key_snippets": get_memory_value("key_snippets"),
+        **_memory_payload(snapshot),
         "success": success,
         "reason": reason
     }
 
+def _run_isolated_research(
+    query: str, model, store: MemoryStore
+) -> Tuple[MemoryDiff, bool, Optional[str], Optional[str]]:
+    """Run a research-only agent in its own memory store.
+
+    Returns:
+        Tuple of (memory changes, success, failure reason, completion message)
+    """
+    from ..agent_utils import run_research_agent
+
+    with use_memory_store(store):
+        snapshot = snapshot_memory()
+        success = True
+        reason = None
+        try:
+            with work_span('agent', f"Research: {query}", tool='request_research_batch'):
+                # Concurrent agents cannot share the terminal with a human
+                run_research_agent(
+                    query,
+                    model,
+                    expert_enabled=True,
+                    research_only=True,
+                    hil=False,
+                    console_message=query
+                )
+        except KeyboardInterrupt:
+            success = False
+            reason = CANCELLED_BY_USER_REASON
+        except Exception as e:
+            print_error(f"Error during research: {str(e)}")
+            success = False
+            reason = f"error: {str(e)}"
+        return diff_memory(snapshot), success, reason, store.get('completion_message') or None
+
+@tool("request_research_batch")
+def request_research_batch(queries: List[str]) -> Dict[str, Any]:
+    """Spawn research-only agents to investigate several independent queries concurrently.
+
+    Prefer this over consecutive request_research calls when the questions do
+    not depend on each other's answers. Each agent works in isolated memory;
+    the key facts, key snippets, research notes and related files they record
+    are merged back afterwards with duplicates removed.
+
+    Args:
+        queries: The independent research questions
+    """
+    from ..agent_utils import agent_cancel_group
+
+    config = _global_memory.get('config', {})
+    model = initialize_llm(config.get('provider', 'anthropic'), config.get('model', 'claude-3-5-sonnet-20241022'))
+    snapshot = snapshot_memory()
+
+    current_depth = _global_memory.get('agent_depth', 0)
+    if current_depth >= RESEARCH_AGENT_RECURSION_LIMIT:
+        print_error("Maximum research recursion depth reached")
+        return {
+            "completion_message": "Research stopped - maximum recursion depth reached",
+            **_memory_payload(snapshot),
+            "success": False,
+            "reason": "max_depth_exceeded"
+        }
+
+    queries = list(dict.fromkeys(query.strip() for query in queries if query.strip()))
+    stores = [fork_memory_store() for _ in queries]
+    concurrency = max(1, min(config.get('research_concurrency', RESEARCH_BATCH_CONCURRENCY), len(queries) or 1))
+
+    # One Ctrl-C cancels every agent of the batch, including ones not started yet
+    with agent_cancel_group() as group, ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='sparc-research') as pool:
+        # Each agent runs in a copy of this context, so its trace spans nest under this call
+        futures = [
+            pool.submit(contextvars.copy_context().run, _run_isolated_research, query, model, store)
+            for query, store in zip(queries, stores)
+        ]
+        outcomes = [future.result() for future in futures]
+    if group.cancelled:
+        print_interrupt("Research batch interrupted by user")
+
+    # Merge in query order so IDs do not depend on which agent finished first
+    results = []
+    for query, store, (diff, success, reason, completion_message) in zip(queries, stores, outcomes):
+        merge_memory(diff, store['work_log'])
+        results.append({
+            "query": query,
+            "success": success,
+            "reason": reason,
+            "completion_message": completion_message
+        })
+
+    # Get and reset work log if at root depth
+    work_log = get_work_log() if current_depth == 1 else None
+    if current_depth == 1:
+        reset_work_log()
+
+    failed = [result["query"] for result in results if not result["success"]]
+    return {
+        "work_log": work_log,
+        "results": results,
+        **_memory_payload(snapshot),
+        "success": not failed,
+        "reason": f"{len(failed)} of {len(results)} queries failed" if failed else None
+    }
+
 @tool("request_research_and_implementation")
 def request_research_and_implementation(query: str) -> Dict[str, Any]:
     """Spawn a research agent to investigate and implement the given query.
@@ -102,18 +217,20 @@ def request_research_and_implementation(query: str) -> Dict[str, Any]:
     # Initialize model from config
     config = _global_memory.get('config', {})
     model = initialize_llm(config.get('provider', 'anthropic'), config.get('model', 'claude-3-5-sonnet-20241022'))
+    snapshot = snapshot_memory()
     
     try:
         # Run research agent
         from ..agent_utils import run_research_agent
-        result = run_research_agent(
-            query,
-            model,
-            expert_enabled=True,
-            research_only=False,
-            hil=config.get('hil', False),
-            console_message=query
-        )
+        with work_span('agent', f"Research and implementation: {query}", tool='request_research_and_implementation'):
+            result = run_research_agent(
+                query,
+                model,
+                expert_enabled=True,
+                research_only=False,
+                hil=config.get('hil', False),
+                console_message=query
+            )
         
         success = True
         reason = None
@@ -143,10 +260,7 @@ def request_research_and_implementation(query: str) -> Dict[str, Any]:
     return {
         "work_log": work_log,
         "completion_message": completion_message,
-        "key_facts": get_memory_value("key_facts"),
-        "related_files": get_related_files(),
-        "research_notes": get_memory_value("research_notes"),
-        "key_snippets": get_memory_value("key_snippets"),
+        **_memory_payload(snapshot),
         "success": success,
         "reason": reason
     }
@@ -161,25 +275,27 @@ def request_task_implementation(task_spec: str) -> Dict[str, Any]:
     # Initialize model from config
     config = _global_memory.get('config', {})
     model = initialize_llm(config.get('provider', 'anthropic'), config.get('model', 'claude-3-5-sonnet-20241022'))
+    snapshot = snapshot_memory()
     
     # Get required parameters
     tasks = [_global_memory['tasks'][task_id] for task_id in sorted(_global_memory['tasks'])]
     plan = _global_memory.get('plan', '')
-    related_files = list(_global_memory['related_files'].values())
+    related_files = get_related_file_paths()
     
     try:
         print_task_header(task_spec)
         # Run implementation agent
         from ..agent_utils import run_task_implementation_agent
-        result = run_task_implementation_agent(
-            base_task=_global_memory.get('base_task', ''),
-            tasks=tasks,
-            task=task_spec,
-            plan=plan, 
-            related_files=related_files,
-            model=model,
-            expert_enabled=True
-        )
+        with work_span('agent', f"Task implementation: {task_spec}", tool='request_task_implementation'):
+            result = run_task_implementation_agent(
+                base_task=_global_memory.get('base_task', ''),
+                tasks=tasks,
+                task=task_spec,
+                plan=plan, 
+                related_files=related_files,
+                model=model,
+                expert_enabled=True
+            )
         
         success = True
         reason = None
@@ -207,14 +323,149 @@ def request_task_implementation(task_spec: str) -> Dict[str, Any]:
         
     return {
         "work_log": work_log,
-        "key_facts": get_memory_value("key_facts"),
-        "related_files": get_related_files(),
-        "key_snippets": get_memory_value("key_snippets"),
         "completion_message": completion_message,
+        **_memory_payload(snapshot),
         "success": success,
         "reason": reason
     }
 
+def _run_isolated_task(node: TaskNode, model, store: MemoryStore, context: Dict[str, Any]) -> Dict[str, Any]:
+    """Run an implementation agent for one planned task in its own memory store."""
+    from ..agent_utils import run_task_implementation_agent
+
+    with use_memory_store(store):
+        snapshot = snapshot_memory()
+        with work_span('agent', f"Task implementation: {node.description}", tool='run_planned_tasks',
+                       refs={'tasks': [node.id]}):
+            run_task_implementation_agent(
+                task=node.description,
+                model=model,
+                expert_enabled=True,
+                **context
+            )
+        return {
+            "success": True,
+            "diff": diff_memory(snapshot),
+            "completion_message": store.get('completion_message') or None
+        }
+
+def _report_task_event(event: str, node: TaskNode, outcome: Optional[TaskOutcome]) -> None:
+    """Print scheduler progress and record it in the work log."""
+    reason = outcome['reason'] if outcome else None
+    styles = {'started': 'cyan', 'completed': 'green', 'failed': 'red', 'skipped': 'yellow', 'cancelled': 'yellow'}
+    summary = node.description.strip().splitlines()[0][:80] if node.description.strip() else ''
+    message = f"Task #{node.id} {event}: {summary}" + (f" ({reason})" if reason else "")
+    console.print(f"[{styles[event]}]{message}[/{styles[event]}]")
+    if event != 'started':
+        log_work_event(message, kind='task', tool='run_planned_tasks', refs={'tasks': [node.id]})
+
+@tool("run_planned_tasks")
+def run_planned_tasks(task_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+    """Implement planned tasks, running independent ones concurrently.
+
+    A task starts once the tasks it depends on (see emit_task's depends_on)
+    have completed and no running task writes the same files. Tasks that did
+    not declare their files run alone. If a task fails, the tasks depending
+    on it are skipped.
+
+    Args:
+        task_ids: Tasks to implement (default: all stored tasks). Dependencies outside this list are treated as done.
+    """
+    from ..agent_utils import agent_cancel_group
+
+    config = _global_memory.get('config', {})
+    model = initialize_llm(config.get('provider', 'anthropic'), config.get('model', 'claude-3-5-sonnet-20241022'))
+    snapshot = snapshot_memory()
+
+    tasks = _global_memory['tasks']
+    task_deps = _global_memory.get('task_deps', {})
+    selected = sorted(tasks) if task_ids is None else sorted(set(task_ids) & set(tasks))
+    nodes = [
+        TaskNode(
+            id=task_id,
+            description=tasks[task_id],
+            depends_on=[dep for dep in task_deps.get(task_id, {}).get('depends_on', []) if dep in selected],
+            files=list(task_deps.get(task_id, {}).get('files', []))
+        )
+        for task_id in selected
+    ]
+    context = dict(
+        base_task=_global_memory.get('base_task', ''),
+        tasks=[tasks[task_id] for task_id in sorted(tasks)],
+        plan=_global_memory.get('plan', ''),
+        related_files=get_related_file_paths()
+    )
+
+    parent = get_memory_store()
+    stores: Dict[int, MemoryStore] = {}
+
+    def run(node: TaskNode) -> Dict[str, Any]:
+        # Forked when the task starts, so it includes its prerequisites' results
+        with use_memory_store(parent):
+            stores[node.id] = fork_memory_store()
+        return _run_isolated_task(node, model, stores[node.id], context)
+
+    def publish(node: TaskNode, outcome: TaskOutcome) -> None:
+        result = outcome['result']
+        if result and result.get('diff') is not None:
+            merge_memory(result['diff'], stores[node.id]['work_log'])
+
+    try:
+        scheduler = TaskScheduler(
+            nodes,
+            run=run,
+            max_workers=config.get('task_concurrency', DEFAULT_TASK_CONCURRENCY),
+            on_event=_report_task_event,
+            on_task_done=publish
+        )
+    except ValueError as e:
+        print_error(str(e))
+        return {"work_log": None, "results": [], **_memory_payload(snapshot), "success": False, "reason": str(e)}
+
+    interrupted = False
+    try:
+        # One Ctrl-C cancels every running task agent, and tasks not started yet never start
+        with agent_cancel_group():
+            outcomes = scheduler.run()
+    except KeyboardInterrupt:
+        print_interrupt("Task execution interrupted by user")
+        outcomes = scheduler.outcomes
+        interrupted = True
+
+    results = [
+        {
+            "task_id": node.id,
+            "status": outcomes[node.id]['status'],
+            "reason": CANCELLED_BY_USER_REASON if outcomes[node.id]['status'] == 'cancelled' else outcomes[node.id]['reason'],
+            "completion_message": (outcomes[node.id]['result'] or {}).get('completion_message')
+        }
+        for node in nodes if node.id in outcomes
+    ]
+
+    # Get and reset work log if at root depth
+    current_depth = _global_memory.get('agent_depth', 0)
+    work_log = get_work_log() if current_depth == 1 else None
+    if current_depth == 1:
+        reset_work_log()
+
+    _global_memory['completion_message'] = ''
+    _global_memory['task_completed'] = False
+
+    incomplete = [result["task_id"] for result in results if result["status"] != 'completed']
+    if interrupted:
+        reason = CANCELLED_BY_USER_REASON
+    elif incomplete:
+        reason = f"{len(incomplete)} of {len(results)} tasks did not complete: {incomplete}"
+    else:
+        reason = None
+    return {
+        "work_log": work_log,
+        "results": results,
+        **_memory_payload(snapshot),
+        "success": not incomplete and not interrupted,
+        "reason": reason
+    }
+
 @tool("request_implementation")
 def request_implementation(task_spec: str) -> Dict[str, Any]:
     """Spawn a planning agent to create an implementation plan for the given task.
@@ -225,17 +476,19 @@ def request_implementation(task_spec: str) -> Dict[str, Any]:
     # Initialize model from config
     config = _global_memory.get('config', {})
     model = initialize_llm(config.get('provider', 'anthropic'), config.get('model', 'claude-3-5-sonnet-20241022'))
+    snapshot = snapshot_memory()
     
     try:
         # Run planning agent
         from ..agent_utils import run_planning_agent
-        result = run_planning_agent(
-            task_spec,
-            model,
-            config=config,
-            expert_enabled=True,
-            hil=config.get('hil', False)
-        )
+        with work_span('agent', f"Planning: {task_spec}", tool='request_implementation'):
+            result = run_planning_agent(
+                task_spec,
+                model,
+                config=config,
+                expert_enabled=True,
+                hil=config.get('hil', False)
+            )
         
         success = True
         reason = None
@@ -265,9 +518,7 @@ def request_implementation(task_spec: str) -> Dict[str, Any]:
     return {
         "work_log": work_log,
         "completion_message": completion_message,
-        "key_facts": get_memory_value("key_facts"),
-        "related_files": get_related_files(),
-        "key_snippets": get_memory_value("key_snippets"),
+        **_memory_payload(snapshot),
         "success": success,
         "reason": reason
     }
@@ -5,7 +5,7 @@ from rich.console import Console
 from rich.panel import Panel
 from rich.markdown import Markdown
 from ..llm import initialize_expert_llm
-from .memory import get_memory_value, get_related_files, _global_memory
+from .memory import get_packed_memory_value, get_related_file_paths, _global_memory
 
 console = Console()
 _model = None
@@ -128,10 +128,10 @@ def ask_expert(question: str) -> str:
     global expert_context
     
     # Get all content first
-    file_paths = expert_context['files'] + list(get_related_files())
+    file_paths = expert_context['files'] + get_related_file_paths()
     related_contents = read_related_files(file_paths)
-    key_snippets = get_memory_value('key_snippets')
-    key_facts = get_memory_value('key_facts')
+    key_snippets = get_packed_memory_value('key_snippets')
+    key_facts = get_packed_memory_value('key_facts')
     
     # Build display query (just question)
     display_query = "# Question\n" + question
@@ -1,11 +1,10 @@
 from typing import List, Tuple
-import fnmatch
-from git import Repo
-from fuzzywuzzy import process
 from langchain_core.tools import tool
 from rich.console import Console
 from rich.panel import Panel
 from rich.markdown import Markdown
+from sparc_cli.project_files import PathMatcher, get_project_files
+from sparc_cli.text.fuzzy import fuzzy_match_paths
 
 console = Console()
 
@@ -32,7 +31,11 @@ def fuzzy_find_project_files(
     
     This tool searches for files within a git repository using fuzzy string matching,
     allowing for approximate matches to the search term. It returns a list of matched
-    files along with their match scores.
+    files along with their match scores. Outside a git repository, all files are searched.
+    
+    The file list is cached and only re-read when the repository changes. Paths
+    are scored on their file name first and their full path second, so a term
+    naming a file ranks that file above paths that merely contain the letters.
     
     Args:
         search_term: String to match against file paths
@@ -46,7 +49,6 @@ def fuzzy_find_project_files(
         List of tuples containing (file_path, match_score)
         
     Raises:
-        InvalidGitRepositoryError: If repo_path is not a git repository
         ValueError: If threshold is not between 0 and 100
     """
     # Validate threshold
@@ -57,49 +59,20 @@ def fuzzy_find_project_files(
     if not search_term:
         return []
 
-    # Initialize repo for normal search
-    repo = Repo(repo_path)
-    
-    # Get all tracked files
-    tracked_files = repo.git.ls_files().splitlines()
-    
-    # Get all untracked files
-    untracked_files = repo.untracked_files
-    
-    # Combine file lists
-    all_files = tracked_files + untracked_files
-    
-    # Apply include patterns if specified
-    if include_paths:
-        filtered_files = []
-        for pattern in include_paths:
-            filtered_files.extend(
-                f for f in all_files 
-                if fnmatch.fnmatch(f, pattern)
-            )
-        all_files = filtered_files
-    
-    # Apply exclude patterns
-    patterns = DEFAULT_EXCLUDE_PATTERNS + (exclude_patterns or [])
-    for pattern in patterns:
-        all_files = [
-            f for f in all_files 
-            if not fnmatch.fnmatch(f, pattern)
-        ]
+    # Tracked and untracked files, filtered by one compiled include/exclude matcher
+    matcher = PathMatcher(
+        include=include_paths,
+        exclude=DEFAULT_EXCLUDE_PATTERNS + (exclude_patterns or [])
+    )
+    all_files = matcher.filter(get_project_files(repo_path))
     
-    # Perform fuzzy matching
-    matches = process.extract(
+    # Prefiltered, basename-weighted matching with top-k selection
+    filtered_matches = fuzzy_match_paths(
         search_term,
         all_files,
-        limit=max_results
+        limit=max_results,
+        threshold=threshold
     )
-    
-    # Filter by threshold
-    filtered_matches = [
-        (path, score) 
-        for path, score in matches 
-        if score >= threshold
-    ]
 
     # Build info panel content
     info_sections = []
@@ -0,0 +1,19 @@
+from typing import Any, Dict
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import tool
+from langgraph.prebuilt import InjectedState
+from typing_extensions import Annotated
+
+
+@tool("recall_tool_output")
+def recall_tool_output(tool_call_id: str, state: Annotated[Dict[str, Any], InjectedState]) -> str:
+    """Return the full output of an earlier tool call whose output was elided from the conversation.
+
+    Args:
+        tool_call_id: The tool_call_id given in the elided output's note
+    """
+    for message in reversed(state.get("messages", [])):
+        if isinstance(message, ToolMessage) and message.tool_call_id == tool_call_id:
+            return message.content if isinstance(message.content, str) else str(message.content)
+    return f"No tool output found for tool_call_id {tool_call_id}."
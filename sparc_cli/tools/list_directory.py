@@ -1,14 +1,17 @@
+import os
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import Iterator, List, Optional
 import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import pathspec
-from rich.tree import Tree
 from rich.console import Console
 from rich.panel import Panel
 from rich.markdown import Markdown
 from langchain_core.tools import tool
-import fnmatch
+from sparc_cli.project_files import PathMatcher
 
 console = Console()
 
@@ -81,67 +84,176 @@ def should_ignore(path: str, spec: pathspec.PathSpec) -> bool:
     """Check if a path should be ignored based on gitignore patterns"""
     return spec.match_file(path)
 
-def should_exclude(name: str, patterns: List[str]) -> bool:
-    """Check if a file/directory name matches any exclude patterns"""
-    return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+# Entries shown per directory before the rest are summarized as "N more"
+DEFAULT_MAX_ENTRIES = 100
+# Lines rendered at most; deeper trees are cut off after this
+MAX_TREE_LINES = 2000
+# Directories scanned concurrently (scandir releases the GIL, which pays off
+# on network filesystems where every listing is a round trip)
+WALK_WORKERS = 8
 
-def build_tree(
-    path: Path,
-    tree: Tree,
-    config: DirScanConfig,
-    current_depth: int = 0,
-    spec: Optional[pathspec.PathSpec] = None
-) -> None:
-    """Recursively build a Rich tree representation of the directory"""
-    if current_depth >= config.max_depth:
-        return
 
+def _rebase_gitignore_line(line: str, base: str) -> str:
+    """Rewrite a pattern from the .gitignore in directory base to be root-relative."""
+    if not base:
+        return line
+    negate = line.startswith('!')
+    body = line[1:] if negate else line
+    if '/' in body.rstrip('/'):
+        # Anchored to the directory of the .gitignore
+        body = f"{base}/{body.lstrip('/')}"
+    else:
+        body = f"{base}/**/{body}"
+    return ('!' if negate else '') + body
+
+
+def _read_gitignore(directory: str, base: str) -> List[str]:
+    """Patterns of a directory's .gitignore, rebased to the walk root."""
     try:
-        # Get sorted list of directory contents
-        entries = sorted(path.iterdir(), key=lambda p: (not p.is_dir(), p.name.lower()))
-        
-        for entry in entries:
-            # Get relative path from root for pattern matching
-            rel_path = entry.relative_to(path)
-            
-            # Skip if path matches exclude patterns
-            if spec and should_ignore(str(rel_path), spec):
-                continue
-            if should_exclude(entry.name, config.exclude_patterns):
-                continue
-                
-            # Skip if symlink and not following links
+        with open(os.path.join(directory, '.gitignore')) as f:
+            lines = [line.strip() for line in f]
+    except OSError:
+        return []
+    return [_rebase_gitignore_line(line, base) for line in lines if line and not line.startswith('#')]
+
+
+@dataclass
+class TreeEntry:
+    """A listed file or directory; children is set for directories that were walked"""
+    name: str
+    is_dir: bool
+    size: Optional[int] = None
+    modified: Optional[float] = None
+    children: Optional["TreeListing"] = None
+
+
+@dataclass
+class TreeListing:
+    """The shown entries of one directory"""
+    entries: List[TreeEntry] = field(default_factory=list)
+    more: int = 0  # Entries left out by the per-directory cap
+    error: Optional[str] = None
+
+
+@dataclass
+class _ScanTask:
+    path: str
+    rel: str  # Relative to the walk root, '/'-separated; '' for the root
+    gitignore: List[str]  # Root-relative patterns from this and enclosing .gitignore files
+    depth: int
+    listing: TreeListing
+
+
+def _scan(task: _ScanTask, config: DirScanConfig, exclude: PathMatcher, max_entries: int) -> List[_ScanTask]:
+    """List one directory into task.listing and return its subdirectories to walk next."""
+    try:
+        with os.scandir(task.path) as it:
+            dir_entries = list(it)
+    except PermissionError:
+        task.listing.error = "Permission denied"
+        return []
+    except OSError as e:
+        task.listing.error = e.strerror or str(e)
+        return []
+
+    gitignore = task.gitignore
+    if any(entry.name == '.gitignore' for entry in dir_entries):
+        gitignore = gitignore + _read_gitignore(task.path, task.rel)
+    spec = pathspec.PathSpec.from_lines(pathspec.patterns.GitWildMatchPattern, gitignore) if gitignore else None
+
+    # DirEntry caches its type (and, after the first stat(), its stat), so each
+    # entry costs at most one system call
+    kept = []
+    for entry in dir_entries:
+        if not exclude(entry.name):
+            continue
+        try:
             if entry.is_symlink() and not config.follow_links:
                 continue
+            is_dir = entry.is_dir()
+        except OSError:
+            continue
+        rel = f"{task.rel}/{entry.name}" if task.rel else entry.name
+        if spec is not None and spec.match_file(rel + '/' if is_dir else rel):
+            continue
+        kept.append((not is_dir, entry.name.lower(), entry, rel))
+
+    if len(kept) > max_entries:
+        task.listing.more = len(kept) - max_entries
+        kept = heapq.nsmallest(max_entries, kept, key=lambda item: item[:2])
+    else:
+        kept.sort(key=lambda item: item[:2])
 
+    subdirs = []
+    for is_file, _, entry, rel in kept:
+        node = TreeEntry(name=entry.name, is_dir=not is_file)
+        if is_file and (config.show_size or config.show_modified):
             try:
-                if entry.is_dir():
-                    # Add directory node
-                    branch = tree.add(
-                        f"📁 {entry.name}/"
-                    )
-                    
-                    # Recursively process subdirectory
-                    build_tree(entry, branch, config, current_depth + 1, spec)
-                else:
-                    # Add file node with optional metadata
-                    meta = []
-                    if config.show_size:
-                        meta.append(format_size(entry.stat().st_size))
-                    if config.show_modified:
-                        meta.append(format_time(entry.stat().st_mtime))
-                        
-                    label = entry.name
-                    if meta:
-                        label = f"{label} ({', '.join(meta)})"
-                    
-                    tree.add(label)
-                    
-            except PermissionError:
-                tree.add(f"🔒 {entry.name} (Permission denied)")
-                
-    except PermissionError:
-        tree.add("🔒 (Permission denied)")
+                stat = entry.stat()
+                node.size, node.modified = stat.st_size, stat.st_mtime
+            except OSError:
+                pass
+        elif not is_file and task.depth + 1 < config.max_depth:
+            node.children = TreeListing()
+            subdirs.append(_ScanTask(entry.path, rel, gitignore, task.depth + 1, node.children))
+        task.listing.entries.append(node)
+    return subdirs
+
+
+def walk_tree(
+    root: Path,
+    config: DirScanConfig,
+    max_entries: int = DEFAULT_MAX_ENTRIES,
+    workers: int = WALK_WORKERS
+) -> TreeListing:
+    """Walk a directory tree level by level, scanning each level's directories in parallel.
+
+    Honors .gitignore files in every walked directory as well as
+    config.exclude_patterns (matched against entry names).
+
+    Returns:
+        The listing of root, with the listings of walked subdirectories attached
+    """
+    listing = TreeListing()
+    if config.max_depth < 1:
+        return listing
+    exclude = PathMatcher(exclude=config.exclude_patterns)
+    frontier = [_ScanTask(str(root), '', [], 0, listing)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while frontier:
+            if len(frontier) == 1 or workers <= 1:
+                results = [_scan(task, config, exclude, max_entries) for task in frontier]
+            else:
+                results = pool.map(lambda task: _scan(task, config, exclude, max_entries), frontier)
+            frontier = [subdir for subdirs in results for subdir in subdirs]
+    return listing
+
+
+def _entry_label(entry: TreeEntry, config: DirScanConfig) -> str:
+    if entry.is_dir:
+        return f"📁 {entry.name}/"
+    meta = []
+    if config.show_size and entry.size is not None:
+        meta.append(format_size(entry.size))
+    if config.show_modified and entry.modified is not None:
+        meta.append(format_time(entry.modified))
+    return f"{entry.name} ({', '.join(meta)})" if meta else entry.name
+
+
+def iter_tree_lines(listing: TreeListing, config: DirScanConfig, prefix: str = "") -> Iterator[str]:
+    """Yield the lines of a walked tree, drawn like a rich Tree, without building it all first."""
+    if listing.error:
+        yield f"{prefix}└── 🔒 ({listing.error})"
+        return
+    last = len(listing.entries) - 1
+    for index, entry in enumerate(listing.entries):
+        is_last = index == last and not listing.more
+        yield f"{prefix}{'└── ' if is_last else '├── '}{_entry_label(entry, config)}"
+        if entry.children is not None:
+            yield from iter_tree_lines(entry.children, config, prefix + ('    ' if is_last else '│   '))
+    if listing.more:
+        yield f"{prefix}└── … {listing.more} more"
+
 
 @tool
 def list_directory_tree(
@@ -151,7 +263,8 @@ def list_directory_tree(
     follow_links: bool = False,
     show_size: bool = False,  # Default to not showing size
     show_modified: bool = False,  # Default to not showing modified time
-    exclude_patterns: List[str] = None
+    exclude_patterns: List[str] = None,
+    max_entries: int = DEFAULT_MAX_ENTRIES
 ) -> str:
     """List directory contents in a tree format with optional metadata.
     
@@ -161,7 +274,8 @@ def list_directory_tree(
         follow_links: Whether to follow symbolic links
         show_size: Show file sizes (default: False)
         show_modified: Show last modified times (default: False)
-        exclude_patterns: List of patterns to exclude (uses gitignore syntax)
+        exclude_patterns: List of patterns to exclude (matched against entry names)
+        max_entries: Entries shown per directory; the rest are counted as "N more"
         
     Returns:
         Rendered tree string
@@ -172,11 +286,6 @@ def list_directory_tree(
     if not root_path.is_dir():
         raise ValueError(f"Path is not a directory: {path}")
 
-    # Load .gitignore patterns if present
-    spec = load_gitignore_patterns(root_path)
-    
-    # Create tree
-    tree = Tree(f"📁 {root_path}/")
     config = DirScanConfig(
         max_depth=max_depth,
         follow_links=follow_links,
@@ -184,14 +293,15 @@ def list_directory_tree(
         show_modified=show_modified,
         exclude_patterns=DEFAULT_EXCLUDE_PATTERNS + (exclude_patterns or [])
     )
-    
-    # Build tree
-    build_tree(root_path, tree, config, 0, spec)
-    
-    # Capture tree output
-    with console.capture() as capture:
-        console.print(tree)
-    tree_str = capture.get()
+
+    # Walk honoring nested .gitignore files, then render at most MAX_TREE_LINES
+    listing = walk_tree(root_path, config, max_entries=max(1, max_entries))
+    lines = [f"📁 {root_path}/"]
+    rendered = iter_tree_lines(listing, config)
+    lines.extend(islice(rendered, MAX_TREE_LINES))
+    if next(rendered, None) is not None:
+        lines.append(f"… output truncated at {MAX_TREE_LINES} lines; list a subdirectory or lower max_depth")
+    tree_str = "\n".join(lines) + "\n"
     
     # Display panel
     console.print(Panel(
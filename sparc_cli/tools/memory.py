@@ -1,13 +1,21 @@
-from typing import Dict, List, Any, Union, Optional, Set
+import bisect
+import hashlib
+import heapq
+import json
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import MutableMapping, Sequence
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Any, Union, Optional, Iterable, Iterator, Mapping, NamedTuple, Tuple, Callable
 from typing_extensions import TypedDict
-
-class WorkLogEntry(TypedDict):
-    timestamp: str
-    event: str
 from rich.console import Console
 from rich.markdown import Markdown
 from rich.panel import Panel
 from langchain_core.tools import tool
+from sparc_cli.text.tokens import estimate_tokens
 
 class SnippetInfo(TypedDict):
     """Type definition for source code snippet information"""
@@ -16,6 +24,16 @@ class SnippetInfo(TypedDict):
     snippet: str
     description: Optional[str]
 
+class WorkLogEntry(TypedDict):
+    """Type definition for work log entries"""
+    timestamp: str
+    event: str
+    kind: str  # Category of the event, e.g. 'task', 'key_facts' or 'agent'
+    tool: Optional[str]  # Tool that produced the event
+    duration: Optional[float]  # Seconds spent, for timed events
+    tokens: Optional[int]  # Tokens used, when known
+    refs: Optional[Dict[str, List[int]]]  # Memory IDs involved, by memory key
+
 console = Console()
 
 # Memory configuration
@@ -28,6 +46,17 @@ MEMORY_LIMITS = {
     'work_log': 100  # Max number of work log entries
 }
 
+# What to do with key snippets whose lines disappeared from their file:
+# 'flag' keeps them marked as stale, 'drop' deletes them
+STALE_SNIPPET_POLICY = 'flag'
+
+# Token budgets for memory sections packed into prompts
+PROMPT_TOKEN_BUDGETS = {
+    'research_notes': 8000,
+    'key_facts': 6000,
+    'key_snippets': 16000
+}
+
 class MemoryPriority:
     LOW = 0
     MEDIUM = 1
@@ -47,64 +76,596 @@ class PrioritizedFact(MemoryItem):
     """Key fact with priority"""
     content: str
 
-class PrioritizedSnippet(MemoryItem, SnippetInfo):
+class SnippetSource(TypedDict, total=False):
+    """State of a snippet's source file when the snippet was last checked"""
+    mtime: Optional[float]  # None if the file could not be read
+    content_hash: Optional[str]  # SHA-256 of the file contents
+    stale: bool  # The snippet's lines could not be found in the file anymore
+
+class PrioritizedSnippet(MemoryItem, SnippetInfo, SnippetSource):
     """Code snippet with priority"""
     pass
 
-# Global memory store
-_global_memory: Dict[str, Union[List[Any], Dict[int, Union[str, PrioritizedFact, PrioritizedSnippet]], int, Set[str], bool, str, int, List[WorkLogEntry]]] = {
-    'research_notes': [],  # List[PrioritizedNote]
-    'plans': [],
-    'tasks': {},  # Dict[int, str] - ID to task mapping
-    'task_completed': False,  # Flag indicating if task is complete
-    'completion_message': '',  # Message explaining completion
-    'task_id_counter': 1,  # Counter for generating unique task IDs
-    'key_facts': {},  # Dict[int, PrioritizedFact] - ID to fact mapping
-    'key_fact_id_counter': 1,  # Counter for generating unique fact IDs
-    'key_snippets': {},  # Dict[int, PrioritizedSnippet] - ID to snippet mapping
-    'key_snippet_id_counter': 1,  # Counter for generating unique snippet IDs
-    'implementation_requested': False,
-    'related_files': {},  # Dict[int, str] - ID to filepath mapping
-    'related_file_id_counter': 1,  # Counter for generating unique file IDs
-    'plan_completed': False,
-    'agent_depth': 0,
-    'work_log': []  # List[WorkLogEntry] - Timestamped work events
-}
+class TaskDeps(TypedDict):
+    """Scheduling information for a planned task"""
+    depends_on: List[int]  # IDs of tasks that must complete first
+    files: List[str]  # Files the task writes; empty if unknown
+
+class PrioritizedMemory(MutableMapping):
+    """ID to prioritized item mapping with heap-backed eviction.
+
+    A min-heap keyed on (priority, timestamp) tracks eviction order, so inserts
+    and evictions cost O(log n) instead of a full sort. Entries for deleted or
+    replaced items are skipped lazily when they reach the top of the heap.
+
+    `version` is bumped on every insert, replacement or removal. Items mutated
+    in place are not tracked; reassign them to record the change.
+    """
+
+    def __init__(self, limit: Optional[int] = None, items: Optional[Mapping[Any, MemoryItem]] = None):
+        self.limit = limit
+        self.version = 0
+        self._items: Dict[Any, MemoryItem] = {}
+        self._heap: List[Tuple[int, str, Any]] = []
+        if items:
+            self.update(items)
+
+    def __getitem__(self, key: Any) -> MemoryItem:
+        return self._items[key]
+
+    def __setitem__(self, key: Any, item: MemoryItem) -> None:
+        self._items[key] = item
+        self.version += 1
+        heapq.heappush(self._heap, (item['priority'], item['timestamp'], key))
+
+    def __delitem__(self, key: Any) -> None:
+        del self._items[key]
+        self.version += 1
+        # Rebuild once stale heap entries dominate so the heap stays O(n)
+        if len(self._heap) > 2 * len(self._items) + 32:
+            self._heap = [(v['priority'], v['timestamp'], k) for k, v in self._items.items()]
+            heapq.heapify(self._heap)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(limit={self.limit!r}, items={self._items!r})"
+
+    def evict(self) -> List[Tuple[Any, MemoryItem]]:
+        """Evict lowest priority, oldest items until the store is within its limit.
+
+        Returns:
+            List of (key, item) tuples that were evicted
+        """
+        evicted = []
+        if self.limit is None:
+            return evicted
+        while len(self._items) > self.limit and self._heap:
+            priority, timestamp, key = heapq.heappop(self._heap)
+            item = self._items.get(key)
+            if item is None or item['priority'] != priority or item['timestamp'] != timestamp:
+                continue  # Stale entry for a deleted or replaced item
+            del self._items[key]
+            evicted.append((key, item))
+        if evicted:
+            self.version += 1
+        return evicted
+
+def _snippet_range(line_number: int, snippet: str) -> Tuple[int, int]:
+    """Return the inclusive (first, last) line range covered by a snippet."""
+    return line_number, line_number + max(len(snippet.splitlines()), 1) - 1
+
+class SnippetMemory(PrioritizedMemory):
+    """Key snippets with a per-file index of the line ranges they cover.
+
+    For each file a list of (first_line, last_line, snippet_id) is kept sorted
+    by first line, so snippets touching a range can be found without scanning
+    every stored snippet.
+    """
+
+    def __init__(self, limit: Optional[int] = None, items: Optional[Mapping[Any, PrioritizedSnippet]] = None):
+        self._ranges: Dict[str, List[Tuple[int, int, Any]]] = {}
+        super().__init__(limit, items)
+
+    def _index(self, key: Any, item: PrioritizedSnippet) -> None:
+        first, last = _snippet_range(item['line_number'], item['snippet'])
+        path = RelatedFilesRegistry.normalize(item['filepath'])
+        bisect.insort(self._ranges.setdefault(path, []), (first, last, key))
+
+    def _unindex(self, key: Any, item: PrioritizedSnippet) -> None:
+        first, last = _snippet_range(item['line_number'], item['snippet'])
+        path = RelatedFilesRegistry.normalize(item['filepath'])
+        ranges = self._ranges.get(path, [])
+        pos = bisect.bisect_left(ranges, (first, last, key))
+        if pos < len(ranges) and ranges[pos] == (first, last, key):
+            del ranges[pos]
+        if not ranges:
+            self._ranges.pop(path, None)
+
+    def __setitem__(self, key: Any, item: PrioritizedSnippet) -> None:
+        if key in self:
+            self._unindex(key, self[key])
+        super().__setitem__(key, item)
+        self._index(key, item)
+
+    def __delitem__(self, key: Any) -> None:
+        item = self[key]
+        super().__delitem__(key)
+        self._unindex(key, item)
+
+    def evict(self) -> List[Tuple[Any, PrioritizedSnippet]]:
+        evicted = super().evict()
+        for key, item in evicted:
+            self._unindex(key, item)
+        return evicted
+
+    def overlapping(self, filepath: str, first: int, last: int, adjacent: bool = True) -> List[Any]:
+        """Get IDs of snippets in a file whose line range touches [first, last].
+
+        Args:
+            filepath: File the snippets belong to
+            first: First line of the range
+            last: Last line of the range (inclusive)
+            adjacent: Also match ranges that end right before or start right after
+
+        Returns:
+            Matching snippet IDs, ordered by first line
+        """
+        ranges = self._ranges.get(RelatedFilesRegistry.normalize(filepath), [])
+        gap = 1 if adjacent else 0
+        # Only ranges starting at or before last + gap can touch the range
+        end = bisect.bisect_right(ranges, (last + gap, float('inf'), float('inf')))
+        return [key for start, stop, key in ranges[:end] if stop >= first - gap]
+
+class PrioritizedNotes(Sequence):
+    """Insertion-ordered research notes with heap-backed eviction.
+
+    Behaves like a read-only list of notes with `append`, `extend` and `clear`.
+    Indexing uses a list of the notes that is rebuilt only after the notes
+    change, so repeated indexing costs O(1).
+    """
+
+    def __init__(self, limit: Optional[int] = None, notes: Optional[Iterable[PrioritizedNote]] = None):
+        self._notes = PrioritizedMemory(limit)
+        self._next_seq = 0
+        self._list: List[PrioritizedNote] = []
+        self._list_version: Optional[int] = None
+        if notes:
+            self.extend(notes)
+
+    @property
+    def limit(self) -> Optional[int]:
+        return self._notes.limit
+
+    @limit.setter
+    def limit(self, value: Optional[int]) -> None:
+        self._notes.limit = value
+
+    @property
+    def version(self) -> int:
+        return self._notes.version
+
+    def _as_list(self) -> List[PrioritizedNote]:
+        if self._list_version != self._notes.version:
+            self._list = list(self._notes.values())
+            self._list_version = self._notes.version
+        return self._list
+
+    def __getitem__(self, index):
+        return self._as_list()[index]
+
+    def __iter__(self):
+        return iter(self._notes.values())
+
+    def __reversed__(self):
+        return reversed(self._as_list())
+
+    def __len__(self) -> int:
+        return len(self._notes)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({list(self._notes.values())!r})"
+
+    def append(self, note: PrioritizedNote) -> None:
+        self._notes[self._next_seq] = note
+        self._next_seq += 1
+
+    def extend(self, notes: Iterable[PrioritizedNote]) -> None:
+        for note in notes:
+            self.append(note)
+
+    def clear(self) -> None:
+        self._notes.clear()
+
+    def evict(self) -> List[PrioritizedNote]:
+        """Evict lowest priority, oldest notes until within the limit."""
+        return [note for _, note in self._notes.evict()]
+
+    def items(self) -> List[Tuple[int, PrioritizedNote]]:
+        """Get (sequence number, note) pairs; sequence numbers are never reused."""
+        return list(self._notes.items())
+
+class RelatedFilesRegistry(MutableMapping):
+    """ID to filepath mapping with a reverse path-to-ID index.
+
+    Paths are stored in canonical form so `./a.py` and `a.py` resolve to the
+    same entry, and lookups by path are O(1) instead of a scan over all IDs.
+    """
+
+    def __init__(self, files: Optional[Mapping[int, str]] = None):
+        self.version = 0
+        self._files: Dict[int, str] = {}
+        self._ids: Dict[str, int] = {}
+        if files:
+            self.update(files)
+
+    @staticmethod
+    def normalize(path: str) -> str:
+        """Return the canonical form of a file path."""
+        return os.path.normpath(path)
+
+    def __getitem__(self, file_id: int) -> str:
+        return self._files[file_id]
+
+    def __setitem__(self, file_id: int, path: str) -> None:
+        path = self.normalize(path)
+        # A path maps to exactly one ID, so drop any previous entry for it
+        existing_id = self._ids.get(path)
+        if existing_id is not None and existing_id != file_id:
+            del self._files[existing_id]
+        if file_id in self._files:
+            del self._ids[self._files[file_id]]
+        self._files[file_id] = path
+        self._ids[path] = file_id
+        self.version += 1
+
+    def __delitem__(self, file_id: int) -> None:
+        del self._ids[self._files.pop(file_id)]
+        self.version += 1
+
+    def __contains__(self, file_id: object) -> bool:
+        return file_id in self._files
+
+    def __iter__(self):
+        return iter(self._files)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._files!r})"
+
+    def get_id(self, path: str) -> Optional[int]:
+        """Get the ID of a registered path, or None if it is not registered."""
+        return self._ids.get(self.normalize(path))
+
+    def add_many(self, paths: Iterable[str], next_id: int) -> Tuple[List[Tuple[int, str, bool]], int]:
+        """Register multiple paths, assigning new IDs only to unseen paths.
+
+        Args:
+            paths: File paths to register
+            next_id: First ID to hand out to a new path
+
+        Returns:
+            Tuple of ([(file_id, path, is_new), ...] in input order, next unused ID)
+        """
+        results = []
+        for path in paths:
+            path = self.normalize(path)
+            file_id = self._ids.get(path)
+            if file_id is None:
+                file_id = next_id
+                next_id += 1
+                self._files[file_id] = path
+                self._ids[path] = file_id
+                self.version += 1
+                results.append((file_id, path, True))
+            else:
+                results.append((file_id, path, False))
+        return results, next_id
+
+    def remove_many(self, file_ids: Iterable[int]) -> List[Tuple[int, str]]:
+        """Remove multiple files by ID, silently skipping unknown IDs.
+
+        Returns:
+            List of (file_id, path) tuples that were removed
+        """
+        removed = []
+        for file_id in file_ids:
+            path = self._files.pop(file_id, None)
+            if path is not None:
+                del self._ids[path]
+                removed.append((file_id, path))
+        if removed:
+            self.version += 1
+        return removed
+
+class WorkLog(Sequence):
+    """Fixed-capacity ring buffer of structured work events.
+
+    Appending to a full log drops the oldest event in O(1). `version` is
+    bumped on every change so rendered views can be cached.
+    """
+
+    def __init__(self, limit: Optional[int] = None, events: Optional[Iterable[WorkLogEntry]] = None):
+        self.version = 0
+        self._events: deque = deque(events or (), maxlen=limit)
+
+    @property
+    def limit(self) -> Optional[int]:
+        return self._events.maxlen
+
+    @limit.setter
+    def limit(self, value: Optional[int]) -> None:
+        if value != self._events.maxlen:
+            self._events = deque(self._events, maxlen=value)
+            self.version += 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._events)[index]
+        return self._events[index]
+
+    def __iter__(self):
+        return iter(self._events)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(limit={self.limit!r}, events={list(self._events)!r})"
+
+    def append(self, entry: WorkLogEntry) -> None:
+        self._events.append(entry)
+        self.version += 1
+
+    def clear(self) -> None:
+        self._events.clear()
+        self.version += 1
+
+    def to_jsonl(self) -> str:
+        """Serialize the events as JSON lines, oldest first."""
+        return "".join(json.dumps(entry, default=str) + "\n" for entry in self._events)
+
+def _default_memory() -> Dict[str, Any]:
+    """Build the initial contents of a memory store."""
+    return {
+        'research_notes': PrioritizedNotes(MEMORY_LIMITS['research_notes']),  # List[PrioritizedNote]
+        'plans': [],
+        'tasks': {},  # Dict[int, str] - ID to task mapping
+        'task_deps': {},  # Dict[int, TaskDeps] - ID to task dependencies and files
+        'task_completed': False,  # Flag indicating if task is complete
+        'completion_message': '',  # Message explaining completion
+        'task_id_counter': 1,  # Counter for generating unique task IDs
+        'key_facts': PrioritizedMemory(MEMORY_LIMITS['key_facts']),  # Dict[int, PrioritizedFact] - ID to fact mapping
+        'key_fact_id_counter': 1,  # Counter for generating unique fact IDs
+        'key_snippets': SnippetMemory(MEMORY_LIMITS['key_snippets']),  # Dict[int, PrioritizedSnippet] - ID to snippet mapping
+        'key_snippet_id_counter': 1,  # Counter for generating unique snippet IDs
+        'implementation_requested': False,
+        'related_files': RelatedFilesRegistry(),  # Dict[int, str] - ID to filepath mapping
+        'related_file_id_counter': 1,  # Counter for generating unique file IDs
+        'plan_completed': False,
+        'agent_depth': 0,
+        'work_log': WorkLog(MEMORY_LIMITS['work_log'])  # List[WorkLogEntry] - Timestamped work events
+    }
+
+class MemoryStore(MutableMapping):
+    """An isolated agent memory namespace.
+
+    Behaves like the memory dict agents have always used, plus a reentrant
+    lock that guards ID counters, depth tracking and container mutations, and
+    a per-store cache of rendered memory sections.
+    """
+
+    def __init__(self, data: Optional[Mapping[str, Any]] = None):
+        """Create a memory store.
+
+        Args:
+            data: Initial memory contents (default: a fresh, empty memory)
+        """
+        self._data: Dict[str, Any] = dict(data) if data is not None else _default_memory()
+        self.lock = threading.RLock()
+        # Rendered memory sections, keyed by (memory key, format).
+        # Each entry holds (container, container version, rendered value).
+        self.render_cache: Dict[Tuple[str, str], Tuple[Any, int, Any]] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._data[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        del self._data[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._data!r})"
+
+    def next_id(self, counter_key: str) -> int:
+        """Atomically take the next ID from a counter.
+
+        Args:
+            counter_key: Memory key of the counter, e.g. 'task_id_counter'
+
+        Returns:
+            The counter value before it was incremented
+        """
+        with self.lock:
+            value = self._data.get(counter_key, 1)
+            self._data[counter_key] = value + 1
+            return value
+
+    def increment(self, key: str, delta: int = 1) -> int:
+        """Atomically add delta to an integer value and return the new value."""
+        with self.lock:
+            value = self._data.get(key, 0) + delta
+            self._data[key] = value
+            return value
+
+_default_store = MemoryStore()
+_current_store: ContextVar[Optional[MemoryStore]] = ContextVar('sparc_memory_store', default=None)
+
+def get_memory_store() -> MemoryStore:
+    """Get the memory store of the current context, or the process-wide default."""
+    store = _current_store.get()
+    return _default_store if store is None else store
+
+@contextmanager
+def use_memory_store(store: MemoryStore) -> Iterator[MemoryStore]:
+    """Make a memory store current for the duration of the block.
+
+    Context variables are per thread and per asyncio task, so agents running
+    concurrently under different stores see isolated memory.
+
+    Example:
+        with use_memory_store(MemoryStore()):
+            run_research_agent(query, model)
+    """
+    token = _current_store.set(store)
+    try:
+        yield store
+    finally:
+        _current_store.reset(token)
+
+class _MemoryProxy(MutableMapping):
+    """Dict-like view that forwards every access to the current memory store."""
+
+    def __getitem__(self, key: str) -> Any:
+        return get_memory_store()[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        get_memory_store()[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        del get_memory_store()[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in get_memory_store()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(get_memory_store())
+
+    def __len__(self) -> int:
+        return len(get_memory_store())
+
+    def __repr__(self) -> str:
+        return repr(get_memory_store())
+
+# Global memory store. Resolves to the memory store of the current context.
+_global_memory: MutableMapping = _MemoryProxy()
+
+def _render_cached(key: str, fmt: str, values: Any, render: Callable[[Any], Any]) -> Any:
+    """Render a memory section, reusing the cached result if it is unchanged.
+
+    Only containers exposing a `version` counter are cached. A cached entry is
+    reused when both the container object and its version match.
+
+    Args:
+        key: Memory key being rendered
+        fmt: Name of the output format
+        values: The memory container to render
+        render: Function producing the rendered value from the container
+    """
+    store = get_memory_store()
+    with store.lock:
+        version = getattr(values, 'version', None)
+        if version is None:
+            return render(values)
+
+        cached = store.render_cache.get((key, fmt))
+        if cached is not None and cached[0] is values and cached[1] == version:
+            return cached[2]
+
+        rendered = render(values)
+        store.render_cache[(key, fmt)] = (values, version, rendered)
+        return rendered
+
+def _get_prioritized_memory(memory_type: str) -> Union[PrioritizedMemory, PrioritizedNotes]:
+    """Get the prioritized store for a memory type, upgrading plain containers in place.
+
+    Args:
+        memory_type: One of 'research_notes', 'key_facts' or 'key_snippets'
+    """
+    store = get_memory_store()
+    with store.lock:
+        items = store.get(memory_type)
+        if memory_type == 'research_notes':
+            if not isinstance(items, PrioritizedNotes):
+                items = PrioritizedNotes(MEMORY_LIMITS[memory_type], items or [])
+                store[memory_type] = items
+        elif memory_type == 'key_snippets':
+            if not isinstance(items, SnippetMemory):
+                items = SnippetMemory(MEMORY_LIMITS[memory_type], items or {})
+                store[memory_type] = items
+        elif not isinstance(items, PrioritizedMemory):
+            items = PrioritizedMemory(MEMORY_LIMITS[memory_type], items or {})
+            store[memory_type] = items
+        return items
+
+def _get_work_log() -> WorkLog:
+    """Get the work log, upgrading a plain list in place if needed."""
+    store = get_memory_store()
+    with store.lock:
+        log = store.get('work_log')
+        if not isinstance(log, WorkLog):
+            log = WorkLog(MEMORY_LIMITS['work_log'], log or [])
+            store['work_log'] = log
+        return log
 
 def _enforce_memory_limit(memory_type: str) -> None:
     """Enforce memory limits by removing lowest priority, oldest items first."""
-    from datetime import datetime
-    
     if memory_type not in MEMORY_LIMITS:
         return
         
     limit = MEMORY_LIMITS[memory_type]
     
-    if memory_type == 'research_notes':
-        notes = _global_memory['research_notes']
-        if len(notes) > limit:
-            # Sort by priority (ascending) then timestamp (ascending)
-            notes.sort(key=lambda x: (x['priority'], x['timestamp']))
-            # Remove oldest, lowest priority items
-            _global_memory['research_notes'] = notes[-limit:]
-            
-    elif memory_type in ['key_facts', 'key_snippets']:
-        items = _global_memory[memory_type]
-        if len(items) > limit:
-            # Sort items by priority and timestamp
-            sorted_items = sorted(
-                items.items(),
-                key=lambda x: (x[1]['priority'], x[1]['timestamp'])
-            )
-            # Keep only the highest priority, newest items
-            items_to_keep = dict(sorted_items[-limit:])
-            _global_memory[memory_type] = items_to_keep
-            
-    elif memory_type == 'work_log':
-        log = _global_memory['work_log']
-        if len(log) > limit:
-            # Keep newest entries
-            _global_memory['work_log'] = log[-limit:]
+    store = get_memory_store()
+    with store.lock:
+        if memory_type in ['research_notes', 'key_facts', 'key_snippets']:
+            items = _get_prioritized_memory(memory_type)
+            items.limit = limit
+            items.evict()
+                
+        elif memory_type == 'work_log':
+            # The ring buffer keeps the newest entries
+            _get_work_log().limit = limit
+
+def set_memory_limits(limits: Mapping[str, int]) -> None:
+    """Override memory limits for the current run.
+
+    Existing memory is trimmed immediately if a limit is lowered.
+
+    Args:
+        limits: Mapping of memory type (a key of MEMORY_LIMITS) to its new limit
+
+    Raises:
+        ValueError: If a memory type is unknown or a limit is not positive
+    """
+    for memory_type, limit in limits.items():
+        if memory_type not in MEMORY_LIMITS:
+            raise ValueError(f"Unknown memory type: {memory_type}")
+        if limit < 1:
+            raise ValueError(f"Memory limit for {memory_type} must be at least 1")
+
+    MEMORY_LIMITS.update(limits)
+    for memory_type in limits:
+        _enforce_memory_limit(memory_type)
 
 @tool("emit_research_notes")
 def emit_research_notes(notes: str, priority: int = MemoryPriority.MEDIUM) -> str:
@@ -125,8 +686,9 @@ def emit_research_notes(notes: str, priority: int = MemoryPriority.MEDIUM) -> st
         timestamp=datetime.now().isoformat()
     )
     
-    _global_memory['research_notes'].append(note)
-    _enforce_memory_limit('research_notes')
+    with get_memory_store().lock:
+        _get_prioritized_memory('research_notes').append(note)
+        _enforce_memory_limit('research_notes')
     
     priority_labels = {
         MemoryPriority.LOW: "Low Priority",
@@ -153,28 +715,46 @@ def emit_plan(plan: str) -> str:
     """
     _global_memory['plans'].append(plan)
     console.print(Panel(Markdown(plan), title="📋 Plan"))
-    log_work_event(f"Added plan step:\n\n{plan}")
+    log_work_event(f"Added plan step:\n\n{plan}", kind='plan', tool='emit_plan')
     return plan
 
 @tool("emit_task")
-def emit_task(task: str) -> str:
+def emit_task(task: str, depends_on: Optional[List[int]] = None, files: Optional[List[str]] = None) -> str:
     """Store a task in global memory.
+
+    Declaring dependencies and the files a task writes lets run_planned_tasks
+    implement independent tasks concurrently.
     
     Args:
         task: The task to store
+        depends_on: IDs of previously stored tasks that must be completed first
+        files: Paths of the files the task will create or modify, if known
         
     Returns:
         String confirming task storage with ID number
     """
+    depends_on = list(dict.fromkeys(depends_on or []))
+    unknown = [dep for dep in depends_on if dep not in _global_memory['tasks']]
+    if unknown:
+        return f"Unknown task ID(s) in depends_on: {unknown}"
+
     # Get and increment task ID
-    task_id = _global_memory['task_id_counter']
-    _global_memory['task_id_counter'] += 1
+    task_id = get_memory_store().next_id('task_id_counter')
     
     # Store task with ID
-    _global_memory['tasks'][task_id] = task
+    with get_memory_store().lock:
+        _global_memory['tasks'][task_id] = task
+        _global_memory.setdefault('task_deps', {})[task_id] = TaskDeps(
+            depends_on=depends_on,
+            files=list(dict.fromkeys(RelatedFilesRegistry.normalize(path) for path in files or []))
+        )
     
-    console.print(Panel(Markdown(task), title=f"✅ Task #{task_id}"))
-    log_work_event(f"Task #{task_id} added:\n\n{task}")
+    title = f"✅ Task #{task_id}"
+    if depends_on:
+        title += " (after " + ", ".join(f"#{dep}" for dep in depends_on) + ")"
+    console.print(Panel(Markdown(task), title=title))
+    log_work_event(f"Task #{task_id} added:\n\n{task}", kind='task', tool='emit_task',
+                   refs={'tasks': [task_id] + depends_on})
     return f"Task #{task_id} stored."
 
 
@@ -193,19 +773,22 @@ def emit_key_facts(facts: List[str], priority: int = MemoryPriority.MEDIUM) -> s
     from datetime import datetime
     
     results = []
+    fact_ids = []
     priority = min(max(priority, MemoryPriority.LOW), MemoryPriority.CRITICAL)
+    key_facts = _get_prioritized_memory('key_facts')
     
     for fact in facts:
         # Get and increment fact ID
-        fact_id = _global_memory['key_fact_id_counter']
-        _global_memory['key_fact_id_counter'] += 1
+        fact_id = get_memory_store().next_id('key_fact_id_counter')
+        fact_ids.append(fact_id)
         
         # Store fact with ID and priority
-        _global_memory['key_facts'][fact_id] = PrioritizedFact(
-            content=fact,
-            priority=priority,
-            timestamp=datetime.now().isoformat()
-        )
+        with get_memory_store().lock:
+            key_facts[fact_id] = PrioritizedFact(
+                content=fact,
+                priority=priority,
+                timestamp=datetime.now().isoformat()
+            )
         
         # Display panel with ID and priority
         priority_labels = {
@@ -225,7 +808,8 @@ def emit_key_facts(facts: List[str], priority: int = MemoryPriority.MEDIUM) -> s
         results.append(f"Stored fact #{fact_id}: {fact}")
     
     _enforce_memory_limit('key_facts')
-    log_work_event(f"Stored {len(facts)} key facts.")    
+    log_work_event(f"Stored {len(facts)} key facts.", kind='key_facts', tool='emit_key_facts',
+                   refs={'key_facts': fact_ids})
     return "Facts stored."
 
 
@@ -242,14 +826,15 @@ def delete_key_facts(fact_ids: List[int]) -> str:
     """
     results = []
     for fact_id in fact_ids:
-        if fact_id in _global_memory['key_facts']:
-            # Delete the fact
-            deleted_fact = _global_memory['key_facts'].pop(fact_id)
+        with get_memory_store().lock:
+            deleted_fact = _global_memory['key_facts'].pop(fact_id, None)
+        if deleted_fact is not None:
             success_msg = f"Successfully deleted fact #{fact_id}: {deleted_fact}"
             console.print(Panel(Markdown(success_msg), title="Fact Deleted", border_style="green"))
             results.append(success_msg)
     
-    log_work_event(f"Deleted facts {fact_ids}.")        
+    log_work_event(f"Deleted facts {fact_ids}.", kind='key_facts', tool='delete_key_facts',
+                   refs={'key_facts': list(fact_ids)})
     return "Facts deleted."
 
 @tool("delete_tasks")
@@ -265,16 +850,23 @@ def delete_tasks(task_ids: List[int]) -> str:
     """
     results = []
     for task_id in task_ids:
-        if task_id in _global_memory['tasks']:
-            # Delete the task
-            deleted_task = _global_memory['tasks'].pop(task_id)
+        with get_memory_store().lock:
+            deleted_task = _global_memory['tasks'].pop(task_id, None)
+            task_deps = _global_memory.get('task_deps', {})
+            task_deps.pop(task_id, None)
+            # Dependents no longer wait for a deleted task
+            for deps in task_deps.values():
+                if task_id in deps['depends_on']:
+                    deps['depends_on'].remove(task_id)
+        if deleted_task is not None:
             success_msg = f"Successfully deleted task #{task_id}: {deleted_task}"
             console.print(Panel(Markdown(success_msg), 
                               title="Task Deleted", 
                               border_style="green"))
             results.append(success_msg)
     
-    log_work_event(f"Deleted tasks {task_ids}.")        
+    log_work_event(f"Deleted tasks {task_ids}.", kind='task', tool='delete_tasks',
+                   refs={'tasks': list(task_ids)})
     return "Tasks deleted."
 
 @tool("request_implementation")
@@ -292,15 +884,212 @@ def request_implementation() -> str:
     """
     _global_memory['implementation_requested'] = True
     console.print(Panel("🚀 Implementation Requested", style="yellow", padding=0))
-    log_work_event("Implementation requested.")
+    log_work_event("Implementation requested.", kind='implementation', tool='request_implementation')
     return ""
 
 
 
+def _read_source(filepath: str) -> Optional[Tuple[float, str, List[str]]]:
+    """Read a source file for snippet tracking.
+
+    Returns:
+        Tuple of (mtime, content hash, lines), or None if the file cannot be read
+    """
+    try:
+        mtime = os.stat(filepath).st_mtime
+        with open(filepath, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    return mtime, hashlib.sha256(data).hexdigest(), data.decode('utf-8', errors='replace').splitlines()
+
+def _nearest(positions: Iterable[int], target: int) -> Optional[int]:
+    return min(positions, key=lambda pos: (abs(pos - target), pos), default=None)
+
+def _reanchor_snippet(snippet: PrioritizedSnippet, source: Optional[Tuple[float, str, List[str]]]) -> Optional[PrioritizedSnippet]:
+    """Bring a snippet up to date with the current contents of its file.
+
+    The snippet keeps its place if its lines are unchanged, follows them if
+    they moved, and is re-sliced from the current file around its first
+    non-blank line if only that line survived.
+
+    Returns:
+        The updated snippet, or None if its lines could not be found
+    """
+    if source is None:
+        return None
+    mtime, content_hash, lines = source
+    if snippet.get('content_hash') == content_hash:
+        return PrioritizedSnippet(**{**snippet, 'mtime': mtime})
+
+    updated = {**snippet, 'mtime': mtime, 'content_hash': content_hash, 'stale': False}
+    snippet_lines = snippet['snippet'].splitlines() or ['']
+    count = len(snippet_lines)
+    start = snippet['line_number'] - 1
+
+    # The snippet itself, nearest to where it used to be
+    pos = _nearest(
+        (i for i, line in enumerate(lines)
+         if line == snippet_lines[0] and lines[i:i + count] == snippet_lines),
+        start
+    )
+    if pos is not None:
+        updated['line_number'] = pos + 1
+        return PrioritizedSnippet(**updated)
+
+    # Its first non-blank line, re-slicing the current lines around it
+    anchor_offset = next((i for i, line in enumerate(snippet_lines) if line.strip()), None)
+    if anchor_offset is None:
+        return None
+    anchor = snippet_lines[anchor_offset].strip()
+    pos = _nearest(
+        (i for i, line in enumerate(lines) if line.strip() == anchor),
+        start + anchor_offset
+    )
+    if pos is None:
+        return None
+    first = max(pos - anchor_offset, 0)
+    updated['line_number'] = first + 1
+    updated['snippet'] = "\n".join(lines[first:first + count])
+    return PrioritizedSnippet(**updated)
+
+def refresh_key_snippets(filepaths: Optional[Iterable[str]] = None) -> List[int]:
+    """Check stored key snippets against their files and update changed ones.
+
+    Each tracked file is checked with a single stat; only files whose mtime
+    differs from the one recorded on their snippets are read. Snippets whose
+    lines disappeared are handled per STALE_SNIPPET_POLICY.
+
+    Args:
+        filepaths: Only check snippets of these files (default: all snippets)
+
+    Returns:
+        IDs of the snippets that were updated, flagged or dropped
+    """
+    key_snippets = _get_prioritized_memory('key_snippets')
+    wanted = None
+    if filepaths is not None:
+        wanted = {RelatedFilesRegistry.normalize(path) for path in filepaths}
+
+    changed = []
+    with get_memory_store().lock:
+        by_file: Dict[str, List[int]] = {}
+        for snippet_id, snippet in key_snippets.items():
+            if 'mtime' not in snippet:
+                continue  # Not tracked, e.g. stored before tracking existed
+            path = RelatedFilesRegistry.normalize(snippet['filepath'])
+            if wanted is None or path in wanted:
+                by_file.setdefault(path, []).append(snippet_id)
+
+        for path, snippet_ids in by_file.items():
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                mtime = None
+            outdated = [i for i in snippet_ids if key_snippets[i]['mtime'] != mtime]
+            if not outdated:
+                continue
+
+            source = _read_source(path) if mtime is not None else None
+            for snippet_id in outdated:
+                snippet = key_snippets[snippet_id]
+                updated = _reanchor_snippet(snippet, source)
+                if updated is None:
+                    if STALE_SNIPPET_POLICY == 'drop':
+                        del key_snippets[snippet_id]
+                        changed.append(snippet_id)
+                        continue
+                    updated = PrioritizedSnippet(**{**snippet, 'mtime': mtime, 'stale': True})
+                if updated != snippet:
+                    key_snippets[snippet_id] = updated
+                if (updated['line_number'], updated['snippet'], updated.get('stale')) != \
+                        (snippet['line_number'], snippet['snippet'], snippet.get('stale')):
+                    changed.append(snippet_id)
+    return changed
+
+def _store_snippet(
+    snippet_info: SnippetInfo,
+    priority: int,
+    timestamp: str,
+    source: Optional[Tuple[float, str, List[str]]] = None
+) -> Tuple[int, str, PrioritizedSnippet]:
+    """Store a snippet, merging it with stored snippets of overlapping or adjacent lines.
+
+    Snippets whose lines are already contained in a stored snippet are not
+    stored again. Otherwise the snippet and every stored snippet it touches
+    are combined into one entry under the lowest existing ID; lines of the new
+    snippet win where they overlap, and the highest priority is kept.
+
+    Returns:
+        Tuple of (snippet_id, action, stored snippet), action being one of
+        'stored', 'merged' or 'duplicate'
+    """
+    key_snippets = _get_prioritized_memory('key_snippets')
+    filepath = RelatedFilesRegistry.normalize(snippet_info['filepath'])
+    lines = snippet_info['snippet'].splitlines() or ['']
+    first, last = _snippet_range(snippet_info['line_number'], snippet_info['snippet'])
+    tracking = {}
+    if source is not None:
+        tracking = {'mtime': source[0], 'content_hash': source[1], 'stale': False}
+
+    with get_memory_store().lock:
+        # Stored snippets of this file must match its current lines before merging
+        refresh_key_snippets([filepath])
+        touching = sorted(key_snippets.overlapping(filepath, first, last))
+
+        for snippet_id in touching:
+            existing = key_snippets[snippet_id]
+            existing_lines = existing['snippet'].splitlines() or ['']
+            offset = first - existing['line_number']
+            if offset >= 0 and existing_lines[offset:offset + len(lines)] == lines:
+                if priority > existing['priority']:
+                    existing = PrioritizedSnippet(**{**existing, 'priority': priority})
+                    key_snippets[snippet_id] = existing
+                return snippet_id, 'duplicate', existing
+
+        if not touching:
+            snippet_id = get_memory_store().next_id('key_snippet_id_counter')
+            stored = PrioritizedSnippet(
+                **{**snippet_info, 'filepath': filepath},
+                **tracking,
+                priority=priority,
+                timestamp=timestamp
+            )
+            key_snippets[snippet_id] = stored
+            return snippet_id, 'stored', stored
+
+        merged_lines: Dict[int, str] = {}
+        descriptions: List[str] = []
+        for existing in [key_snippets[i] for i in touching] + [snippet_info]:
+            line_number = existing['line_number']
+            for offset, line in enumerate(existing['snippet'].splitlines() or ['']):
+                merged_lines[line_number + offset] = line
+            description = existing.get('description')
+            if description and description not in descriptions:
+                descriptions.append(description)
+
+        snippet_id = touching[0]
+        start = min(merged_lines)
+        stored = PrioritizedSnippet(
+            filepath=filepath,
+            line_number=start,
+            snippet="\n".join(merged_lines[n] for n in range(start, max(merged_lines) + 1)),
+            description="\n\n".join(descriptions) or None,
+            priority=max([priority] + [key_snippets[i]['priority'] for i in touching]),
+            timestamp=timestamp,
+            **tracking
+        )
+        for other_id in touching[1:]:
+            del key_snippets[other_id]
+        key_snippets[snippet_id] = stored
+        return snippet_id, 'merged', stored
+
 @tool("emit_key_snippets")
 def emit_key_snippets(snippets: List[SnippetInfo], priority: int = MemoryPriority.MEDIUM) -> str:
     """Store multiple key source code snippets in global memory.
     Automatically adds the filepaths of the snippets to related files.
+    Snippets overlapping or directly adjacent to a stored snippet of the same
+    file are merged into it, and snippets already stored are skipped.
     
     Args:
         snippets: List of snippet information dictionaries containing:
@@ -317,21 +1106,22 @@ def emit_key_snippets(snippets: List[SnippetInfo], priority: int = MemoryPriorit
     
     priority = min(max(priority, MemoryPriority.LOW), MemoryPriority.CRITICAL)
     # First collect unique filepaths to add as related files
-    emit_related_files.invoke({"files": [snippet_info['filepath'] for snippet_info in snippets]})
+    _register_related_files([snippet_info['filepath'] for snippet_info in snippets])
+
+    # Record the state of each source file once, for staleness tracking
+    sources = {}
+    for snippet_info in snippets:
+        path = RelatedFilesRegistry.normalize(snippet_info['filepath'])
+        if path not in sources:
+            sources[path] = _read_source(path)
 
     results = []
+    snippet_ids = []
     for snippet_info in snippets:
-        # Get and increment snippet ID 
-        snippet_id = _global_memory['key_snippet_id_counter']
-        _global_memory['key_snippet_id_counter'] += 1
-        
-        # Store snippet info with priority
-        prioritized_snippet = PrioritizedSnippet(
-            **snippet_info,
-            priority=priority,
-            timestamp=datetime.now().isoformat()
+        snippet_id, action, stored = _store_snippet(
+            snippet_info, priority, datetime.now().isoformat(),
+            sources[RelatedFilesRegistry.normalize(snippet_info['filepath'])]
         )
-        _global_memory['key_snippets'][snippet_id] = prioritized_snippet
         
         # Format display text as markdown
         priority_labels = {
@@ -342,31 +1132,39 @@ def emit_key_snippets(snippets: List[SnippetInfo], priority: int = MemoryPriorit
         }
         
         display_text = [
-            f"**Priority**: {priority_labels[priority]}",
+            f"**Priority**: {priority_labels[stored['priority']]}",
             "",
             f"**Source Location**:",
-            f"- File: `{snippet_info['filepath']}`",
-            f"- Line: `{snippet_info['line_number']}`",
+            f"- File: `{stored['filepath']}`",
+            f"- Line: `{stored['line_number']}`",
             "",  # Empty line before code block
             "**Code**:",
             "```python",
-            snippet_info['snippet'].rstrip(),  # Remove trailing whitespace 
+            stored['snippet'].rstrip(),  # Remove trailing whitespace 
             "```"
         ]
-        if snippet_info['description']:
-            display_text.extend(["", "**Description**:", snippet_info['description']])
+        if stored.get('description'):
+            display_text.extend(["", "**Description**:", stored['description']])
+
+        titles = {
+            'stored': f"📝 Key Snippet #{snippet_id}",
+            'merged': f"📝 Key Snippet #{snippet_id} (merged)",
+            'duplicate': f"📝 Key Snippet #{snippet_id} (already stored)"
+        }
             
         # Display panel
         console.print(Panel(
             Markdown("\n".join(display_text)), 
-            title=f"📝 Key Snippet #{snippet_id}",
+            title=titles[action],
             border_style="bright_cyan"
         ))
         
-        results.append(f"Stored snippet #{snippet_id}")
+        results.append(f"{action.capitalize()} snippet #{snippet_id}")
+        snippet_ids.append(snippet_id)
     
     _enforce_memory_limit('key_snippets')
-    log_work_event(f"Stored {len(snippets)} code snippets.")    
+    log_work_event(f"Stored {len(snippets)} code snippets.", kind='key_snippets', tool='emit_key_snippets',
+                   refs={'key_snippets': snippet_ids})
     return "Snippets stored."
 
 @tool("delete_key_snippets") 
@@ -382,16 +1180,17 @@ def delete_key_snippets(snippet_ids: List[int]) -> str:
     """
     results = []
     for snippet_id in snippet_ids:
-        if snippet_id in _global_memory['key_snippets']:
-            # Delete the snippet
-            deleted_snippet = _global_memory['key_snippets'].pop(snippet_id)
+        with get_memory_store().lock:
+            deleted_snippet = _global_memory['key_snippets'].pop(snippet_id, None)
+        if deleted_snippet is not None:
             success_msg = f"Successfully deleted snippet #{snippet_id} from {deleted_snippet['filepath']}"
             console.print(Panel(Markdown(success_msg), 
                               title="Snippet Deleted", 
                               border_style="green"))
             results.append(success_msg)
     
-    log_work_event(f"Deleted snippets {snippet_ids}.")        
+    log_work_event(f"Deleted snippets {snippet_ids}.", kind='key_snippets', tool='delete_key_snippets',
+                   refs={'key_snippets': list(snippet_ids)})
     return "Snippets deleted."
 
 @tool("swap_task_order")
@@ -414,8 +1213,20 @@ def swap_task_order(id1: int, id2: int) -> str:
         return "Invalid task ID(s)"
         
     # Swap the tasks
-    _global_memory['tasks'][id1], _global_memory['tasks'][id2] = \
-        _global_memory['tasks'][id2], _global_memory['tasks'][id1]
+    with get_memory_store().lock:
+        tasks = _global_memory['tasks']
+        tasks[id1], tasks[id2] = tasks[id2], tasks[id1]
+
+        # Dependencies follow the task descriptions to their new IDs
+        task_deps = _global_memory.get('task_deps', {})
+        deps1, deps2 = task_deps.pop(id1, None), task_deps.pop(id2, None)
+        if deps2 is not None:
+            task_deps[id1] = deps2
+        if deps1 is not None:
+            task_deps[id2] = deps1
+        swapped = {id1: id2, id2: id1}
+        for deps in task_deps.values():
+            deps['depends_on'] = [swapped.get(dep, dep) for dep in deps['depends_on']]
     
     # Display what was swapped
     console.print(Panel(
@@ -441,7 +1252,7 @@ def one_shot_completed(message: str) -> str:
     _global_memory['task_completed'] = True
     _global_memory['completion_message'] = message
     console.print(Panel(Markdown(message), title="✅ Task Completed"))
-    log_work_event(f"Task completed\n\n{message}")
+    log_work_event(f"Task completed\n\n{message}", kind='completion', tool='one_shot_completed')
     return "Completion noted."
 
 @tool("task_completed")
@@ -472,19 +1283,72 @@ def plan_implementation_completed(message: str) -> str:
     _global_memory['plan_completed'] = True
     _global_memory['completion_message'] = message
     _global_memory['tasks'].clear()  # Clear task list when plan is completed
+    _global_memory.get('task_deps', {}).clear()
     _global_memory['task_id_counter'] = 1
     console.print(Panel(Markdown(message), title="✅ Plan Executed"))
-    log_work_event(f"Plan execution completed:\n\n{message}")
+    log_work_event(f"Plan execution completed:\n\n{message}", kind='completion', tool='plan_implementation_completed')
     return "Plan completion noted and task list cleared."
 
+def _get_related_files_registry() -> RelatedFilesRegistry:
+    """Get the related files registry, upgrading a plain dict in place if needed."""
+    store = get_memory_store()
+    with store.lock:
+        files = store.get('related_files')
+        if not isinstance(files, RelatedFilesRegistry):
+            files = RelatedFilesRegistry(files or {})
+            store['related_files'] = files
+        return files
+
+def _register_related_files(files: List[str]) -> List[Tuple[int, str, bool]]:
+    """Register files in the related files registry and display newly noted files.
+
+    Args:
+        files: List of file paths to add
+
+    Returns:
+        List of (file_id, path, is_new) tuples in input order
+    """
+    store = get_memory_store()
+    with store.lock:
+        registry = _get_related_files_registry()
+        results, store['related_file_id_counter'] = registry.add_many(
+            files, store.get('related_file_id_counter', 1)
+        )
+
+    # Rich output - single consolidated panel
+    added_files = [path for _, path, is_new in results if is_new]
+    if added_files:
+        files_added_md = '\n'.join(f"- `{file}`" for file in added_files)
+        md_content = f"**Files Noted:**\n{files_added_md}"
+        console.print(Panel(Markdown(md_content), 
+                          title="📁 Related Files Noted", 
+                          border_style="green"))
+
+    return results
+
 def get_related_files() -> List[str]:
     """Get the current list of related files.
     
     Returns:
         List of formatted strings in the format 'ID#X path/to/file.py'
     """
-    files = _global_memory['related_files']
-    return [f"ID#{file_id} {filepath}" for file_id, filepath in sorted(files.items())]
+    files = _get_related_files_registry()
+    return list(_render_cached(
+        'related_files', 'id_list', files,
+        lambda files: [f"ID#{file_id} {filepath}" for file_id, filepath in sorted(files.items())]
+    ))
+
+def get_related_file_paths() -> List[str]:
+    """Get the paths of all related files, ordered by ID.
+
+    Returns:
+        List of file paths without ID prefixes
+    """
+    files = _get_related_files_registry()
+    return list(_render_cached(
+        'related_files', 'path_list', files,
+        lambda files: [filepath for _, filepath in sorted(files.items())]
+    ))
 
 @tool("emit_related_files")
 def emit_related_files(files: List[str]) -> str:
@@ -496,43 +1360,18 @@ def emit_related_files(files: List[str]) -> str:
     Returns:
         Formatted string containing file IDs and paths for all processed files
     """
-    results = []
-    added_files = []
-    
-    # Process files
-    for file in files:
-        # Check if file path already exists in values
-        existing_id = None
-        for fid, fpath in _global_memory['related_files'].items():
-            if fpath == file:
-                existing_id = fid
-                break
-                
-        if existing_id is not None:
-            # File exists, use existing ID
-            results.append(f"File ID #{existing_id}: {file}")
-        else:
-            # New file, assign new ID
-            file_id = _global_memory['related_file_id_counter']
-            _global_memory['related_file_id_counter'] += 1
-            
-            # Store file with ID
-            _global_memory['related_files'][file_id] = file
-            added_files.append((file_id, file))
-            results.append(f"File ID #{file_id}: {file}")
-    
-    # Rich output - single consolidated panel
-    if added_files:
-        files_added_md = '\n'.join(f"- `{file}`" for id, file in added_files)
-        md_content = f"**Files Noted:**\n{files_added_md}"
-        console.print(Panel(Markdown(md_content), 
-                          title="📁 Related Files Noted", 
-                          border_style="green"))
-    
-    return '\n'.join(results)
+    results = _register_related_files(files)
+    return '\n'.join(f"File ID #{file_id}: {path}" for file_id, path, _ in results)
 
 
-def log_work_event(event: str) -> str:
+def log_work_event(
+    event: str,
+    kind: str = 'note',
+    tool: Optional[str] = None,
+    duration: Optional[float] = None,
+    tokens: Optional[int] = None,
+    refs: Optional[Mapping[str, List[int]]] = None
+) -> str:
     """Add timestamped entry to work log.
     
     Internal function used to track major events during agent execution.
@@ -540,27 +1379,87 @@ def log_work_event(event: str) -> str:
     
     Args:
         event: Description of the event to log
+        kind: Category of the event, e.g. 'task' or 'agent'
+        tool: Tool that produced the event
+        duration: Seconds spent, for timed events (see work_span())
+        tokens: Tokens used, when known
+        refs: Memory IDs involved, by memory key, e.g. {'tasks': [1]}
         
     Returns:
         Confirmation message
         
     Note:
-        Entries can be retrieved with get_work_log() as markdown formatted text.
+        Entries can be retrieved with get_work_log() as markdown formatted text
+        or with export_work_log() as JSON lines.
         Older entries are automatically removed when limit is reached.
     """
     from datetime import datetime
     entry = WorkLogEntry(
         timestamp=datetime.now().isoformat(),
-        event=event
+        event=event,
+        kind=kind,
+        tool=tool,
+        duration=duration,
+        tokens=tokens,
+        refs={key: list(ids) for key, ids in refs.items()} if refs else None
     )
-    _global_memory['work_log'].append(entry)
-    _enforce_memory_limit('work_log')
+    with get_memory_store().lock:
+        _get_work_log().append(entry)
     return f"Event logged: {event}"
 
 
+@contextmanager
+def work_span(
+    kind: str,
+    event: str,
+    tool: Optional[str] = None,
+    refs: Optional[Mapping[str, List[int]]] = None
+) -> Iterator[Dict[str, Any]]:
+    """Time a block of work and log it as a work event when the block exits.
+
+    The yielded dict holds the 'event', 'tokens' and 'refs' to log and may be
+    updated inside the block. The event is logged even if the block raises.
+
+    Example:
+        with work_span('agent', f"Research: {query}", tool='request_research') as span:
+            run_research_agent(query, model)
+            span['tokens'] = used_tokens
+    """
+    span: Dict[str, Any] = {'event': event, 'tokens': None, 'refs': dict(refs or {})}
+    start = time.perf_counter()
+    try:
+        yield span
+    finally:
+        log_work_event(
+            span['event'],
+            kind=kind,
+            tool=tool,
+            duration=time.perf_counter() - start,
+            tokens=span['tokens'],
+            refs=span['refs'] or None
+        )
+
+
+def _render_work_log_entry(entry: WorkLogEntry) -> str:
+    """Render a single work log entry as a markdown section."""
+    lines = [f"## {entry['timestamp']}", "", entry['event']]
+    details = []
+    if entry.get('tool'):
+        details.append(entry['tool'])
+    if entry.get('duration') is not None:
+        details.append(f"{entry['duration']:.2f}s")
+    if entry.get('tokens') is not None:
+        details.append(f"{entry['tokens']} tokens")
+    if details:
+        lines.extend(["", f"_{' · '.join(details)}_"])
+    return "\n".join(lines)
+
+
 def get_work_log() -> str:
     """Return formatted markdown of work log entries.
     
+    The markdown is rendered on demand and cached until the log changes.
+
     Returns:
         Markdown formatted text with timestamps as headings and events as content,
         or 'No work log entries' if the log is empty.
@@ -570,19 +1469,29 @@ def get_work_log() -> str:
 
         Task #1 added: Create login form
     """
-    if not _global_memory['work_log']:
+    log = _get_work_log()
+    if not log:
         return "No work log entries"
-    
-    entries = []
-    for entry in _global_memory['work_log']:
-        entries.extend([
-            f"## {entry['timestamp']}",
-            "",
-            entry['event'],
-            ""  # Blank line between entries
-        ])
-    
-    return "\n".join(entries).rstrip()  # Remove trailing newline
+    return _render_cached(
+        'work_log', 'summary', log,
+        lambda entries: "\n\n".join(_render_work_log_entry(entry) for entry in entries)
+    )
+
+
+def export_work_log(path: Optional[str] = None) -> str:
+    """Export the work log as JSON lines, one structured event per line.
+
+    Args:
+        path: File to write the JSON lines to (default: only return them)
+
+    Returns:
+        The JSON lines
+    """
+    jsonl = _get_work_log().to_jsonl()
+    if path is not None:
+        with open(path, 'w') as f:
+            f.write(jsonl)
+    return jsonl
 
 
 def reset_work_log() -> str:
@@ -594,7 +1503,7 @@ def reset_work_log() -> str:
     Note:
         This permanently removes all work log entries. The operation cannot be undone.
     """
-    _global_memory['work_log'].clear()
+    _get_work_log().clear()
     return "Work log cleared"
 
 
@@ -610,18 +1519,74 @@ def deregister_related_files(file_ids: List[int]) -> str:
         Success message string
     """
     results = []
-    for file_id in file_ids:
-        if file_id in _global_memory['related_files']:
-            # Delete the file reference
-            deleted_file = _global_memory['related_files'].pop(file_id)
-            success_msg = f"Successfully removed related file #{file_id}: {deleted_file}"
-            console.print(Panel(Markdown(success_msg), 
-                              title="File Reference Removed", 
-                              border_style="green"))
-            results.append(success_msg)
+    with get_memory_store().lock:
+        removed = _get_related_files_registry().remove_many(file_ids)
+    for file_id, deleted_file in removed:
+        success_msg = f"Successfully removed related file #{file_id}: {deleted_file}"
+        console.print(Panel(Markdown(success_msg), 
+                          title="File Reference Removed", 
+                          border_style="green"))
+        results.append(success_msg)
             
     return "File references removed."
 
+def _render_key_fact(fact_id: int, fact: PrioritizedFact) -> str:
+    """Render a single key fact as a markdown section."""
+    return "\n".join([
+        f"## 🔑 Key Fact #{fact_id}",
+        "",  # Empty line for better markdown spacing
+        fact['content']
+    ])
+
+def _render_key_facts(values: Mapping[int, PrioritizedFact]) -> str:
+    """Render key facts as markdown sections ordered by ID."""
+    # Sort by ID for consistent output and format as markdown sections
+    return "\n\n".join(_render_key_fact(k, v) for k, v in sorted(values.items()))
+
+def _render_key_snippet(snippet_id: int, snippet: PrioritizedSnippet) -> str:
+    """Render a single key snippet as a markdown block."""
+    snippet_text = [
+        f"## 📝 Code Snippet #{snippet_id}",
+        "",  # Empty line for better markdown spacing
+        f"**Source Location**:",
+        f"- File: `{snippet['filepath']}`",
+        f"- Line: `{snippet['line_number']}`",
+    ]
+    if snippet.get('stale'):
+        snippet_text.append("- ⚠️ Stale: the file changed and these lines were not found in it anymore")
+    snippet_text.extend([
+        "",  # Empty line before code block
+        "**Code**:",
+        "```python",
+        snippet['snippet'].rstrip(),  # Remove trailing whitespace
+        "```"
+    ])
+    if snippet['description']:
+        # Add empty line and description
+        snippet_text.extend(["", "**Description**:", snippet['description']])
+    return "\n".join(snippet_text)
+
+def _render_key_snippets(values: Mapping[int, PrioritizedSnippet]) -> str:
+    """Render key snippets as markdown blocks ordered by ID."""
+    # Format each snippet with file info and content using markdown
+    return "\n\n".join(_render_key_snippet(k, v) for k, v in sorted(values.items()))
+
+def _render_research_note(index: int, note: PrioritizedNote) -> str:
+    """Render a single research note as its content."""
+    return note['content']
+
+def _render_work_log(values: Iterable[WorkLogEntry]) -> str:
+    """Render work log entries as markdown sections."""
+    if not values:
+        return ""
+    entries = [f"## {entry['timestamp']}\n{entry['event']}"
+              for entry in values]
+    return "\n\n".join(entries)
+
+def _render_lines(values: Iterable[Any]) -> str:
+    """Render a list of values one per line."""
+    return "\n".join(str(v) for v in values)
+
 def get_memory_value(key: str) -> str:
     """Get a value from global memory.
     
@@ -629,6 +1594,10 @@ def get_memory_value(key: str) -> str:
     - key_facts: Returns numbered list of facts in format '#ID: fact'
     - key_snippets: Returns formatted snippets with file path, line number and content
     - All other types: Returns newline-separated list of values
+
+    Rendered sections of versioned containers are cached and reused until the
+    container changes. Key snippets are first checked against their files,
+    see refresh_key_snippets().
     
     Args:
         key: The key to get from memory
@@ -639,53 +1608,451 @@ def get_memory_value(key: str) -> str:
         - For key_snippets: Formatted snippet blocks
         - For other types: One value per line
     """
-    values = _global_memory.get(key, [])
+    if key == 'key_snippets':
+        refresh_key_snippets()
+    if key in ('research_notes', 'key_facts', 'key_snippets'):
+        values = _get_prioritized_memory(key)
+    else:
+        values = _global_memory.get(key, [])
     
     if key == 'key_facts':
-        # For empty dict, return empty string
-        if not values:
-            return ""
-        # Sort by ID for consistent output and format as markdown sections
-        facts = []
-        for k, v in sorted(values.items()):
-            facts.extend([
-                f"## 🔑 Key Fact #{k}",
-                "",  # Empty line for better markdown spacing
-                v['content'],
-                ""  # Empty line between facts
-            ])
-        return "\n".join(facts).rstrip()  # Remove trailing newline
+        return _render_cached(key, 'markdown', values, _render_key_facts)
     
     if key == 'key_snippets':
-        if not values:
-            return ""
-        # Format each snippet with file info and content using markdown
-        snippets = []
-        for k, v in sorted(values.items()):
-            snippet_text = [
-                f"## 📝 Code Snippet #{k}",
-                "",  # Empty line for better markdown spacing
-                f"**Source Location**:",
-                f"- File: `{v['filepath']}`",
-                f"- Line: `{v['line_number']}`",
-                "",  # Empty line before code block
-                "**Code**:",
-                "```python",
-                v['snippet'].rstrip(),  # Remove trailing whitespace
-                "```"
-            ]
-            if v['description']:
-                # Add empty line and description
-                snippet_text.extend(["", "**Description**:", v['description']])
-            snippets.append("\n".join(snippet_text))
-        return "\n\n".join(snippets)
+        return _render_cached(key, 'markdown', values, _render_key_snippets)
     
     if key == 'work_log':
-        if not values:
-            return ""
-        entries = [f"## {entry['timestamp']}\n{entry['event']}"
-                  for entry in values]
-        return "\n\n".join(entries)
+        return _render_cached(key, 'markdown', _get_work_log(), _render_work_log)
 
     # For other types (lists), join with newlines
-    return "\n".join(str(v) for v in values)
+    return _render_cached(key, 'markdown', values, _render_lines)
+
+
+class PackedSection(NamedTuple):
+    """A memory section packed into a token budget."""
+    text: str  # Rendered section, including a note about dropped items
+    included: List[int]  # IDs (sequence numbers for research_notes) that were kept
+    dropped: List[int]  # IDs (sequence numbers for research_notes) left out
+    tokens: int  # Estimated tokens of the rendered section
+
+# Per-item renderers and separators for packable memory sections
+_PACKABLE_SECTIONS = {
+    'research_notes': (_render_research_note, "\n\n", "research notes"),
+    'key_facts': (_render_key_fact, "\n\n", "key facts"),
+    'key_snippets': (_render_key_snippet, "\n\n", "key snippets"),
+}
+
+# Most dropped IDs listed in the note appended to a packed section
+MAX_OMITTED_IDS_SHOWN = 10
+
+def _omitted_note(key: str, label: str, dropped: List[int]) -> str:
+    """Render the note listing items left out of a packed section.
+
+    Research note IDs are internal sequence numbers nothing can act on, so
+    they are not listed.
+    """
+    note = f"_{len(dropped)} lower-priority {label} omitted"
+    if key != 'research_notes':
+        shown = [str(item_id) for item_id in dropped[:MAX_OMITTED_IDS_SHOWN]]
+        if len(dropped) > MAX_OMITTED_IDS_SHOWN:
+            shown.append(f"+{len(dropped) - MAX_OMITTED_IDS_SHOWN} more")
+        note += f" (IDs: {', '.join(shown)})"
+    return note + "._"
+
+def _pack_items(key: str, values: Any, budget: int) -> PackedSection:
+    """Greedily pack memory items into a token budget.
+
+    Items are considered highest priority first, then newest first. An item
+    that does not fit is skipped and smaller, lower-ranked items are still
+    tried. Kept items are rendered in ID order, followed by a note about the
+    dropped ones; budget is reserved for the note so the whole section fits.
+    If not even the note fits, it is left out.
+    """
+    render_item, separator, label = _PACKABLE_SECTIONS[key]
+    ranked = sorted(
+        values.items(),
+        key=lambda item: (item[1]['priority'], item[1]['timestamp'], item[0]),
+        reverse=True
+    )
+    rendered = [(item_id, render_item(item_id, item)) for item_id, item in ranked]
+    separator_tokens = estimate_tokens(separator)
+
+    def fill(limit: int) -> Tuple[Dict[int, str], List[int], int]:
+        kept = {}
+        dropped = []
+        used = 0
+        for item_id, text in rendered:
+            cost = estimate_tokens(text) + (separator_tokens if kept else 0)
+            if used + cost <= limit:
+                kept[item_id] = text
+                used += cost
+            else:
+                dropped.append(item_id)
+        return kept, sorted(dropped), used
+
+    reserve = 0
+    while True:
+        kept, dropped, used = fill(budget - reserve)
+        if not dropped:
+            note = None
+            break
+        note = _omitted_note(key, label, dropped)
+        cost = estimate_tokens(note) + (separator_tokens if kept else 0)
+        if used + cost <= budget:
+            break
+        if reserve >= budget:
+            note = None  # Nothing is kept and the note alone does not fit
+            break
+        # A smaller fill can only drop more items and grow the note, so the
+        # reserve never has to shrink
+        reserve = max(reserve + 1, cost)
+
+    included = sorted(kept)
+    parts = [kept[item_id] for item_id in included]
+    if note:
+        parts.append(note)
+    text = separator.join(parts)
+    return PackedSection(text, included, dropped, estimate_tokens(text))
+
+def pack_memory_section(key: str, budget: Optional[int] = None) -> PackedSection:
+    """Pack a memory section into a token budget for use in a prompt.
+
+    Args:
+        key: One of 'research_notes', 'key_facts' or 'key_snippets'
+        budget: Token budget (default: PROMPT_TOKEN_BUDGETS[key])
+
+    Returns:
+        PackedSection with the rendered text and the IDs kept and dropped
+
+    Raises:
+        ValueError: If the section cannot be packed
+    """
+    if key not in _PACKABLE_SECTIONS:
+        raise ValueError(f"Memory section cannot be packed: {key}")
+    if budget is None:
+        budget = PROMPT_TOKEN_BUDGETS[key]
+    if key == 'key_snippets':
+        refresh_key_snippets()
+    values = _get_prioritized_memory(key)
+    return _render_cached(key, f"packed:{budget}", values, lambda values: _pack_items(key, values, budget))
+
+def get_packed_memory_value(key: str, budget: Optional[int] = None) -> str:
+    """Get a memory section packed into a token budget, as prompt text.
+
+    See pack_memory_section() for details.
+    """
+    return pack_memory_section(key, budget).text
+
+def set_prompt_budgets(budgets: Mapping[str, int]) -> None:
+    """Override prompt token budgets for the current run.
+
+    Args:
+        budgets: Mapping of section (a key of PROMPT_TOKEN_BUDGETS) to its token budget
+
+    Raises:
+        ValueError: If a section is unknown or a budget is not positive
+    """
+    for key, budget in budgets.items():
+        if key not in PROMPT_TOKEN_BUDGETS:
+            raise ValueError(f"Unknown prompt section: {key}")
+        if budget < 1:
+            raise ValueError(f"Prompt budget for {key} must be at least 1")
+    PROMPT_TOKEN_BUDGETS.update(budgets)
+
+# Memory sections reported back to callers of sub-agent tools
+DIFFABLE_MEMORY_KEYS = ('key_facts', 'key_snippets', 'research_notes', 'related_files')
+
+class MemorySnapshot(NamedTuple):
+    """Point-in-time view of memory sections, see snapshot_memory()."""
+    sections: Dict[str, Tuple[Any, Optional[int], Dict[Any, Any]]]  # key -> (container, version, items by ID)
+
+class MemoryDiff(NamedTuple):
+    """Changes to memory sections since a snapshot, see diff_memory()."""
+    added: Dict[str, Dict[Any, Any]]  # New or changed items by ID, per section
+    removed: Dict[str, List[Any]]  # IDs of items no longer present, per section
+
+    @property
+    def empty(self) -> bool:
+        return not any(self.added.values()) and not any(self.removed.values())
+
+def _diffable_container(key: str) -> Any:
+    if key == 'related_files':
+        return _get_related_files_registry()
+    return _get_prioritized_memory(key)
+
+def snapshot_memory(keys: Iterable[str] = DIFFABLE_MEMORY_KEYS) -> MemorySnapshot:
+    """Capture the current items of memory sections for a later diff_memory().
+
+    Only references are copied: stored items are replaced, never mutated, when
+    they change.
+
+    Args:
+        keys: Sections to capture, a subset of DIFFABLE_MEMORY_KEYS
+    """
+    sections = {}
+    with get_memory_store().lock:
+        for key in keys:
+            if key not in DIFFABLE_MEMORY_KEYS:
+                raise ValueError(f"Memory section cannot be diffed: {key}")
+            container = _diffable_container(key)
+            sections[key] = (container, getattr(container, 'version', None), dict(container.items()))
+    return MemorySnapshot(sections)
+
+def diff_memory(snapshot: MemorySnapshot) -> MemoryDiff:
+    """Compute what changed in memory since a snapshot.
+
+    Sections whose container and version are unchanged are skipped without
+    comparing items.
+
+    Returns:
+        MemoryDiff with new or changed items and removed IDs per section
+    """
+    added: Dict[str, Dict[Any, Any]] = {}
+    removed: Dict[str, List[Any]] = {}
+    with get_memory_store().lock:
+        for key, (container, version, before) in snapshot.sections.items():
+            current = _diffable_container(key)
+            if current is container and version is not None and current.version == version:
+                added[key], removed[key] = {}, []
+                continue
+            after = dict(current.items())
+            added[key] = {
+                item_id: item for item_id, item in after.items()
+                if item_id not in before or (before[item_id] is not item and before[item_id] != item)
+            }
+            removed[key] = sorted(item_id for item_id in before if item_id not in after)
+    return MemoryDiff(added, removed)
+
+def render_memory_diff(diff: MemoryDiff) -> Dict[str, Any]:
+    """Render a memory diff for returning to an agent.
+
+    Only sections with changes are included. Evicted research notes are not
+    reported since notes have no stable IDs.
+
+    Returns:
+        Dict with rendered new or changed 'key_facts', 'key_snippets' and
+        'research_notes', new 'related_files', and 'removed' IDs per section
+    """
+    changes: Dict[str, Any] = {}
+    if diff.added.get('key_facts'):
+        changes['key_facts'] = _render_key_facts(diff.added['key_facts'])
+    if diff.added.get('key_snippets'):
+        changes['key_snippets'] = _render_key_snippets(diff.added['key_snippets'])
+    if diff.added.get('research_notes'):
+        changes['research_notes'] = "\n\n".join(
+            note['content'] for _, note in sorted(diff.added['research_notes'].items())
+        )
+    if diff.added.get('related_files'):
+        changes['related_files'] = [
+            f"ID#{file_id} {filepath}" for file_id, filepath in sorted(diff.added['related_files'].items())
+        ]
+    removed = {
+        key: item_ids for key, item_ids in diff.removed.items()
+        if item_ids and key != 'research_notes'
+    }
+    if removed:
+        changes['removed'] = removed
+    return changes
+
+# Returned with memory changes so the caller knows how to get the full view
+MEMORY_HANDLE = {'tool': 'read_memory', 'sections': list(DIFFABLE_MEMORY_KEYS)}
+
+@tool("read_memory")
+def read_memory(sections: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Read the full current contents of memory sections.
+
+    Sub-agent tools only return what changed in memory while they ran. Use this
+    when you need the complete view of a section.
+
+    Args:
+        sections: Any of 'key_facts', 'key_snippets', 'research_notes' and
+                  'related_files' (default: all of them)
+
+    Returns:
+        Dict of section name to its full contents
+    """
+    sections = sections or list(DIFFABLE_MEMORY_KEYS)
+    unknown = [key for key in sections if key not in DIFFABLE_MEMORY_KEYS]
+    if unknown:
+        return {'error': f"Unknown memory sections: {', '.join(unknown)}"}
+    return {
+        key: get_related_files() if key == 'related_files' else get_memory_value(key)
+        for key in sections
+    }
+
+# Memory keys saved by export_memory() and restored by load_memory().
+# Runtime-only state such as 'config' and 'agent_depth' is not persisted.
+PERSISTENT_MEMORY_KEYS = [
+    'research_notes',
+    'plans',
+    'tasks',
+    'task_deps',
+    'task_completed',
+    'completion_message',
+    'task_id_counter',
+    'key_facts',
+    'key_fact_id_counter',
+    'key_snippets',
+    'key_snippet_id_counter',
+    'implementation_requested',
+    'related_files',
+    'related_file_id_counter',
+    'plan_completed',
+    'work_log'
+]
+
+# Persistent keys whose values are ID-keyed mappings
+_ID_MAPPING_KEYS = {'tasks', 'task_deps', 'key_facts', 'key_snippets', 'related_files'}
+
+def export_memory(keys: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Export memory as JSON-serializable data.
+
+    ID-keyed mappings are exported as lists of [id, value] pairs so integer IDs
+    survive a JSON round trip.
+
+    Args:
+        keys: Memory keys to export (default: PERSISTENT_MEMORY_KEYS)
+
+    Returns:
+        Dict of memory key to exported value, skipping keys not in memory
+    """
+    data = {}
+    for key in (PERSISTENT_MEMORY_KEYS if keys is None else keys):
+        if key not in _global_memory:
+            continue
+        value = _global_memory[key]
+        if key in _ID_MAPPING_KEYS:
+            value = [[item_id, item] for item_id, item in value.items()]
+        elif isinstance(value, (list, Sequence)) and not isinstance(value, str):
+            value = list(value)
+        data[key] = value
+    return data
+
+def load_memory(data: Mapping[str, Any]) -> None:
+    """Restore memory from data produced by export_memory().
+
+    Keys not present in `data` are left untouched. Restored categories are
+    wrapped in their prioritized containers and trimmed to MEMORY_LIMITS.
+
+    Args:
+        data: Mapping of memory key to exported value
+    """
+    for key, value in data.items():
+        if key not in PERSISTENT_MEMORY_KEYS:
+            continue
+        if key in _ID_MAPPING_KEYS:
+            value = {int(item_id): item for item_id, item in value}
+        if key == 'research_notes':
+            value = PrioritizedNotes(MEMORY_LIMITS[key], value)
+        elif key == 'key_facts':
+            value = PrioritizedMemory(MEMORY_LIMITS[key], value)
+        elif key == 'key_snippets':
+            value = SnippetMemory(MEMORY_LIMITS[key], value)
+        elif key == 'related_files':
+            value = RelatedFilesRegistry(value)
+        elif key == 'work_log':
+            value = WorkLog(MEMORY_LIMITS[key], value)
+        _global_memory[key] = value
+
+    for key in ('research_notes', 'key_facts', 'key_snippets'):
+        if key in data:
+            _enforce_memory_limit(key)
+
+def fork_memory_store() -> MemoryStore:
+    """Copy the current memory into a new store for an isolated sub-agent.
+
+    The fork starts with the parent's memory, run config and agent depth but
+    an empty work log. Changes made in the fork do not affect the parent
+    until they are merged back with merge_memory().
+
+    Example:
+        child = fork_memory_store()
+        with use_memory_store(child):
+            snapshot = snapshot_memory()
+            run_research_agent(query, model)
+            diff = diff_memory(snapshot)
+        merge_memory(diff, child['work_log'])
+    """
+    parent = get_memory_store()
+    with parent.lock:
+        data = export_memory()
+        config = parent.get('config')
+        depth = parent.get('agent_depth', 0)
+
+    child = MemoryStore()
+    with use_memory_store(child):
+        load_memory(data)
+        child['work_log'] = WorkLog(MEMORY_LIMITS['work_log'])
+        if config is not None:
+            child['config'] = config
+        child['agent_depth'] = depth
+    return child
+
+def merge_memory(diff: MemoryDiff, work_log: Iterable[WorkLogEntry] = ()) -> Dict[str, List[Any]]:
+    """Merge items added in another memory store into the current one.
+
+    Duplicates are skipped: facts and research notes with the same content,
+    snippets already covered by a stored snippet (overlapping ones are merged,
+    see emit_key_snippets) and files already registered. Removals in the
+    other store are not applied.
+
+    Args:
+        diff: Changes made in the other store, from diff_memory()
+        work_log: Work log entries of the other store to append
+
+    Returns:
+        IDs of merged items per section (note positions for research_notes)
+    """
+    merged: Dict[str, List[Any]] = {key: [] for key in DIFFABLE_MEMORY_KEYS}
+    store = get_memory_store()
+    with store.lock:
+        key_facts = _get_prioritized_memory('key_facts')
+        known_facts = {fact['content'] for fact in key_facts.values()}
+        for _, fact in sorted(diff.added.get('key_facts', {}).items()):
+            if fact['content'] in known_facts:
+                continue
+            fact_id = store.next_id('key_fact_id_counter')
+            key_facts[fact_id] = fact
+            known_facts.add(fact['content'])
+            merged['key_facts'].append(fact_id)
+
+        sources: Dict[str, Any] = {}
+        for _, snippet in sorted(diff.added.get('key_snippets', {}).items()):
+            path = RelatedFilesRegistry.normalize(snippet['filepath'])
+            if path not in sources:
+                sources[path] = _read_source(path)
+            snippet_info = SnippetInfo(
+                filepath=snippet['filepath'],
+                line_number=snippet['line_number'],
+                snippet=snippet['snippet'],
+                description=snippet.get('description')
+            )
+            snippet_id, action, _ = _store_snippet(
+                snippet_info, snippet['priority'], snippet['timestamp'], sources[path]
+            )
+            if action != 'duplicate' and snippet_id not in merged['key_snippets']:
+                merged['key_snippets'].append(snippet_id)
+
+        notes = _get_prioritized_memory('research_notes')
+        known_notes = {note['content'] for note in notes}
+        for _, note in sorted(diff.added.get('research_notes', {}).items()):
+            if note['content'] in known_notes:
+                continue
+            notes.append(note)
+            known_notes.add(note['content'])
+            merged['research_notes'].append(len(notes) - 1)
+
+        registry = _get_related_files_registry()
+        results, store['related_file_id_counter'] = registry.add_many(
+            [path for _, path in sorted(diff.added.get('related_files', {}).items())],
+            store.get('related_file_id_counter', 1)
+        )
+        merged['related_files'] = [file_id for file_id, _, is_new in results if is_new]
+
+        log = _get_work_log()
+        for entry in work_log:
+            log.append(entry)
+
+        for key in ('research_notes', 'key_facts', 'key_snippets'):
+            _enforce_memory_limit(key)
+    return merged
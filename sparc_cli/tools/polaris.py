@@ -9,9 +9,16 @@ class PolarisTool:
     """Tool that adds PolarisOne's token weighting capabilities to LLM interactions."""
     
     def __init__(self):
-        """Initialize the tool with a base LLM."""
-        base_model = initialize_llm("openai", "gpt-3.5-turbo")
-        self.polaris_model = create_polaris_model(base_model)
+        """Initialize the tool. The base LLM is created on first use."""
+        self._polaris_model = None
+
+    @property
+    def polaris_model(self):
+        """PolarisOne model wrapping the shared base LLM client."""
+        if self._polaris_model is None:
+            base_model = initialize_llm("openai", "gpt-3.5-turbo")
+            self._polaris_model = create_polaris_model(base_model)
+        return self._polaris_model
     
     def __call__(self, text: str) -> Dict[str, Any]:
         """Process text using PolarisOne's token weighting.
@@ -1,13 +1,22 @@
+import base64
+import fnmatch
+import functools
+import json
 import os
+import shlex
 import shutil
 import subprocess
-from typing import Dict, Union, Optional, List
+import tempfile
+from collections import deque
+from typing import Any, Deque, Dict, Optional, List
 from langchain_core.tools import tool
 from rich.console import Console
 from rich.panel import Panel
 from rich.markdown import Markdown
 from sparc_cli.proc.interactive import run_interactive_command
+from sparc_cli.search_index import get_search_index
 from sparc_cli.text.processing import truncate_output
+from sparc_cli.tools.memory import _global_memory
 
 console = Console()
 
@@ -79,6 +88,201 @@ DEFAULT_EXCLUDE_DIRS = [
     '.vscode'
 ]
 
+# Search engines of ripgrep_search: plain rg over the tree, or rg over the
+# files the trigram index says may match
+SEARCH_ENGINES = ('rg', 'index')
+
+# With more candidate files than this, the index engine searches the whole tree
+MAX_INDEX_CANDIDATES = 5000
+# ...and likewise when their paths take more than this many bytes of command
+# line: the terminal wrapper passes the whole command as one argument, which
+# Linux caps at 128 KiB (MAX_ARG_STRLEN)
+MAX_INDEX_ARG_BYTES = 64 * 1024
+
+# Structured searches stop once this many matching lines were found...
+DEFAULT_MAX_RESULTS = 200
+# ...or once the matched and context text reaches this many bytes
+DEFAULT_MAX_BYTES = 64 * 1024
+# Longer lines are cut in structured results (minified files, data blobs)
+MAX_LINE_CHARS = 500
+
+
+def _rg_text(data: Dict[str, Any]) -> str:
+    """Text of an rg --json 'text' or 'bytes' field (the latter for invalid UTF-8)."""
+    if 'text' in data:
+        return data['text']
+    return base64.b64decode(data.get('bytes', '')).decode('utf-8', errors='replace')
+
+
+def _line_text(data: Dict[str, Any]) -> str:
+    text = _rg_text(data['lines']).rstrip('\r\n')
+    if len(text) > MAX_LINE_CHARS:
+        text = text[:MAX_LINE_CHARS] + ' ...'
+    return text
+
+
+class _JsonSearch:
+    """Collects rg --json messages into match records within a result and byte budget."""
+
+    def __init__(self, max_results: int, max_bytes: int, context_lines: int):
+        self.max_results = max_results
+        self.max_bytes = max_bytes
+        self.context_lines = context_lines
+        self.matches: List[Dict[str, Any]] = []
+        self.file_counts: Dict[str, int] = {}
+        self.bytes = 0
+        self.truncated = False  # Stopped at the budget with more matches left
+        self._before: Deque[Dict[str, Any]] = deque(maxlen=context_lines or None)
+
+    @property
+    def full(self) -> bool:
+        return len(self.matches) >= self.max_results or self.bytes >= self.max_bytes
+
+    def add(self, message: Dict[str, Any]) -> None:
+        kind = message.get('type')
+        data = message.get('data', {})
+        if kind == 'begin':
+            self._before.clear()
+        elif kind == 'context' and self.context_lines:
+            line = {'line': data.get('line_number'), 'text': _line_text(data)}
+            last = self.matches[-1] if self.matches else None
+            if (last is not None and last['path'] == _rg_text(data['path'])
+                    and line['line'] - last['line'] <= self.context_lines):
+                last['after'].append(line)
+                self.bytes += len(line['text'])
+            self._before.append(line)
+        elif kind == 'match':
+            path = _rg_text(data['path'])
+            line_number = data.get('line_number')
+            submatches = data.get('submatches') or [{}]
+            record = {
+                'path': path,
+                'line': line_number,
+                'column': submatches[0].get('start', 0) + 1,
+                'text': _line_text(data),
+                'before': [line for line in self._before if line_number - line['line'] <= self.context_lines],
+                'after': []
+            }
+            self._before.clear()
+            self.matches.append(record)
+            self.file_counts[path] = self.file_counts.get(path, 0) + 1
+            self.bytes += len(path) + len(record['text']) + sum(len(line['text']) for line in record['before'])
+
+
+def run_json_search(
+    cmd: List[str],
+    max_results: int = DEFAULT_MAX_RESULTS,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    context_lines: int = 0
+) -> Dict[str, Any]:
+    """Run an rg --json command, parsing its output as it streams.
+
+    rg is stopped as soon as the result or byte budget is used up, so a
+    search with millions of matches costs no more than one with a few
+    hundred. No terminal is involved.
+
+    Args:
+        cmd: Full rg command line, including --json
+        max_results: Stop after this many matching lines
+        max_bytes: Stop once matched and context text reaches this many bytes
+        context_lines: Context lines requested from rg with -C
+
+    Returns:
+        Dict with matches (path, line, column, text, before and after context
+        lines), file_counts (matching lines per file among the matches),
+        truncated (whether rg was stopped with more matches left),
+        return_code and error (rg's stderr)
+    """
+    search = _JsonSearch(max_results, max_bytes, context_lines)
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, stdin=subprocess.DEVNULL)
+        try:
+            for raw in process.stdout:
+                try:
+                    message = json.loads(raw)
+                except ValueError:
+                    continue
+                if search.full and message.get('type') in ('begin', 'match'):
+                    # Budget used up and rg found more; stop it rather than read the rest
+                    search.truncated = True
+                    break
+                search.add(message)
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            return_code = process.wait()
+        stderr.seek(0)
+        error = stderr.read().decode('utf-8', errors='replace').strip()
+
+    if search.truncated:
+        return_code = 0
+    return {
+        'matches': search.matches,
+        'file_counts': search.file_counts,
+        'truncated': search.truncated,
+        'return_code': return_code,
+        'error': error
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def _type_globs(rg_path: str, file_type: str) -> Optional[List[str]]:
+    """File name globs of an rg file type, or None if rg does not know it."""
+    try:
+        output = subprocess.run([rg_path, '--type-list'], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    for line in output.splitlines():
+        name, _, globs = line.partition(':')
+        if name.strip() == file_type:
+            return [glob.strip() for glob in globs.split(',') if glob.strip()]
+    return None
+
+
+def _index_candidates(
+    rg_path: str,
+    pattern: str,
+    *,
+    case_sensitive: bool,
+    include_hidden: bool,
+    file_type: Optional[str],
+    exclusions: List[str]
+) -> Optional[List[str]]:
+    """Files the trigram index says may match, filtered the way rg filters a tree search.
+
+    Returns:
+        Paths to search, or None to search the whole tree (too many candidates,
+        or too long a command line)
+    """
+    index = get_search_index()
+    index.update()
+    paths = index.candidates(pattern, ignore_case=not case_sensitive)
+    if paths is None or len(paths) > MAX_INDEX_CANDIDATES:
+        return None
+    globs = _type_globs(rg_path, file_type) if file_type else None
+    if file_type and globs is None:
+        return None  # Let rg report the unknown type
+
+    # rg searches files named on its command line even if its filters would skip them
+    selected = []
+    for path in paths:
+        parts = path.split('/')
+        if not include_hidden and any(part.startswith('.') for part in parts):
+            continue
+        if any(fnmatch.fnmatch(part, exclusion) for part in parts for exclusion in exclusions):
+            continue
+        if globs is not None and not any(fnmatch.fnmatch(parts[-1], glob) for glob in globs):
+            continue
+        selected.append(os.path.join('.', path) if path.startswith('-') else path)
+
+    # Shell-quoted, as the terminal wrapper passes them
+    arg_bytes = sum(len(shlex.quote(path).encode('utf-8', 'surrogateescape')) + 1 for path in selected)
+    if arg_bytes > MAX_INDEX_ARG_BYTES:
+        return None
+    return selected
+
+
 @tool
 def ripgrep_search(
     pattern: str,
@@ -87,10 +291,17 @@ def ripgrep_search(
     case_sensitive: bool = True,
     include_hidden: bool = False,
     follow_links: bool = False,
-    exclude_dirs: List[str] = None
-) -> Dict[str, Union[str, int, bool]]:
+    exclude_dirs: List[str] = None,
+    structured: bool = False,
+    max_results: int = DEFAULT_MAX_RESULTS,
+    context_lines: int = 0,
+    engine: Optional[str] = None
+) -> Dict[str, Any]:
     """Execute a ripgrep (rg) search with formatting and common options.
 
+    Use structured=True for broad searches: matches come back as records and
+    the search stops at max_results instead of returning everything.
+
     Args:
         pattern: Search pattern to find
         file_type: Optional file type to filter results (e.g. 'py' for Python files)
@@ -98,16 +309,32 @@ def ripgrep_search(
         include_hidden: Whether to search hidden files and directories (default: False)
         follow_links: Whether to follow symbolic links (default: False)
         exclude_dirs: Additional directories to exclude (combines with defaults)
+        structured: Return match records instead of rg's text output (default: False)
+        max_results: Structured mode stops after this many matching lines (default: 200)
+        context_lines: Lines of context to show around each match (default: 0)
+        engine: 'rg' to scan every file, or 'index' to scan only the files a
+            trigram index says may match (default: the run's --search-engine, else 'rg')
 
     Returns:
         Dict containing:
-            - output: The formatted search results
+            - output: The formatted search results (text mode)
+            - matches: Records with path, line, column, text and before/after context (structured mode)
+            - file_counts: Matching lines per file (structured mode)
+            - truncated: Whether the search stopped at max_results with more left (structured mode)
             - return_code: Process return code (0 means success)
             - success: Boolean indicating if search succeeded
     """
+    engine = engine or _global_memory.get('config', {}).get('search_engine', 'rg')
+    if engine not in SEARCH_ENGINES:
+        return {
+            "output": f"Unknown search engine '{engine}'; use one of: {', '.join(SEARCH_ENGINES)}",
+            "return_code": 2,
+            "success": False
+        }
+
     # Build rg command with options
     rg_path = get_rg_command()
-    cmd = [rg_path, '--color', 'always']
+    cmd = [rg_path, '--json'] if structured else [rg_path, '--color', 'always']
     
     if not case_sensitive:
         cmd.append('-i')
@@ -121,6 +348,9 @@ def ripgrep_search(
     if file_type:
         cmd.extend(['-t', file_type])
 
+    if context_lines:
+        cmd.extend(['-C', str(context_lines)])
+
     # Add exclusions
     exclusions = DEFAULT_EXCLUDE_DIRS + (exclude_dirs or [])
     for dir in exclusions:
@@ -152,6 +382,39 @@ def ripgrep_search(
     # Execute command
     console.print(Panel(Markdown(f"Searching for: **{pattern}**"), title="🔎 Ripgrep Search", border_style="bright_blue"))
     try:
+        if engine == 'index':
+            paths = _index_candidates(
+                rg_path, pattern,
+                case_sensitive=case_sensitive,
+                include_hidden=include_hidden,
+                file_type=file_type,
+                exclusions=exclusions
+            )
+            if paths == []:
+                # No file can match; answer like rg would without running it
+                if structured:
+                    return {"matches": [], "file_counts": {}, "truncated": False, "output": "0 matching lines in 0 files",
+                            "return_code": 1, "success": False}
+                return {"output": "", "return_code": 1, "success": False}
+            if paths is not None:
+                cmd.extend(paths)
+
+        if structured:
+            # rg --json is read straight from a pipe; no terminal wrapper or ANSI stripping
+            result = run_json_search(cmd, max_results=max_results, context_lines=context_lines)
+            summary = f"{len(result['matches'])} matching lines in {len(result['file_counts'])} files"
+            if result['truncated']:
+                summary += " (stopped at the result limit; more matches exist)"
+            console.print(Panel(Markdown(result['error'] or summary), title="🔎 Ripgrep Results", border_style="bright_blue"))
+            return {
+                "matches": result['matches'],
+                "file_counts": result['file_counts'],
+                "truncated": result['truncated'],
+                "output": result['error'] or summary,
+                "return_code": result['return_code'],
+                "success": result['return_code'] == 0
+            }
+
         print()
         output, return_code = run_interactive_command(cmd)
         print()
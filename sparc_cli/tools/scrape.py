@@ -1,7 +1,6 @@
 import asyncio
 import httpx
 import logging
-import time
 from langchain_core.tools import tool
 from bs4 import BeautifulSoup, Comment
 from dataclasses import dataclass
@@ -10,6 +9,8 @@ from urllib.parse import urlparse
 import pypandoc
 from playwright.sync_api import sync_playwright
 
+from sparc_cli.retry import RetryPolicy, is_transient_error
+
 logger = logging.getLogger(__name__)
 
 DEFAULT_HEADERS = {
@@ -42,13 +43,23 @@ class RateLimitConfig:
     refill_rate: float = 1.0
 
 class RetryStrategy:
+    """Retry behavior for scraping, backed by the shared RetryPolicy."""
+
     def __init__(self, config: RetryConfig):
         self.config = config
+        self.policy = RetryPolicy(
+            max_retries=config.max_retries,
+            base_delay=config.base_delay,
+            max_delay=config.max_delay,
+            jitter=config.jitter,
+            is_retryable=lambda error: isinstance(error, TransientError)
+        )
     
     def should_retry(self, attempt: int, error: Exception) -> bool:
-        if attempt >= self.config.max_retries:
-            return False
-        return isinstance(error, TransientError)
+        return self.policy.should_retry(attempt, error)
+
+    def delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        return self.policy.delay(attempt, error)
 
 class RateLimiter:
     def __init__(self, config: RateLimitConfig):
@@ -144,6 +155,9 @@ def scrape_url_tool(
                 response.raise_for_status()
                 return response.text
             except httpx.HTTPError as e:
+                if is_transient_error(e):
+                    # Timeouts, rate limits and server errors; retried honoring Retry-After
+                    raise TransientError(f"HTTP error: {str(e)}") from e
                 raise NetworkError(f"HTTP error: {str(e)}")
 
     def scrape_with_playwright() -> str:
@@ -160,54 +174,34 @@ def scrape_url_tool(
                 context.close()
                 browser.close()
 
-    attempt = 0
-    last_error = None
-    
-    while True:
-        try:
-            metrics["attempts"] += 1
-            
-            # Get raw HTML content
-            if use_playwright:
-                html_content = scrape_with_playwright()
-            else:
-                html_content = asyncio.run(scrape_with_httpx())
-            
-            # Clean the HTML
-            cleaned_html = clean_html_only(html_content)
-            
-            # Convert to markdown if requested
-            if output_format == 'markdown':
-                try:
-                    content = pypandoc.convert_text(
-                        cleaned_html,
-                        'markdown',
-                        format='html'
-                    )
-                except Exception as e:
-                    logger.warning(f"Pandoc conversion failed: {e}")
-                    content = cleaned_html
-            else:
-                content = cleaned_html
+    def fetch() -> str:
+        metrics["attempts"] += 1
+        if use_playwright:
+            return scrape_with_playwright()
+        return asyncio.run(scrape_with_httpx())
 
-            return {
-                "content": content,
-                "success": True,
-                "metrics": metrics
-            }
+    # Get raw HTML content; the circuit breaker is shared per host
+    html_content = strategy.policy.call(fetch, name=f"scrape:{parsed.netloc}")
 
+    # Clean the HTML
+    cleaned_html = clean_html_only(html_content)
+
+    # Convert to markdown if requested
+    if output_format == 'markdown':
+        try:
+            content = pypandoc.convert_text(
+                cleaned_html,
+                'markdown',
+                format='html'
+            )
         except Exception as e:
-            last_error = e
-            if not strategy.should_retry(attempt, e):
-                break
-            attempt += 1
-            time.sleep(retry_config.base_delay * (2 ** attempt))
-    
-    if last_error:
-        raise last_error
-    
+            logger.warning(f"Pandoc conversion failed: {e}")
+            content = cleaned_html
+    else:
+        content = cleaned_html
+
     return {
-        "content": "",
-        "success": False,
+        "content": content,
+        "success": True,
         "metrics": metrics
     }
@@ -0,0 +1,430 @@
+"""Trace where the time of a sparc run goes.
+
+Spans record the wall time of stages, agent runs, model calls, tool calls and
+LLM client setup, with attributes such as tokens in and out, payload sizes
+and retries. Tracing is off until configure_tracing() is called; finished
+spans are then kept for the end-of-run summary and handed to each exporter,
+e.g. a JSONL file or OpenTelemetry.
+
+Stages and agent runs open spans with trace_span(). Model and tool calls are
+traced by a callback handler that agent runs add to their config with
+traced_config(), so every tool an agent calls is covered without changes to
+the tool itself.
+"""
+
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler, BaseCallbackManager
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+SpanKind = str  # 'stage', 'agent', 'llm', 'tool' or 'llm_init'
+
+# Numeric attributes added up across spans and into the summary
+SUMMED_ATTRIBUTES = ('tokens_in', 'tokens_out', 'request_bytes', 'response_bytes', 'retries')
+# Attributes a span also counts for its descendants (model tokens roll up)
+ROLLED_UP_ATTRIBUTES = ('tokens_in', 'tokens_out')
+
+
+@dataclass
+class Span:
+    """A timed unit of work.
+
+    start is a Unix timestamp; duration is None until the span ends.
+    """
+    name: str
+    kind: SpanKind
+    trace_id: str
+    span_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    parent: Optional['Span'] = field(default=None, repr=False)
+    start: float = field(default_factory=time.time)
+    duration: Optional[float] = None
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    _started: float = field(default_factory=time.perf_counter, init=False, repr=False)
+
+    def add(self, key: str, amount: float = 1) -> None:
+        """Add to a numeric attribute, starting from 0."""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable form of the span."""
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent.span_id if self.parent is not None else None,
+            'name': self.name,
+            'kind': self.kind,
+            'start': self.start,
+            'duration': self.duration,
+            'error': self.error,
+            'attributes': self.attributes
+        }
+
+
+class SpanExporter:
+    """Receives spans as they start and end. Subclasses override what they need."""
+
+    def on_start(self, span: Span) -> None:
+        pass
+
+    def export(self, span: Span) -> None:
+        """Handle a span that has ended."""
+
+    def shutdown(self) -> None:
+        pass
+
+
+class JsonlSpanExporter(SpanExporter):
+    """Append each finished span to a file as one line of JSON. Thread-safe."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class OpenTelemetrySpanExporter(SpanExporter):
+    """Mirror spans to OpenTelemetry.
+
+    Spans go to the tracer of the global OpenTelemetry tracer provider, so
+    they are exported wherever that provider sends them, e.g. run sparc under
+    `opentelemetry-instrument` with the OTEL_* environment variables set.
+    Without a configured provider, OpenTelemetry drops them.
+
+    Raises:
+        ImportError: If opentelemetry-api is not installed
+    """
+
+    def __init__(self, tracer: Optional[Any] = None):
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError("OpenTelemetry export requires opentelemetry-api: pip install opentelemetry-api") from e
+        self._trace = trace
+        self._tracer = tracer or trace.get_tracer('sparc_cli')
+        # span ID -> open OpenTelemetry span
+        self._open: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span) -> None:
+        context = None
+        with self._lock:
+            parent = self._open.get(span.parent.span_id) if span.parent is not None else None
+        if parent is not None:
+            context = self._trace.set_span_in_context(parent)
+        otel_span = self._tracer.start_span(
+            span.name,
+            context=context,
+            start_time=int(span.start * 1e9),
+            attributes={'sparc.kind': span.kind}
+        )
+        with self._lock:
+            self._open[span.span_id] = otel_span
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            otel_span = self._open.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            if isinstance(value, (str, bool, int, float)):
+                otel_span.set_attribute(f"sparc.{key}", value)
+        if span.error is not None:
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        otel_span.end(end_time=int((span.start + (span.duration or 0)) * 1e9))
+
+
+def _payload_size(content: Any) -> int:
+    """Size in bytes of message content as text."""
+    if not isinstance(content, str):
+        content = json.dumps(content, default=str)
+    return len(content.encode('utf-8'))
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """LangChain callback handler that records model and tool calls as spans.
+
+    A call's parent is the span of its parent run when that is traced (e.g. a
+    model called by a tool), otherwise the current span (the agent run).
+    Token usage of a model call is added to all of its ancestors.
+    """
+
+    run_inline = True
+
+    def __init__(self, tracer: 'Tracer'):
+        self.tracer = tracer
+        self._runs: Dict[UUID, Span] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, kind: SpanKind,
+               **attributes: Any) -> None:
+        with self._lock:
+            parent = self._runs.get(parent_run_id) if parent_run_id is not None else None
+        span = self.tracer.start_span(name, kind, parent=parent or current_span(), **attributes)
+        with self._lock:
+            self._runs[run_id] = span
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> Optional[Span]:
+        with self._lock:
+            span = self._runs.pop(run_id, None)
+        if span is not None:
+            self.tracer.end_span(span, error)
+        return span
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID,
+                            parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        self._start(
+            run_id, parent_run_id, _model_name(serialized, kwargs), 'llm',
+            request_bytes=sum(_payload_size(message.content) for batch in messages for message in batch)
+        )
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID,
+                     parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        self._start(
+            run_id, parent_run_id, _model_name(serialized, kwargs), 'llm',
+            request_bytes=sum(_payload_size(prompt) for prompt in prompts)
+        )
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            span = self._runs.get(run_id)
+        if span is None:
+            return
+        tokens_in, tokens_out = _token_usage(response)
+        response_bytes = 0
+        for generations in response.generations:
+            for generation in generations:
+                response_bytes += _payload_size(generation.text)
+                if isinstance(generation, ChatGeneration) and getattr(generation.message, 'tool_calls', None):
+                    response_bytes += _payload_size(generation.message.tool_calls)
+        span.attributes['response_bytes'] = response_bytes
+        if tokens_in or tokens_out:
+            self.tracer.roll_up(span, tokens_in=tokens_in, tokens_out=tokens_out)
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID,
+                      parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        name = (serialized or {}).get('name') or kwargs.get('name') or 'tool'
+        self._start(run_id, parent_run_id, name, 'tool', request_bytes=_payload_size(input_str))
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            span = self._runs.get(run_id)
+        if span is not None:
+            span.attributes['response_bytes'] = _payload_size(getattr(output, 'content', output))
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+
+def _model_name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any]) -> str:
+    metadata = kwargs.get('metadata') or {}
+    params = kwargs.get('invocation_params') or {}
+    return (metadata.get('ls_model_name') or params.get('model') or params.get('model_name')
+            or (serialized or {}).get('name') or 'llm')
+
+
+def _token_usage(response: LLMResult) -> Tuple[int, int]:
+    """Input and output tokens reported for a model call, or zeros."""
+    tokens_in = tokens_out = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+            if usage:
+                tokens_in += usage.get('input_tokens', 0)
+                tokens_out += usage.get('output_tokens', 0)
+    if not (tokens_in or tokens_out):
+        usage = (response.llm_output or {}).get('token_usage') or (response.llm_output or {}).get('usage') or {}
+        tokens_in = usage.get('prompt_tokens', usage.get('input_tokens', 0)) or 0
+        tokens_out = usage.get('completion_tokens', usage.get('output_tokens', 0)) or 0
+    return tokens_in, tokens_out
+
+
+class Tracer:
+    """Collect spans and pass them to exporters. Thread-safe."""
+
+    def __init__(self, exporters: Iterable[SpanExporter] = ()):
+        self.trace_id = uuid.uuid4().hex
+        self.exporters = list(exporters)
+        self.spans: List[Span] = []
+        self.callback_handler = TracingCallbackHandler(self)
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, kind: SpanKind, parent: Optional[Span] = None, **attributes: Any) -> Span:
+        span = Span(name=name, kind=kind, trace_id=self.trace_id, parent=parent, attributes=attributes)
+        for exporter in self.exporters:
+            exporter.on_start(span)
+        return span
+
+    def roll_up(self, span: Span, **amounts: float) -> None:
+        """Add to numeric attributes of a span and all of its ancestors.
+
+        Ancestors are shared by spans of concurrent agents, so the additions
+        are made under the tracer lock.
+        """
+        with self._lock:
+            node: Optional[Span] = span
+            while node is not None:
+                for key, amount in amounts.items():
+                    node.add(key, amount)
+                node = node.parent
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None) -> None:
+        span.duration = time.perf_counter() - span._started
+        if error is not None:
+            span.error = f"{error.__class__.__name__}: {error}"
+        with self._lock:
+            self.spans.append(span)
+        for exporter in self.exporters:
+            exporter.export(span)
+
+    def shutdown(self) -> None:
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+_tracer: Optional[Tracer] = None
+_current_span: ContextVar[Optional[Span]] = ContextVar('sparc_current_span', default=None)
+
+
+def configure_tracing(exporters: Iterable[SpanExporter] = ()) -> Tracer:
+    """Turn tracing on for the rest of the process, replacing any previous tracer.
+
+    Spans are always kept for summarize_spans(); exporters get them as well.
+    """
+    global _tracer
+    shutdown_tracing()
+    _tracer = Tracer(exporters)
+    return _tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    """The active tracer, or None if tracing is off."""
+    return _tracer
+
+
+def shutdown_tracing() -> List[Span]:
+    """Turn tracing off and shut down the exporters.
+
+    Returns:
+        The spans recorded by the tracer that was active
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return []
+    tracer.shutdown()
+    return list(tracer.spans)
+
+
+def current_span() -> Optional[Span]:
+    """The innermost span opened by trace_span() in this context."""
+    return _current_span.get()
+
+
+@contextmanager
+def trace_span(name: str, kind: SpanKind, **attributes: Any) -> Iterator[Span]:
+    """Trace a block of work as a child of the current span.
+
+    The yielded span's attributes may be updated inside the block. When
+    tracing is off, a span is still yielded but not recorded.
+
+    Example:
+        with trace_span('research', 'stage') as span:
+            run_research_agent(query, model)
+            span.add('retries')
+    """
+    tracer = _tracer
+    parent = _current_span.get()
+    if tracer is None:
+        yield Span(name=name, kind=kind, trace_id='', parent=parent, attributes=attributes)
+        return
+    span = tracer.start_span(name, kind, parent=parent, **attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        _current_span.reset(token)
+        tracer.end_span(span, e)
+        raise
+    _current_span.reset(token)
+    tracer.end_span(span)
+
+
+def traced_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of a runnable config that traces model and tool calls, if tracing is on."""
+    tracer = _tracer
+    if tracer is None:
+        return config
+    handler = tracer.callback_handler
+    callbacks = config.get('callbacks')
+    if isinstance(callbacks, BaseCallbackManager):
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=True)
+    else:
+        callbacks = [*(callbacks or []), handler]
+    return {**config, 'callbacks': callbacks}
+
+
+def _has_ancestor_like(span: Span) -> bool:
+    """Whether the span is nested in a span of the same kind and name."""
+    node = span.parent
+    while node is not None:
+        if node.kind == span.kind and node.name == span.name:
+            return True
+        node = node.parent
+    return False
+
+
+def summarize_spans(spans: Sequence[Span]) -> List[Dict[str, Any]]:
+    """Aggregate spans by kind and name, slowest total first.
+
+    Returns:
+        One dict per (kind, name) with count, errors, total, avg and max
+        (seconds), and the sums of SUMMED_ATTRIBUTES. ROLLED_UP_ATTRIBUTES
+        already include nested spans, so a span nested in one of the same
+        kind and name (an agent started by an agent's tool) does not add
+        them again.
+    """
+    rows: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for span in spans:
+        row = rows.get((span.kind, span.name))
+        if row is None:
+            row = rows[(span.kind, span.name)] = {
+                'kind': span.kind, 'name': span.name, 'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0,
+                **{key: 0 for key in SUMMED_ATTRIBUTES}
+            }
+        duration = span.duration or 0.0
+        row['count'] += 1
+        row['errors'] += span.error is not None
+        row['total'] += duration
+        row['max'] = max(row['max'], duration)
+        nested = _has_ancestor_like(span)
+        for key in SUMMED_ATTRIBUTES:
+            if not (nested and key in ROLLED_UP_ATTRIBUTES):
+                row[key] += span.attributes.get(key, 0)
+    for row in rows.values():
+        row['avg'] = row['total'] / row['count']
+    return sorted(rows.values(), key=lambda row: row['total'], reverse=True)
@@ -0,0 +1,224 @@
+import asyncio
+import contextvars
+import threading
+from unittest.mock import patch
+
+import httpx
+
+import pytest
+from anthropic import BadRequestError, RateLimitError
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+import sparc_cli.agent_utils as agent_utils
+from sparc_cli.agent_utils import get_agent, clear_agent_cache
+from sparc_cli.retry import RetryPolicy, get_retry_stats, reset_circuit_breakers, reset_retry_stats
+from sparc_cli.tool_configs import get_research_tools, get_planning_tools
+from sparc_cli.tools.memory import _global_memory
+
+
+class FakeChatModel(GenericFakeChatModel):
+    """Fake chat model that accepts tool binding."""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def fake_model(*replies):
+    return FakeChatModel(messages=iter([AIMessage(content=reply) for reply in replies]))
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_agent_cache()
+    reset_circuit_breakers()
+    reset_retry_stats()
+    config = _global_memory.get('config')
+    yield
+    clear_agent_cache()
+    if config is None:
+        _global_memory.pop('config', None)
+    else:
+        _global_memory['config'] = config
+
+
+def test_get_agent_reuses_compiled_graph():
+    """Test agents for the same model and tools compile once."""
+    model = fake_model("done")
+    tools = get_research_tools()
+    with patch.object(agent_utils, 'create_react_agent', wraps=agent_utils.create_react_agent) as create:
+        first = get_agent(model, tools, checkpointer=MemorySaver())
+        second = get_agent(model, get_research_tools(), checkpointer=MemorySaver())
+        assert create.call_count == 1
+        assert first is not second
+        assert first.checkpointer is not second.checkpointer
+
+        get_agent(model, get_planning_tools(), checkpointer=MemorySaver())
+        assert create.call_count == 2
+
+        _global_memory['config'] = {'provider': 'openai'}
+        get_agent(model, tools, checkpointer=MemorySaver())
+        assert create.call_count == 3
+
+
+def test_get_agent_binds_checkpointer():
+    """Test cached agents keep per-thread state in their own checkpointer."""
+    agent = get_agent(fake_model("one", "two"), get_research_tools(), checkpointer=MemorySaver())
+    config = {"configurable": {"thread_id": "t1"}}
+    agent.invoke({"messages": [HumanMessage("first")]}, config)
+    agent.invoke({"messages": [HumanMessage("second")]}, config)
+    assert len(agent.get_state(config).values['messages']) == 4
+
+
+def test_get_agent_cache_is_bounded(monkeypatch):
+    """Test the least recently used graph is evicted past the cache size."""
+    monkeypatch.setattr(agent_utils, 'AGENT_CACHE_SIZE', 2)
+    tools = get_research_tools()
+    for index in range(3):
+        _global_memory['config'] = {'run': index}
+        get_agent(fake_model("done"), tools)
+    assert len(agent_utils._agent_cache) == 2
+
+
+def test_arun_agent_with_retry_streams_async():
+    """Test the async runner drives agent.astream and tracks depth."""
+    agent = get_agent(fake_model("done"), get_research_tools(), checkpointer=MemorySaver())
+    depth = _global_memory.get('agent_depth', 0)
+    config = {"configurable": {"thread_id": "async"}}
+
+    result = asyncio.run(agent_utils.arun_agent_with_retry(agent, "hello", config))
+
+    assert result == "Agent run completed successfully"
+    assert _global_memory.get('agent_depth', 0) == depth
+    assert len(agent.get_state(config).values['messages']) == 2
+
+
+def test_arun_agent_with_retry_records_calls():
+    """Test agent runs count as calls in the retry stats of their provider."""
+    _global_memory['config'] = {'provider': 'anthropic'}
+
+    class Quick:
+        async def astream(self, *args, **kwargs):
+            return
+            yield
+
+    for _ in range(2):
+        asyncio.run(agent_utils.arun_agent_with_retry(Quick(), "hello", {}))
+
+    stats = get_retry_stats()['anthropic']
+    assert (stats['calls'], stats['successes']) == (2, 2)
+
+
+def test_arun_agent_with_retry_is_cancellable(monkeypatch):
+    """Test cancelling the task stops the agent during backoff."""
+    monkeypatch.setattr(agent_utils, 'AGENT_RETRY_POLICY', RetryPolicy(max_retries=3, base_delay=1.0, jitter=0))
+    class Failing:
+        calls = 0
+
+        async def astream(self, *args, **kwargs):
+            Failing.calls += 1
+            raise RateLimitError("slow down", response=httpx.Response(429, request=httpx.Request("POST", "http://x")), body=None)
+            yield
+
+    async def main():
+        task = asyncio.create_task(agent_utils.arun_agent_with_retry(Failing(), "hello", {}))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    depth = _global_memory.get('agent_depth', 0)
+    asyncio.run(main())
+    assert Failing.calls == 1
+    assert _global_memory.get('agent_depth', 0) == depth
+
+
+def test_run_agent_with_retry_cancel_raises_keyboard_interrupt():
+    """Test the sync wrapper turns cancellation of its agent into KeyboardInterrupt."""
+    started = threading.Event()
+
+    class Slow:
+        async def astream(self, *args, **kwargs):
+            started.set()
+            await asyncio.sleep(10)
+            yield
+
+    errors = []
+
+    def run():
+        try:
+            agent_utils.run_agent_with_retry(Slow(), "hello", {})
+        except KeyboardInterrupt as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert started.wait(5)
+    assert agent_utils.cancel_innermost_agent()
+    thread.join(5)
+    assert len(errors) == 1
+    assert not agent_utils.cancel_innermost_agent()
+
+
+def test_cancel_innermost_agent_cancels_its_group():
+    """Test one cancellation stops every run of a cancel group, started or not."""
+    started = threading.Semaphore(0)
+
+    class Slow:
+        async def astream(self, *args, **kwargs):
+            started.release()
+            await asyncio.sleep(10)
+            yield
+
+    errors = []
+
+    def run():
+        try:
+            agent_utils.run_agent_with_retry(Slow(), "hello", {})
+        except KeyboardInterrupt as e:
+            errors.append(e)
+
+    with agent_utils.agent_cancel_group() as group:
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(run,)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for _ in threads:
+            assert started.acquire(timeout=5)
+        assert agent_utils.cancel_innermost_agent()
+        for thread in threads:
+            thread.join(5)
+        assert group.cancelled
+        assert len(errors) == 3
+
+        # Runs of a cancelled group stop before they start
+        run()
+        assert len(errors) == 4
+        assert not started.acquire(blocking=False)
+
+    assert not agent_utils.cancel_innermost_agent()
+
+
+def test_run_agent_with_retry_inside_event_loop():
+    """Test the sync wrapper works when called from a running event loop."""
+    agent = get_agent(fake_model("done"), get_research_tools(), checkpointer=MemorySaver())
+
+    async def main():
+        return agent_utils.run_agent_with_retry(agent, "hello", {"configurable": {"thread_id": "nested"}})
+
+    assert asyncio.run(main()) == "Agent run completed successfully"
+
+
+def test_arun_agent_with_retry_raises_non_transient_errors():
+    """Test errors that cannot succeed on retry are raised on the first attempt."""
+    class BadRequest:
+        calls = 0
+
+        async def astream(self, *args, **kwargs):
+            BadRequest.calls += 1
+            raise BadRequestError("invalid model", response=httpx.Response(400, request=httpx.Request("POST", "http://x")), body=None)
+            yield
+
+    with pytest.raises(BadRequestError):
+        asyncio.run(agent_utils.arun_agent_with_retry(BadRequest(), "hello", {}))
+    assert BadRequest.calls == 1
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+import sparc_cli.agent_utils as agent_utils
+from sparc_cli.agent_utils import clear_agent_cache, get_agent
+from sparc_cli.checkpoint import SqliteCheckpointer
+from sparc_cli.tool_configs import get_research_tools
+
+
+class FakeChatModel(GenericFakeChatModel):
+    """Fake chat model that accepts tool binding."""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def fake_model(*replies):
+    return FakeChatModel(messages=iter([AIMessage(content=reply) for reply in replies]))
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_agent_cache()
+    yield
+    clear_agent_cache()
+
+
+@pytest.fixture
+def checkpointer(tmp_path):
+    saver = SqliteCheckpointer(str(tmp_path / "checkpoints.db"), keep_last=3)
+    yield saver
+    saver.close()
+
+
+def test_thread_state_survives_reopen(tmp_path):
+    """Test agent conversations are restored from the database file."""
+    path = str(tmp_path / "checkpoints.db")
+    config = {"configurable": {"thread_id": "chat"}}
+    saver = SqliteCheckpointer(path)
+    agent = get_agent(fake_model("one", "two"), get_research_tools(), checkpointer=saver)
+    agent.invoke({"messages": [HumanMessage("first")]}, config)
+    agent.invoke({"messages": [HumanMessage("second")]}, config)
+    saver.close()
+
+    reopened = SqliteCheckpointer(path)
+    agent = get_agent(fake_model("three"), get_research_tools(), checkpointer=reopened)
+    messages = agent.get_state(config).values['messages']
+    assert [message.content for message in messages] == ["first", "one", "second", "two"]
+    reopened.close()
+
+
+def test_keeps_last_checkpoints_per_thread(checkpointer):
+    """Test older checkpoints are pruned while the latest state stays complete."""
+    config = {"configurable": {"thread_id": "chat"}}
+    agent = get_agent(fake_model(*"abcde"), get_research_tools(), checkpointer=checkpointer)
+    for turn in range(5):
+        agent.invoke({"messages": [HumanMessage(f"turn {turn}")]}, config)
+
+    history = list(checkpointer.list(config))
+    assert len(history) == 3
+    assert len(agent.get_state(config).values['messages']) == 10
+    assert list(checkpointer.list(config, limit=1))[0].config == checkpointer.get_tuple(config).config
+
+
+def test_async_stream_and_delete_thread(checkpointer):
+    """Test the async interface used by astream and thread deletion."""
+    config = {"configurable": {"thread_id": "async"}}
+    agent = get_agent(fake_model("done"), get_research_tools(), checkpointer=checkpointer)
+
+    async def run():
+        async for _ in agent.astream({"messages": [HumanMessage("hi")]}, config):
+            pass
+
+    asyncio.run(run())
+    assert checkpointer.thread_ids() == ["async"]
+    checkpointer.delete_thread("async")
+    assert checkpointer.thread_ids() == []
+    assert checkpointer.get_tuple(config) is None
+
+
+def test_runners_drop_threads_they_create(checkpointer):
+    """Test sub-agent threads are deleted when their run finishes."""
+    agent_utils.run_research_agent("look around", fake_model("done"), research_only=True, memory=checkpointer)
+    assert checkpointer.thread_ids() == []
+
+    agent_utils.run_research_agent("look around", fake_model("done"), research_only=True,
+                                   memory=checkpointer, thread_id="kept")
+    assert checkpointer.thread_ids() == ["kept"]
+
+
+def test_runners_ignore_caller_thread(checkpointer):
+    """Test a sub-agent never runs on the thread in the caller's config, such as the chat's."""
+    agent_utils.run_research_agent("look around", fake_model("done"), research_only=True, memory=checkpointer,
+                                   config={'configurable': {'thread_id': 'chat'}, 'recursion_limit': 50})
+    assert checkpointer.thread_ids() == []
+
+
+def test_keep_last_must_be_positive(tmp_path):
+    with pytest.raises(ValueError):
+        SqliteCheckpointer(str(tmp_path / "c.db"), keep_last=0)
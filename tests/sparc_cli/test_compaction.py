@@ -0,0 +1,164 @@
+import pytest
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+
+from sparc_cli.compaction import CompactablePrompt, ToolHistoryCompactor
+from sparc_cli.agent_utils import clear_agent_cache, get_agent
+from sparc_cli.tools.history import recall_tool_output
+from sparc_cli.text.tokens import count_tokens, set_tokenizer
+from sparc_cli.tools.memory import (
+    _global_memory,
+    emit_key_facts,
+    emit_key_snippets,
+    emit_research_notes,
+    get_packed_memory_value,
+    get_memory_store,
+    use_memory_store,
+    MemoryStore
+)
+
+TEMPLATE = "TASK: {task}\n\nFacts:\n{key_facts}\n\nNotes:\n{research_notes}\n\nSnippets:\n{key_snippets}\n\nEND"
+
+
+@pytest.fixture(autouse=True)
+def fresh_memory():
+    with use_memory_store(MemoryStore()):
+        yield
+
+
+def build_prompt():
+    emit_key_facts.invoke({"facts": ["fact " + "f" * 400]})
+    emit_research_notes.invoke({"notes": "note " + "n" * 400})
+    emit_key_snippets.invoke({"snippets": [{
+        'filepath': 'big.py', 'line_number': 1, 'snippet': "s" * 2000, 'description': None
+    }]})
+    return CompactablePrompt(
+        TEMPLATE,
+        {
+            'task': "Fix the parser",
+            'key_facts': get_packed_memory_value('key_facts'),
+            'research_notes': get_packed_memory_value('research_notes'),
+            'key_snippets': get_packed_memory_value('key_snippets')
+        },
+        sections={'key_facts': 'key_facts', 'research_notes': 'research_notes', 'key_snippets': 'key_snippets'}
+    )
+
+
+def test_render_without_limit_is_unchanged():
+    """Test prompts within the limit are rendered as is."""
+    prompt = build_prompt()
+    full = prompt.render()
+    assert prompt.render(max_tokens=100000) == full
+    assert "s" * 2000 in full
+
+
+def test_render_compacts_snippets_first():
+    """Test snippets are dropped before notes and facts, keeping the task."""
+    prompt = build_prompt()
+    full_tokens = count_tokens(prompt.render())
+    text = prompt.render(max_tokens=full_tokens - 100)
+    assert count_tokens(text) <= full_tokens - 100
+    assert "s" * 2000 not in text
+    assert "key snippets omitted" in text
+    assert "n" * 400 in text
+    assert "f" * 400 in text
+    assert text.startswith("TASK: Fix the parser")
+    assert text.endswith("END")
+
+
+def test_render_compacts_all_sections_but_keeps_template():
+    """Test an impossible limit empties every section but keeps the skeleton."""
+    text = build_prompt().render(max_tokens=1)
+    assert "f" * 400 not in text
+    assert "n" * 400 not in text
+    assert "TASK: Fix the parser" in text
+    assert text.endswith("END")
+
+
+@pytest.mark.parametrize("tokenizer", [None, lambda text: len(text.split())])
+def test_render_fits_whenever_skeleton_fits(tokenizer):
+    """Test rendered prompts never exceed a limit the empty template fits in."""
+    prompt = build_prompt()
+    set_tokenizer(tokenizer)
+    try:
+        skeleton_tokens = count_tokens(TEMPLATE.format(
+            task="Fix the parser", key_facts="", research_notes="", key_snippets=""
+        ))
+        full_tokens = count_tokens(prompt.render())
+        for max_tokens in range(skeleton_tokens, full_tokens + 1):
+            assert count_tokens(prompt.render(max_tokens=max_tokens)) <= max_tokens
+    finally:
+        set_tokenizer(None)
+
+
+def tool_exchange(index, content):
+    call = AIMessage(content="", tool_calls=[{"name": "read_file_tool", "args": {}, "id": f"call-{index}"}])
+    return [call, ToolMessage(content=content, tool_call_id=f"call-{index}", name="read_file_tool")]
+
+
+def test_tool_history_compactor_elides_old_large_results():
+    """Test only older tool results over the size limit are replaced with stubs."""
+    messages = [HumanMessage("task")]
+    messages += tool_exchange(1, "line\n" * 1000)
+    messages += tool_exchange(2, "small")
+    messages += tool_exchange(3, "line\n" * 1000)
+    messages += tool_exchange(4, "line\n" * 1000)
+
+    compacted = ToolHistoryCompactor(keep_recent=2, max_tokens=100).compact(messages)
+
+    assert len(compacted) == len(messages)
+    assert compacted[2].content.startswith("[Earlier output of read_file_tool elided")
+    assert 'tool_call_id="call-1"' in compacted[2].content
+    assert compacted[2].tool_call_id == "call-1"
+    assert compacted[4] is messages[4]  # small result kept
+    assert compacted[6] is messages[6] and compacted[8] is messages[8]  # most recent kept
+    assert messages[2].content == "line\n" * 1000
+
+
+def test_tool_history_compactor_zero_limit_elides_everything_older():
+    """Test max_tokens=0 elides every tool result outside the recent window."""
+    messages = tool_exchange(1, "a") + tool_exchange(2, "b")
+    compacted = ToolHistoryCompactor(keep_recent=1, max_tokens=0).compact(messages)
+    assert "elided" in compacted[1].content
+    assert compacted[3].content == "b"
+
+
+class RecordingModel(GenericFakeChatModel):
+    """Fake chat model that records the messages it is called with."""
+    calls: list = []
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, *args, **kwargs):
+        self.calls.append(list(messages))
+        return super()._generate(messages, *args, **kwargs)
+
+
+def test_agent_sends_compacted_history_and_can_recall():
+    """Test the agent loop elides old results from model calls and recall_tool_output restores them."""
+    @tool
+    def dump(part: int) -> str:
+        """Return a large blob."""
+        return f"blob {part} " + "x " * 2000
+
+    clear_agent_cache()
+    _global_memory['config'] = {'keep_tool_results': 1, 'tool_result_max_tokens': 50}
+    replies = [
+        AIMessage(content="", tool_calls=[{"name": "dump", "args": {"part": 1}, "id": "c1"}]),
+        AIMessage(content="", tool_calls=[{"name": "dump", "args": {"part": 2}, "id": "c2"}]),
+        AIMessage(content="", tool_calls=[{"name": "recall_tool_output", "args": {"tool_call_id": "c1"}, "id": "c3"}]),
+        AIMessage(content="done"),
+    ]
+    model = RecordingModel(messages=iter(replies), calls=[])
+    agent = get_agent(model, [dump, recall_tool_output])
+    result = agent.invoke({"messages": [HumanMessage("go")]})
+    clear_agent_cache()
+
+    third_call = model.calls[2]
+    assert "elided" in third_call[2].content
+    assert third_call[4].content.startswith("blob 2")
+    assert result["messages"][-2].content.startswith("blob 1")
+    assert result["messages"][2].content.startswith("blob 1")
@@ -0,0 +1,50 @@
+import pytest
+
+from sparc_cli.text import fuzzy
+from sparc_cli.text.fuzzy import fuzzy_match_paths, prefilter
+
+PATHS = [
+    'src/config/loader.py',
+    'src/config/__init__.py',
+    'tests/test_config_loader.py',
+    'docs/configuration.md',
+    'src/models/user.py',
+    'README.md',
+]
+
+
+@pytest.fixture(params=['rapidfuzz', 'fuzzywuzzy'])
+def backend(request, monkeypatch):
+    if request.param == 'fuzzywuzzy':
+        monkeypatch.setattr(fuzzy, '_rapidfuzz', None)
+    elif fuzzy._rapidfuzz is None:
+        pytest.skip("rapidfuzz is not installed")
+    return request.param
+
+
+def test_prefilter():
+    """Test paths need the query as a subsequence or half its bigrams."""
+    assert prefilter('cfgldr', PATHS) == [0, 2]
+    assert prefilter('USER', PATHS) == [4]
+    # 'loadre' is no subsequence of loader.py, but shares most bigrams
+    assert 0 in prefilter('loadre', PATHS)
+    assert prefilter('zzz', PATHS) == []
+
+
+def test_basename_matches_rank_first(backend):
+    """Test a file named like the query beats paths that only contain it."""
+    matches = fuzzy_match_paths('loader', PATHS, limit=3)
+    assert matches[0] == ('src/config/loader.py', 100)
+    assert matches[1][0] == 'tests/test_config_loader.py'
+    assert fuzzy_match_paths('user.py', PATHS)[0] == ('src/models/user.py', 100)
+
+
+def test_limit_and_threshold(backend):
+    """Test results are capped, sorted best first and above the threshold."""
+    matches = fuzzy_match_paths('config', PATHS, limit=2)
+    assert len(matches) == 2
+    assert matches[0][1] >= matches[1][1]
+    assert all(score >= 90 for _, score in fuzzy_match_paths('config', PATHS, threshold=90))
+    assert fuzzy_match_paths('config', PATHS, threshold=101) == []
+    assert fuzzy_match_paths('', PATHS) == []
+    assert fuzzy_match_paths('config', PATHS, limit=0) == []
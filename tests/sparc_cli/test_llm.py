@@ -63,3 +63,110 @@ def test_environment_variables():
     expert_enabled, missing = validate_environment(args)
     assert isinstance(expert_enabled, bool)
     assert isinstance(missing, list)
+
+def test_initialize_llm_reuses_pooled_client(monkeypatch):
+    """Test clients are shared per provider, model, endpoint and API key."""
+    from sparc_cli.llm import close_clients
+    close_clients()
+    monkeypatch.setenv("OPENAI_API_KEY", "key-1")
+    with patch('sparc_cli.llm.ChatOpenAI') as mock:
+        first = initialize_llm('openai', 'gpt-4')
+        assert initialize_llm('openai', 'gpt-4') is first
+        mock.assert_called_once()
+
+        initialize_llm('openai', 'gpt-4o')
+        monkeypatch.setenv("OPENAI_API_KEY", "key-2")
+        initialize_llm('openai', 'gpt-4')
+        assert mock.call_count == 3
+    close_clients()
+
+def test_client_pool_settings_and_counters():
+    """Test pool settings are validated and request counters track calls."""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from sparc_cli.llm import configure_client_pool, RequestCounter
+
+    with pytest.raises(ValueError):
+        configure_client_pool(max_connections=0)
+    with pytest.raises(ValueError):
+        configure_client_pool(pool_size=5)
+
+    counter = RequestCounter()
+    model = FakeListChatModel(responses=["a", "b"], callbacks=[counter])
+    model.invoke("one")
+    model.invoke("two")
+    assert counter.requests == 2
+    assert counter.errors == 0
+
+def test_async_client_pools_connections_per_event_loop():
+    """Test each event loop sends through its own connections, closed on release."""
+    import asyncio
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    import httpx
+    from sparc_cli.llm import LoopBoundAsyncClient
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    client = LoopBoundAsyncClient(limits=httpx.Limits(), timeout=httpx.Timeout(5))
+
+    async def fetch_twice():
+        first = await client.get(url)
+        second = await client.get(url)
+        loop_client = client._loop_clients[asyncio.get_running_loop()]
+        await client.release_loop()
+        return first.text + second.text, loop_client
+
+    try:
+        # A new loop per run, as sync agent runs do
+        text, first_client = asyncio.run(fetch_twice())
+        assert text == "okok"
+        text, second_client = asyncio.run(fetch_twice())
+        assert text == "okok"
+        assert first_client is not second_client and first_client.is_closed
+        assert client._loop_clients == {}
+    finally:
+        server.shutdown()
+
+def test_close_clients_closes_async_connections():
+    """Test closing the pool closes async connections on the loops that own them."""
+    import asyncio
+    import threading
+    from sparc_cli import llm
+
+    llm.close_clients()
+    with patch('sparc_cli.llm.ChatOpenAI'):
+        llm._pooled_client('openai', 'gpt-4', 'key')
+    async_client = llm._clients[next(iter(llm._clients))].http_clients[1]
+
+    # A loop still running in another thread, and one not running here
+    running = asyncio.new_event_loop()
+    thread = threading.Thread(target=running.run_forever, daemon=True)
+    thread.start()
+    idle = asyncio.new_event_loop()
+    try:
+        on_running = asyncio.run_coroutine_threadsafe(_loop_client(async_client), running).result(5)
+        on_idle = idle.run_until_complete(_loop_client(async_client))
+
+        llm.close_clients()
+        assert on_running.is_closed and on_idle.is_closed and async_client.is_closed
+    finally:
+        running.call_soon_threadsafe(running.stop)
+        thread.join(5)
+        running.close()
+        idle.close()
+
+async def _loop_client(async_client):
+    return async_client._loop_client()
@@ -0,0 +1,87 @@
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from sparc_cli.project_files import PathMatcher, clear_project_files_cache, get_project_files
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    clear_project_files_cache()
+    yield
+    clear_project_files_cache()
+
+
+@pytest.fixture
+def repo(tmp_path):
+    subprocess.run(['git', 'init', '-q'], cwd=tmp_path, check=True)
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.py").write_text("print('hi')\n")
+    (tmp_path / "README.md").write_text("readme\n")
+    (tmp_path / ".gitignore").write_text("*.log\n")
+    (tmp_path / "debug.log").write_text("ignored\n")
+    subprocess.run(['git', 'add', 'src/main.py', '.gitignore'], cwd=tmp_path, check=True)
+    return tmp_path
+
+
+def count_git_calls():
+    return patch('sparc_cli.project_files.subprocess.run', side_effect=subprocess.run)
+
+
+def test_lists_tracked_and_untracked_files(repo):
+    """Test git's tracked and unignored untracked files are listed."""
+    assert sorted(get_project_files(str(repo))) == ['.gitignore', 'README.md', 'src/main.py']
+
+
+def test_listing_is_cached_until_something_changes(repo):
+    """Test the listing is reused until a directory or the git index changes."""
+    get_project_files(str(repo))
+    with count_git_calls() as run:
+        get_project_files(str(repo))
+        assert run.call_count == 0
+
+        (repo / "src" / "util.py").write_text("")
+        assert 'src/util.py' in get_project_files(str(repo))
+        assert run.call_count == 2
+
+        get_project_files(str(repo))
+        assert run.call_count == 2
+
+        # Staging changes the index but no directory
+        subprocess.run(['git', 'add', 'README.md'], cwd=repo, check=True)
+        run.reset_mock()
+        get_project_files(str(repo))
+        assert run.call_count == 2
+
+
+def test_listing_follows_ignore_file_changes(repo):
+    """Test editing .gitignore or .git/info/exclude refreshes the listing."""
+    assert 'debug.log' not in get_project_files(str(repo))
+
+    (repo / ".gitignore").write_text("")
+    assert 'debug.log' in get_project_files(str(repo))
+
+    (repo / ".git" / "info").mkdir(exist_ok=True)
+    (repo / ".git" / "info" / "exclude").write_text("README.md\n")
+    assert 'README.md' not in get_project_files(str(repo))
+
+
+def test_lists_all_files_outside_git(tmp_path):
+    """Test every file is listed outside a git repository, except sparc's own state."""
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "b.txt").write_text("")
+    (tmp_path / ".sparc").mkdir()
+    (tmp_path / ".sparc" / "sessions.db").write_text("")
+    assert get_project_files(str(tmp_path)) == ['a/b.txt']
+
+    (tmp_path / "a" / "c.txt").write_text("")
+    assert sorted(get_project_files(str(tmp_path))) == ['a/b.txt', 'a/c.txt']
+
+
+def test_path_matcher():
+    """Test include and exclude patterns are combined like separate fnmatch passes."""
+    matcher = PathMatcher(include=['src/*', 'docs/*.md'], exclude=['*.pyc', '__pycache__/*'])
+    assert matcher.filter(['src/a.py', 'src/a.pyc', 'docs/x.md', 'docs/x.txt', 'setup.py']) == ['src/a.py', 'docs/x.md']
+    assert PathMatcher()('anything')
+    assert not PathMatcher(exclude=['*.log'])('logs/app.log')
@@ -0,0 +1,147 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import anthropic
+import httpx
+import pytest
+
+from sparc_cli.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    get_circuit_breaker,
+    get_retry_stats,
+    is_transient_error,
+    reset_circuit_breakers,
+    reset_retry_stats,
+    retry_after
+)
+from sparc_cli.tools.scrape import RetryConfig, RetryStrategy, TransientError
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    reset_circuit_breakers()
+    reset_retry_stats()
+    yield
+    reset_circuit_breakers()
+    reset_retry_stats()
+
+
+def api_error(status, headers=None):
+    response = httpx.Response(status, headers=headers or {}, request=httpx.Request("POST", "https://api.test"))
+    return anthropic.APIStatusError("failed", response=response, body=None)
+
+
+def test_transient_errors():
+    """Test only connection failures and retryable statuses are transient."""
+    assert is_transient_error(api_error(429))
+    assert is_transient_error(api_error(529))
+    assert is_transient_error(anthropic.APITimeoutError(request=httpx.Request("POST", "https://api.test")))
+    assert not is_transient_error(api_error(400))
+    assert not is_transient_error(api_error(401))
+    assert not is_transient_error(ValueError("bad"))
+
+
+def test_retry_after_headers():
+    """Test Retry-After in seconds, milliseconds and as an HTTP date."""
+    assert retry_after(api_error(429, {'retry-after': '7'})) == 7.0
+    assert retry_after(api_error(429, {'retry-after-ms': '1500'})) == 1.5
+    assert 0 < retry_after(api_error(429, {'retry-after': 'Wed, 21 Oct 2099 07:28:00 GMT'}))
+    assert retry_after(api_error(429)) is None
+    assert retry_after(ValueError()) is None
+
+
+def test_delay_is_capped_jittered_and_honors_retry_after():
+    """Test backoff never exceeds max_delay and waits at least the requested time."""
+    policy = RetryPolicy(max_retries=20, base_delay=1.0, max_delay=30.0)
+    delays = [policy.delay(attempt) for attempt in range(20) for _ in range(5)]
+    assert max(delays) <= 30.0
+    assert len(set(delays)) > 1
+
+    assert RetryPolicy(jitter=0, max_delay=30.0).delay(10) == 30.0
+    assert policy.delay(0, api_error(429, {'retry-after': '12'})) == 12.0
+    assert RetryPolicy(max_retry_after=5).delay(0, api_error(429, {'retry-after': '600'})) <= 5.0
+
+
+def test_call_retries_transient_errors_only():
+    """Test call() retries transient errors and raises others at once."""
+    policy = RetryPolicy(max_retries=3, base_delay=0.01)
+    results = iter([api_error(503), api_error(429), "ok"])
+
+    def flaky():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert policy.call(flaky, name='svc') == "ok"
+    stats = get_retry_stats()['svc']
+    assert (stats['calls'], stats['retries'], stats['successes']) == (1, 2, 1)
+
+    calls = []
+
+    def bad_request():
+        calls.append(1)
+        raise api_error(400)
+
+    with pytest.raises(anthropic.APIStatusError):
+        policy.call(bad_request, name='svc')
+    assert len(calls) == 1
+
+
+def test_circuit_breaker_opens_and_half_opens():
+    """Test the breaker refuses calls after repeated failures and lets one trial through."""
+    breaker = CircuitBreaker('svc', failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.acquire() == 0
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert breaker.acquire() > 0
+
+    time.sleep(0.06)
+    assert breaker.acquire() == 0
+    assert breaker.acquire() > 0  # only one trial at a time
+    breaker.record_success()
+    assert breaker.state == 'closed'
+
+
+def test_circuit_breaker_is_shared():
+    """Test callers using the same name share one breaker and fail fast when it opens."""
+    assert get_circuit_breaker('anthropic') is get_circuit_breaker('anthropic')
+    breaker = get_circuit_breaker('anthropic')
+    breaker.failure_threshold = 1
+
+    def down():
+        raise api_error(503)
+
+    policy = RetryPolicy(max_retries=5, base_delay=0.01)
+    with pytest.raises(CircuitOpenError) as exc_info:
+        policy.call(down, name='anthropic')
+    assert isinstance(exc_info.value.__cause__, anthropic.APIStatusError)
+    assert get_retry_stats()['anthropic']['rejected'] == 1
+
+
+def test_acall_retries():
+    """Test the async variant retries with a fresh awaitable."""
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise api_error(500)
+        return "ok"
+
+    policy = RetryPolicy(max_retries=2, base_delay=0.01)
+    assert asyncio.run(policy.acall(flaky, name='svc')) == "ok"
+    assert len(attempts) == 2
+
+
+def test_scrape_retry_strategy_uses_policy():
+    """Test the scraper's strategy delegates to a capped, jittered policy."""
+    strategy = RetryStrategy(RetryConfig(max_retries=2, base_delay=1.0, max_delay=5.0, jitter=0.1))
+    assert strategy.should_retry(1, TransientError())
+    assert not strategy.should_retry(2, TransientError())
+    assert not strategy.should_retry(0, ValueError())
+    assert 4.5 <= strategy.delay(10) <= 5.0
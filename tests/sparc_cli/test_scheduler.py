@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+
+from sparc_cli.scheduler import TaskNode, TaskScheduler, critical_path_lengths
+
+
+def sleeper(seconds=0.1, fail=()):
+    """Task runner that sleeps and records which tasks overlapped."""
+    state = {'running': set(), 'overlaps': [], 'order': []}
+    lock = threading.Lock()
+
+    def run(node):
+        with lock:
+            state['overlaps'].extend((other, node.id) for other in state['running'])
+            state['running'].add(node.id)
+            state['order'].append(node.id)
+        time.sleep(seconds)
+        with lock:
+            state['running'].discard(node.id)
+        if node.id in fail:
+            raise RuntimeError(f"task {node.id} broke")
+        return {"success": True}
+
+    return run, state
+
+
+def test_critical_path_lengths():
+    """Test each task's longest chain of dependents is counted."""
+    nodes = [TaskNode(1, "a"), TaskNode(2, "b", [1]), TaskNode(3, "c", [2]), TaskNode(4, "d", [1])]
+    assert critical_path_lengths(nodes) == {1: 3, 2: 2, 3: 1, 4: 1}
+
+
+def test_invalid_graphs_are_rejected():
+    """Test unknown prerequisites and cycles raise ValueError."""
+    with pytest.raises(ValueError, match="unknown"):
+        TaskScheduler([TaskNode(1, "a", [9])], run=lambda node: None)
+    with pytest.raises(ValueError, match="cycle"):
+        TaskScheduler([TaskNode(1, "a", [2]), TaskNode(2, "b", [1])], run=lambda node: None)
+
+
+def test_independent_tasks_finish_in_critical_path_time():
+    """Test independent tasks run concurrently and dependents wait."""
+    run, state = sleeper()
+    nodes = [
+        TaskNode(1, "a", files=["a.py"]),
+        TaskNode(2, "b", files=["b.py"]),
+        TaskNode(3, "c", files=["c.py"]),
+        TaskNode(4, "d", [1, 2], files=["d.py"]),
+    ]
+    start = time.monotonic()
+    outcomes = TaskScheduler(nodes, run=run, max_workers=4).run()
+    elapsed = time.monotonic() - start
+
+    assert all(outcome['status'] == 'completed' for outcome in outcomes.values())
+    assert elapsed < 0.35
+    assert state['order'][-1] == 4
+    assert not any(4 in pair and {1, 2} & set(pair) for pair in state['overlaps'])
+
+
+def test_tasks_writing_the_same_file_do_not_overlap():
+    """Test per-file locks serialize tasks sharing a file, and undeclared files run alone."""
+    run, state = sleeper(0.05)
+    nodes = [
+        TaskNode(1, "a", files=["shared.py", "a.py"]),
+        TaskNode(2, "b", files=["shared.py"]),
+        TaskNode(3, "c", files=["c.py"]),
+        TaskNode(4, "d"),
+    ]
+    TaskScheduler(nodes, run=run, max_workers=4).run()
+    overlapping = {frozenset(pair) for pair in state['overlaps']}
+    assert frozenset((1, 2)) not in overlapping
+    assert frozenset((1, 3)) in overlapping
+    assert not any(4 in pair for pair in overlapping)
+
+
+def test_failure_skips_dependents_only():
+    """Test a failed task skips its transitive dependents and reports progress."""
+    run, _ = sleeper(0.01, fail={1})
+    events = []
+    nodes = [
+        TaskNode(1, "a", files=["a.py"]),
+        TaskNode(2, "b", [1], files=["b.py"]),
+        TaskNode(3, "c", [2], files=["c.py"]),
+        TaskNode(4, "d", files=["d.py"]),
+    ]
+    outcomes = TaskScheduler(
+        nodes, run=run, on_event=lambda event, node, outcome: events.append((event, node.id))
+    ).run()
+
+    assert outcomes[1] == {'status': 'failed', 'reason': "error: task 1 broke", 'result': None}
+    assert outcomes[2]['status'] == outcomes[3]['status'] == 'skipped'
+    assert outcomes[3]['reason'] == "prerequisite task #2 did not complete"
+    assert outcomes[4]['status'] == 'completed'
+    assert ('started', 2) not in events
+    assert ('failed', 1) in events and ('skipped', 3) in events
+
+
+def test_unsuccessful_result_counts_as_failure():
+    """Test a result dict with success False fails the task."""
+    outcomes = TaskScheduler(
+        [TaskNode(1, "a")], run=lambda node: {"success": False, "reason": "tests failed"}
+    ).run()
+    assert outcomes[1]['status'] == 'failed'
+    assert outcomes[1]['reason'] == "tests failed"
@@ -0,0 +1,116 @@
+import os
+import subprocess
+
+import pytest
+
+from sparc_cli.search_index import TrigramIndex, regex_query
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "config.py").write_text("def load_config(path):\n    return read(path)\n")
+    (tmp_path / "src" / "store.py").write_text("def save_config(config):\n    write(config)\n")
+    (tmp_path / "README.md").write_text("Nothing to see here\n")
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG\0\0load_config")
+    return tmp_path
+
+
+@pytest.fixture
+def index(project):
+    index = TrigramIndex(str(project))
+    yield index
+    index.close()
+
+
+def test_regex_query():
+    """Test required literals are extracted from regexes, with alternatives as OR."""
+    assert regex_query(r'foo\d+bar') == ('and', [('lit', 'foo', False), ('lit', 'bar', False)])
+    assert regex_query(r'(?i)Hello') == ('and', [('lit', 'Hello', True)])
+    query = regex_query(r'x(ab|cde)y')
+    assert query[1][1] == ('and', [('or', [('and', [('lit', 'ab', False)]), ('and', [('lit', 'cde', False)])])])
+    assert regex_query(r'[abc]+') is None
+    assert regex_query(r'(unclosed') is None
+
+
+def test_regex_query_skips_syntax_rg_reads_differently():
+    """Test patterns Python and rg parse differently are not narrowed."""
+    for pattern in (r'foo[[:digit:]]bar', r'foo[a-z&&[^x]]bar', r'foo[a-z--x]bar', r'foo[a~~b]bar',
+                    r'\<foobar\>', r'foo\b{start}bar', r'foo\x{41}bar', r'(?x)foo bar', r'foo(?=bar)'):
+        assert regex_query(pattern) is None, pattern
+    assert regex_query(r'foo[0-9]bar') == ('and', [('lit', 'foo', False), ('lit', 'bar', False)])
+    assert regex_query(r'(?P<name>foo\.bar{2,})') is not None
+
+
+def test_candidates_with_posix_class(tmp_path):
+    """Test a POSIX class pattern searches every file instead of missing matches."""
+    (tmp_path / "a.py").write_text("foo1bar\n")
+    index = TrigramIndex(str(tmp_path))
+    try:
+        index.update()
+        assert index.candidates(r'foo[0-9]bar') == ['a.py']
+        assert index.candidates(r'foo[[:digit:]]bar') is None
+    finally:
+        index.close()
+
+
+def test_candidates(index):
+    """Test only files that may contain a match are returned."""
+    update = index.update()
+    assert update.indexed == update.files == 4
+    assert os.path.exists(os.path.join(index.root, '.sparc', 'search_index.db'))
+
+    assert index.candidates(r'def load_config') == ['src/config.py']
+    assert index.candidates(r'def (load|save)_config') == ['src/config.py', 'src/store.py']
+    assert index.candidates(r'missing') == []
+    # The index is case-insensitive; rg decides whether the case matches
+    assert index.candidates(r'NOTHING') == ['README.md']
+    assert index.candidates(r'(?i)NOTHING') == ['README.md']
+    # Too short to narrow
+    assert index.candidates(r'de') is None
+    assert index.candidates(r'\w+') is None
+
+
+def test_incremental_update(project, index):
+    """Test changed, added and deleted files are picked up on the next update."""
+    index.update()
+    (project / "src" / "store.py").write_text("def persist(data):\n    pass\n")
+    os.utime(project / "src" / "store.py", ns=(1, 1))
+    (project / "src" / "new.py").write_text("CONFIG = save_config(None)\n")
+    (project / "README.md").unlink()
+
+    update = index.update()
+    assert (update.files, update.indexed, update.removed) == (4, 2, 1)
+    assert index.candidates(r'save_config') == ['src/new.py']
+    assert index.candidates(r'persist') == ['src/store.py']
+    assert index.candidates(r'Nothing to see') == []
+
+    assert index.update().indexed == 0
+
+
+def test_large_files_are_always_candidates(project, index, monkeypatch):
+    """Test files too large to index are searched for every pattern."""
+    monkeypatch.setattr('sparc_cli.search_index.MAX_INDEXED_FILE_BYTES', 60)
+    (project / "big.txt").write_text("x" * 100)
+    index.update()
+    assert index.candidates(r'load_config') == ['big.txt', 'src/config.py']
+
+
+def test_respects_gitignore(project):
+    """Test git-ignored files are not indexed in a git repository."""
+    subprocess.run(['git', 'init', '-q'], cwd=project, check=True)
+    (project / ".gitignore").write_text("src/store.py\n")
+    index = TrigramIndex(str(project))
+    try:
+        index.update()
+        assert index.candidates(r'save_config') == []
+        assert '.sparc/search_index.db' not in index.list_files()
+    finally:
+        index.close()
+
+
+def test_rebuild(index):
+    """Test rebuild re-indexes every file."""
+    index.update()
+    assert index.rebuild().indexed == 4
+    assert index.candidates(r'load_config') == ['src/config.py']
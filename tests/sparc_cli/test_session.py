@@ -0,0 +1,123 @@
+import sqlite3
+
+import pytest
+
+from sparc_cli.session import SessionStore
+from sparc_cli.tools.memory import (
+    _global_memory,
+    emit_key_facts,
+    emit_key_snippets,
+    emit_research_notes,
+    emit_task,
+    get_memory_value,
+    get_related_files,
+    PrioritizedMemory,
+    RelatedFilesRegistry,
+    MemoryPriority
+)
+
+
+def reset_memory():
+    _global_memory.clear()
+    _global_memory.update({
+        'research_notes': [],
+        'plans': [],
+        'tasks': {},
+        'task_completed': False,
+        'completion_message': '',
+        'task_id_counter': 1,
+        'key_facts': {},
+        'key_fact_id_counter': 1,
+        'key_snippets': {},
+        'key_snippet_id_counter': 1,
+        'implementation_requested': False,
+        'related_files': {},
+        'related_file_id_counter': 1,
+        'plan_completed': False,
+        'agent_depth': 0,
+        'work_log': []
+    })
+
+
+@pytest.fixture(autouse=True)
+def clean_memory():
+    reset_memory()
+    yield
+    reset_memory()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+
+def populate_memory():
+    emit_key_facts.invoke({"facts": ["Uses SQLite"], "priority": MemoryPriority.HIGH})
+    emit_research_notes.invoke({"notes": "Looked at the storage layer"})
+    emit_key_snippets.invoke({"snippets": [{
+        'filepath': './store.py',
+        'line_number': 10,
+        'snippet': 'def save(): pass',
+        'description': 'Save entry point'
+    }]})
+    emit_task.invoke({"task": "Add WAL mode"})
+
+
+def test_session_round_trip(db_path):
+    """Test memory survives a flush and restore in a new process state."""
+    session = SessionStore("s1", db_path=db_path, flush_interval=0)
+    session.start("Persist memory")
+    populate_memory()
+    session.close()
+
+    reset_memory()
+    restored = SessionStore("s1", db_path=db_path, flush_interval=0)
+    assert restored.exists()
+    assert restored.base_task == "Persist memory"
+    restored.restore()
+
+    assert isinstance(_global_memory['key_facts'], PrioritizedMemory)
+    assert isinstance(_global_memory['related_files'], RelatedFilesRegistry)
+    assert "Uses SQLite" in get_memory_value('key_facts')
+    assert "def save(): pass" in get_memory_value('key_snippets')
+    assert _global_memory['research_notes'][0]['content'] == "Looked at the storage layer"
+    assert _global_memory['tasks'] == {1: "Add WAL mode"}
+    assert _global_memory['task_id_counter'] == 2
+    assert get_related_files() == ["ID#1 store.py"]
+    restored.close()
+
+
+def test_session_uses_wal(db_path):
+    """Test the session database runs in WAL mode."""
+    session = SessionStore("s1", db_path=db_path, flush_interval=0)
+    session.close()
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+
+def test_session_flush_writes_only_changes(db_path):
+    """Test flush batches changed keys and skips unchanged ones."""
+    session = SessionStore("s1", db_path=db_path, flush_interval=0)
+    session.start()
+    assert session.flush() > 0
+    assert session.flush() == 0
+
+    emit_key_facts.invoke({"facts": ["New fact"]})
+    # key_facts, its ID counter and the work log changed
+    assert session.flush() == 3
+    session.close()
+
+
+def test_session_stages_and_reset(db_path):
+    """Test stage completion is recorded and cleared by reset."""
+    session = SessionStore("s1", db_path=db_path, flush_interval=0)
+    session.start("task")
+    assert not session.is_stage_completed('research')
+    session.complete_stage('research')
+    assert session.is_stage_completed('research')
+
+    session.reset()
+    assert not session.exists()
+    assert not session.is_stage_completed('research')
+    session.close()
@@ -0,0 +1,194 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from sparc_cli.tracing import (
+    JsonlSpanExporter,
+    OpenTelemetrySpanExporter,
+    configure_tracing,
+    current_span,
+    get_tracer,
+    shutdown_tracing,
+    summarize_spans,
+    trace_span,
+    traced_config
+)
+
+
+@pytest.fixture(autouse=True)
+def no_tracing():
+    shutdown_tracing()
+    yield
+    shutdown_tracing()
+
+
+@tool
+def shout(text: str) -> str:
+    """Repeat text in capitals."""
+    return text.upper()
+
+
+def test_spans_are_not_recorded_when_tracing_is_off():
+    """Test trace_span still yields a usable span without a tracer."""
+    with trace_span('research', 'stage') as span:
+        span.add('retries')
+    assert span.attributes == {'retries': 1}
+    assert get_tracer() is None
+    assert traced_config({'recursion_limit': 5}) == {'recursion_limit': 5}
+    assert shutdown_tracing() == []
+
+
+def test_nested_spans_and_errors():
+    """Test spans nest under the current span and record errors."""
+    configure_tracing()
+    with trace_span('research', 'stage') as stage:
+        assert current_span() is stage
+        with pytest.raises(ValueError):
+            with trace_span('agent', 'agent'):
+                raise ValueError("boom")
+    assert current_span() is None
+
+    agent, research = shutdown_tracing()
+    assert agent.parent is research
+    assert agent.error == "ValueError: boom"
+    assert research.error is None
+    assert research.duration >= agent.duration >= 0
+
+
+def test_model_and_tool_calls_are_traced():
+    """Test the callback handler records model and tool calls with tokens and payload sizes."""
+    configure_tracing()
+    model = FakeMessagesListChatModel(responses=[
+        AIMessage(content="done", usage_metadata={'input_tokens': 12, 'output_tokens': 3, 'total_tokens': 15})
+    ])
+    with trace_span('agent', 'agent') as agent:
+        config = traced_config({})
+        model.invoke("hello", config)
+        shout.invoke({'text': "hi"}, config)
+
+    llm, tool_span, _ = shutdown_tracing()
+    assert llm.kind == 'llm' and llm.parent is agent
+    assert llm.attributes['tokens_in'] == 12 and llm.attributes['tokens_out'] == 3
+    assert llm.attributes['request_bytes'] == len("hello")
+    assert llm.attributes['response_bytes'] == len("done")
+    assert agent.attributes['tokens_in'] == 12
+
+    assert (tool_span.kind, tool_span.name) == ('tool', 'shout')
+    assert tool_span.parent is agent
+    assert tool_span.attributes['response_bytes'] == len("HI")
+
+
+def test_token_roll_up_is_thread_safe():
+    """Test concurrent model calls under one parent do not lose token counts."""
+    tracer = configure_tracing()
+    with trace_span('research', 'stage') as stage:
+        calls = [tracer.start_span('model', 'llm', parent=stage) for _ in range(8)]
+
+        def record(span):
+            for _ in range(1000):
+                tracer.roll_up(span, tokens_in=1, tokens_out=2)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(record, calls))
+
+    assert stage.attributes['tokens_in'] == 8000
+    assert stage.attributes['tokens_out'] == 16000
+    assert all(call.attributes['tokens_in'] == 1000 for call in calls)
+
+
+def test_jsonl_export(tmp_path):
+    """Test finished spans are appended to the trace file as JSON lines."""
+    path = tmp_path / "trace.jsonl"
+    configure_tracing([JsonlSpanExporter(str(path))])
+    with trace_span('planning', 'stage'):
+        with trace_span('agent', 'agent', provider='anthropic'):
+            pass
+    shutdown_tracing()
+
+    agent, planning = [json.loads(line) for line in path.read_text().splitlines()]
+    assert agent['parent_id'] == planning['span_id']
+    assert agent['trace_id'] == planning['trace_id']
+    assert agent['attributes'] == {'provider': 'anthropic'}
+    assert planning['parent_id'] is None
+
+
+def test_opentelemetry_export():
+    """Test spans are mirrored to an OpenTelemetry tracer with their parents and attributes."""
+
+    class FakeOtelSpan:
+        def __init__(self, name, context):
+            self.name, self.context, self.attributes, self.ended = name, context, {}, False
+
+        def set_attribute(self, key, value):
+            self.attributes[key] = value
+
+        def set_status(self, status):
+            self.status = status
+
+        def end(self, end_time=None):
+            self.ended = True
+
+        # Used by set_span_in_context()
+        def get_span_context(self):
+            return None
+
+    class FakeOtelTracer:
+        def __init__(self):
+            self.spans = []
+
+        def start_span(self, name, context=None, start_time=None, attributes=None):
+            span = FakeOtelSpan(name, context)
+            self.spans.append(span)
+            return span
+
+    otel = FakeOtelTracer()
+    configure_tracing([OpenTelemetrySpanExporter(otel)])
+    with trace_span('research', 'stage'):
+        with trace_span('agent', 'agent') as span:
+            span.add('retries', 2)
+    shutdown_tracing()
+
+    research, agent = otel.spans
+    assert research.context is None and agent.context is not None
+    assert agent.attributes == {'sparc.retries': 2}
+    assert research.ended and agent.ended
+
+
+def test_summarize_spans():
+    """Test spans are totalled by kind and name, slowest first."""
+    configure_tracing()
+    for _ in range(2):
+        with trace_span('read_file_tool', 'tool') as span:
+            span.add('response_bytes', 10)
+    with trace_span('research', 'stage'):
+        with trace_span('ripgrep_search', 'tool'):
+            pass
+    rows = summarize_spans(shutdown_tracing())
+
+    assert rows[0]['name'] == 'research'
+    read = next(row for row in rows if row['name'] == 'read_file_tool')
+    assert read['count'] == 2 and read['response_bytes'] == 20 and read['errors'] == 0
+    assert read['avg'] == pytest.approx(read['total'] / 2)
+
+
+def test_summary_counts_nested_agent_tokens_once():
+    """Test tokens of an agent run inside another agent are not counted twice in the agent row."""
+    configure_tracing()
+    model = FakeMessagesListChatModel(responses=[
+        AIMessage(content="done", usage_metadata={'input_tokens': 10, 'output_tokens': 1, 'total_tokens': 11})
+    ])
+    with trace_span('agent', 'agent'):
+        model.invoke("outer", traced_config({}))
+        with trace_span('agent', 'agent') as inner:
+            model.invoke("inner", traced_config({}))
+    rows = summarize_spans(shutdown_tracing())
+
+    assert inner.attributes['tokens_in'] == 10
+    agent = next(row for row in rows if row['kind'] == 'agent')
+    llm = next(row for row in rows if row['kind'] == 'llm')
+    assert agent['count'] == 2
+    assert agent['tokens_in'] == llm['tokens_in'] == 20
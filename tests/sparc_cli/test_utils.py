@@ -18,3 +18,21 @@ def test_truncate_output():
     
     # Test None
     assert truncate_output(None) == ""
+
+def test_count_tokens_uses_pluggable_tokenizer():
+    """Test count_tokens uses the configured tokenizer and falls back to the heuristic."""
+    from sparc_cli.text.tokens import count_tokens, estimate_tokens, set_tokenizer
+
+    text = "one two three"
+    assert count_tokens(text) == estimate_tokens(text)
+    try:
+        set_tokenizer(lambda value: len(value.split()))
+        assert count_tokens(text) == 3
+
+        def broken(value):
+            raise RuntimeError("tokenizer failed")
+        set_tokenizer(broken)
+        assert count_tokens(text) == estimate_tokens(text)
+    finally:
+        set_tokenizer(None)
+    assert count_tokens("") == 0
@@ -0,0 +1,146 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from sparc_cli.tools import agent
+from sparc_cli.tools.memory import (
+    _global_memory,
+    emit_key_facts,
+    emit_key_snippets,
+    get_memory_store,
+    use_memory_store,
+    MemoryStore
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_memory():
+    with use_memory_store(MemoryStore()):
+        _global_memory['config'] = {'research_concurrency': 3}
+        _global_memory['agent_depth'] = 1
+        yield
+
+
+def fake_research(query, model, **kwargs):
+    """Stand-in research agent that records a shared and a unique fact."""
+    time.sleep(0.2)
+    emit_key_facts.invoke({"facts": ["common fact", f"fact about {query}"]})
+    emit_key_snippets.invoke({"snippets": [{
+        'filepath': 'shared.py', 'line_number': 1, 'snippet': 'x = 1', 'description': None
+    }]})
+
+
+def test_request_research_batch_runs_concurrently_and_merges():
+    """Test batch research runs in parallel and merges de-duplicated memory."""
+    parent = get_memory_store()
+    with patch.object(agent, 'initialize_llm'), \
+            patch('sparc_cli.agent_utils.run_research_agent', side_effect=fake_research):
+        start = time.monotonic()
+        result = agent.request_research_batch.invoke({"queries": ["a", "b", "c", "a"]})
+        elapsed = time.monotonic() - start
+
+    assert elapsed < 0.5
+    assert result['success'] is True
+    assert [r['query'] for r in result['results']] == ["a", "b", "c"]
+
+    facts = [fact['content'] for fact in parent['key_facts'].values()]
+    assert facts == ["common fact", "fact about a", "fact about b", "fact about c"]
+    assert len(parent['key_snippets']) == 1
+    assert "fact about b" in result['memory_changes']['key_facts']
+    assert result['work_log'] is not None
+
+
+def test_request_research_batch_reports_failures():
+    """Test a failing research agent does not stop the others."""
+    def flaky(query, model, **kwargs):
+        if query == "bad":
+            raise RuntimeError("boom")
+        fake_research(query, model)
+
+    with patch.object(agent, 'initialize_llm'), \
+            patch('sparc_cli.agent_utils.run_research_agent', side_effect=flaky):
+        result = agent.request_research_batch.invoke({"queries": ["good", "bad"]})
+
+    assert result['success'] is False
+    assert result['results'][1]['reason'] == "error: boom"
+    assert "fact about good" in result['memory_changes']['key_facts']
+
+
+def fake_implementation(task, model, **kwargs):
+    """Stand-in implementation agent that records the task it ran."""
+    time.sleep(0.1)
+    if task == "broken":
+        raise RuntimeError("compile error")
+    emit_key_facts.invoke({"facts": [f"done: {task}"]})
+
+
+def test_run_planned_tasks_follows_dependencies():
+    """Test planned tasks run by dependency, merge memory and skip after failures."""
+    from sparc_cli.tools.memory import emit_task
+    emit_task.invoke({"task": "models", "files": ["models.py"]})
+    emit_task.invoke({"task": "views", "files": ["views.py"]})
+    emit_task.invoke({"task": "urls", "depends_on": [1, 2], "files": ["urls.py"]})
+    emit_task.invoke({"task": "broken", "files": ["broken.py"]})
+    emit_task.invoke({"task": "docs", "depends_on": [4], "files": ["README.md"]})
+
+    seen = {}
+
+    def record(task, model, **kwargs):
+        seen[task] = [fact['content'] for fact in _global_memory['key_facts'].values()]
+        fake_implementation(task, model)
+
+    with patch.object(agent, 'initialize_llm'), \
+            patch('sparc_cli.agent_utils.run_task_implementation_agent', side_effect=record):
+        start = time.monotonic()
+        result = agent.run_planned_tasks.invoke({})
+        elapsed = time.monotonic() - start
+
+    assert elapsed < 0.35
+    statuses = {item['task_id']: item['status'] for item in result['results']}
+    assert statuses == {1: 'completed', 2: 'completed', 3: 'completed', 4: 'failed', 5: 'skipped'}
+    assert result['success'] is False
+    # Dependents see their prerequisites' findings
+    assert {"done: models", "done: views"} <= set(seen['urls'])
+    facts = {fact['content'] for fact in get_memory_store()['key_facts'].values()}
+    assert facts == {"done: models", "done: views", "done: urls"}
+
+
+def test_run_planned_tasks_interrupt_cancels_running_tasks():
+    """Test one interrupt cancels every running task agent without waiting for them."""
+    import asyncio
+    from sparc_cli import agent_utils
+    from sparc_cli.tools.memory import emit_task
+    emit_task.invoke({"task": "models", "files": ["models.py"]})
+    emit_task.invoke({"task": "views", "files": ["views.py"]})
+
+    started = threading.Semaphore(0)
+
+    class Slow:
+        async def astream(self, *args, **kwargs):
+            started.release()
+            await asyncio.sleep(10)
+            yield
+
+    def slow_implementation(task, model, **kwargs):
+        agent_utils.run_agent_with_retry(Slow(), task, {})
+
+    def interrupt():
+        for _ in range(2):
+            assert started.acquire(timeout=5)
+        assert agent_utils.cancel_innermost_agent()
+
+    interrupter = threading.Thread(target=interrupt)
+    with patch.object(agent, 'initialize_llm'), \
+            patch('sparc_cli.agent_utils.run_task_implementation_agent', side_effect=slow_implementation):
+        interrupter.start()
+        start = time.monotonic()
+        result = agent.run_planned_tasks.invoke({})
+        elapsed = time.monotonic() - start
+    interrupter.join(5)
+
+    assert elapsed < 5
+    assert [item['status'] for item in result['results']] == ['cancelled', 'cancelled']
+    assert result['success'] is False
+    assert not agent_utils.cancel_innermost_agent()
@@ -37,3 +37,20 @@ def test_fuzzy_find_project_files_empty():
         assert isinstance(result, dict)
         assert "matches" in result
         assert len(result["matches"]) == 0
+
+def test_fuzzy_find_project_files_include_exclude(tmp_path):
+    """Test include and exclude patterns filter the cached project file list."""
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "config.py").write_text("")
+    (tmp_path / "src" / "config.pyc").write_text("")
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "config.md").write_text("")
+
+    result = fuzzy_find_project_files.invoke({
+        "search_term": "config",
+        "repo_path": str(tmp_path),
+        "threshold": 0,
+        "include_paths": ["src/*", "docs/*"],
+        "exclude_patterns": ["docs/*"]
+    })
+    assert [path for path, score in result] == ["src/config.py"]
@@ -1,6 +1,6 @@
 import pytest
 from sparc_cli.tools import list_directory_tree
-from sparc_cli.tools.list_directory import load_gitignore_patterns, should_ignore
+from sparc_cli.tools.list_directory import DirScanConfig, load_gitignore_patterns, should_ignore, walk_tree
 
 def test_list_directory_tree():
     """Test that list_directory_tree returns directory structure."""
@@ -42,3 +42,56 @@ def test_list_directory_tree_nonexistent():
     result = list_directory_tree(path="nonexistent")
     assert isinstance(result, dict)
     assert "error" in result["tree"].lower()
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / ".gitignore").write_text("build/\n*.tmp.txt\n")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "out.bin").write_text("")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.py").write_text("print('hi')\n")
+    (tmp_path / "src" / ".gitignore").write_text("generated/\n!keep.tmp.txt\n/local.py\n")
+    (tmp_path / "src" / "generated").mkdir()
+    (tmp_path / "src" / "generated" / "x.py").write_text("")
+    (tmp_path / "src" / "keep.tmp.txt").write_text("")
+    (tmp_path / "src" / "drop.tmp.txt").write_text("")
+    (tmp_path / "src" / "local.py").write_text("")
+    (tmp_path / "notes.txt").write_text("12345")
+    return tmp_path
+
+
+def test_list_directory_tree_nested_gitignore(project):
+    """Test .gitignore files apply to their own directory, with later negations winning."""
+    result = list_directory_tree.invoke({'path': str(project), 'max_depth': 3, 'show_size': True})
+    lines = result.splitlines()
+    assert lines[1:] == [
+        "├── 📁 src/",
+        "│   ├── keep.tmp.txt (0.0B)",
+        "│   └── main.py (12.0B)",
+        "└── notes.txt (5.0B)",
+    ]
+
+
+def test_list_directory_tree_caps_entries(tmp_path):
+    """Test large directories show the first entries and count the rest."""
+    (tmp_path / "sub").mkdir()
+    for i in range(30):
+        (tmp_path / f"file{i:02d}.txt").write_text("")
+    result = list_directory_tree.invoke({'path': str(tmp_path), 'max_entries': 5})
+    lines = result.splitlines()
+    assert lines[1:] == [
+        "├── 📁 sub/",
+        "├── file00.txt",
+        "├── file01.txt",
+        "├── file02.txt",
+        "├── file03.txt",
+        "└── … 26 more",
+    ]
+
+
+def test_walk_tree_serial_and_parallel_agree(project):
+    """Test the parallel walk produces the same tree as a serial one."""
+    config = DirScanConfig(max_depth=5, follow_links=False, show_size=False, show_modified=False,
+                           exclude_patterns=[])
+    assert walk_tree(project, config, workers=1) == walk_tree(project, config, workers=4)
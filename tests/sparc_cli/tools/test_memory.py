@@ -15,14 +15,33 @@ from sparc_cli.tools.memory import (
     deregister_related_files,
     emit_task,
     delete_tasks,
+    swap_task_order,
     emit_plan,
     task_completed,
     plan_implementation_completed,
     one_shot_completed,
     MemoryPriority,
-    MEMORY_LIMITS
+    MEMORY_LIMITS,
+    PrioritizedMemory,
+    set_memory_limits,
+    MemoryStore,
+    get_memory_store,
+    use_memory_store,
+    pack_memory_section,
+    MAX_OMITTED_IDS_SHOWN,
+    refresh_key_snippets,
+    snapshot_memory,
+    diff_memory,
+    render_memory_diff,
+    read_memory
 )
+import json
+import os
 from pathlib import Path
+from unittest.mock import patch
+import sparc_cli.tools.memory as memory_module
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 def setup_function():
     """Reset global memory before each test."""
@@ -73,6 +92,21 @@ def test_memory_limits_research_notes():
               n['priority'] == MemoryPriority.HIGH 
               for n in notes)
 
+def test_research_notes_sequence_access():
+    """Test indexing and reversal of research notes track appends and evictions."""
+    emit_research_notes("first")
+    emit_research_notes("second")
+
+    notes = _global_memory['research_notes']
+    assert notes[0]['content'] == "first"
+    assert notes[-1]['content'] == "second"
+    assert [n['content'] for n in reversed(notes)] == ["second", "first"]
+
+    emit_research_notes("third")
+    assert notes[-1]['content'] == "third"
+    assert notes.index(notes[1]) == 1
+    assert [n['content'] for n in notes[1:]] == ["second", "third"]
+
 def test_memory_limits_key_facts():
     """Test key facts respect memory limits and prioritization."""
     # Add more facts than the limit
@@ -255,3 +289,410 @@ def test_completion_flags():
     one_shot_completed("One-shot done")
     assert _global_memory['task_completed'] is True
     assert _global_memory['completion_message'] == "One-shot done"
+
+def test_related_files_normalized_dedupe():
+    """Test equivalent paths resolve to a single related file entry."""
+    result = emit_related_files.invoke({"files": ["./a.py", "a.py", "src/../b.py"]})
+    assert result.splitlines() == [
+        "File ID #1: a.py",
+        "File ID #1: a.py",
+        "File ID #2: b.py",
+    ]
+    assert len(_global_memory['related_files']) == 2
+    assert _global_memory['related_file_id_counter'] == 3
+
+def test_related_files_registry_reverse_index():
+    """Test the registry keeps its path index in sync with removals."""
+    emit_related_files.invoke({"files": ["a.py", "b.py"]})
+    registry = _global_memory['related_files']
+    assert registry.get_id("./b.py") == 2
+
+    deregister_related_files.invoke({"file_ids": [2, 99]})
+    assert registry.get_id("b.py") is None
+    assert get_related_files() == ["ID#1 a.py"]
+
+    # Re-adding a removed path assigns a fresh ID
+    result = emit_related_files.invoke({"files": ["b.py"]})
+    assert result == "File ID #3: b.py"
+
+def test_key_snippets_register_related_files():
+    """Test snippets register their files through the registry."""
+    emit_related_files.invoke({"files": ["./pkg/mod.py"]})
+    emit_key_snippets.invoke({"snippets": [{
+        'filepath': 'pkg/mod.py',
+        'line_number': 1,
+        'snippet': 'x = 1',
+        'description': None
+    }]})
+    assert get_related_files() == ["ID#1 pkg/mod.py"]
+
+def test_prioritized_memory_evicts_lowest_priority_oldest():
+    """Test heap eviction order is (priority, timestamp) ascending."""
+    items = PrioritizedMemory(limit=2)
+    items[1] = {'content': 'old low', 'priority': MemoryPriority.LOW, 'timestamp': '2024-01-01'}
+    items[2] = {'content': 'new low', 'priority': MemoryPriority.LOW, 'timestamp': '2024-01-02'}
+    items[3] = {'content': 'old high', 'priority': MemoryPriority.HIGH, 'timestamp': '2024-01-01'}
+
+    evicted = items.evict()
+    assert [key for key, _ in evicted] == [1]
+    assert sorted(items) == [2, 3]
+
+def test_prioritized_memory_skips_deleted_items():
+    """Test deleted and replaced items do not cause wrong evictions."""
+    items = PrioritizedMemory(limit=1)
+    items[1] = {'content': 'a', 'priority': MemoryPriority.LOW, 'timestamp': '2024-01-01'}
+    items[2] = {'content': 'b', 'priority': MemoryPriority.MEDIUM, 'timestamp': '2024-01-02'}
+    del items[1]
+    # Re-prioritize #2 so its old heap entry becomes stale
+    items[2] = {'content': 'b', 'priority': MemoryPriority.CRITICAL, 'timestamp': '2024-01-02'}
+    items[3] = {'content': 'c', 'priority': MemoryPriority.HIGH, 'timestamp': '2024-01-03'}
+
+    evicted = items.evict()
+    assert [key for key, _ in evicted] == [3]
+    assert list(items) == [2]
+
+def test_research_notes_keep_insertion_order():
+    """Test evicting notes preserves the order of the remaining notes."""
+    limit = MEMORY_LIMITS['research_notes']
+    emit_research_notes.invoke({"notes": "keep me", "priority": MemoryPriority.HIGH})
+    for i in range(limit):
+        emit_research_notes.invoke({"notes": f"note {i}", "priority": MemoryPriority.LOW})
+
+    notes = _global_memory['research_notes']
+    assert len(notes) == limit
+    assert notes[0]['content'] == "keep me"
+    assert notes[-1]['content'] == f"note {limit - 1}"
+
+def test_set_memory_limits():
+    """Test limits can be overridden per run and trim existing memory."""
+    original = dict(MEMORY_LIMITS)
+    try:
+        emit_key_facts.invoke({"facts": ["a", "b", "c"], "priority": MemoryPriority.LOW})
+        set_memory_limits({'key_facts': 2})
+        assert [f['content'] for f in _global_memory['key_facts'].values()] == ["b", "c"]
+
+        with pytest.raises(ValueError):
+            set_memory_limits({'unknown': 1})
+        with pytest.raises(ValueError):
+            set_memory_limits({'key_facts': 0})
+    finally:
+        MEMORY_LIMITS.update(original)
+
+def test_memory_render_cache_reuses_unchanged_sections():
+    """Test rendered sections are reused until the category changes."""
+    emit_key_facts.invoke({"facts": ["First fact"]})
+    first = get_memory_value('key_facts')
+    assert get_memory_value('key_facts') is first
+
+    version = _global_memory['key_facts'].version
+    emit_key_facts.invoke({"facts": ["Second fact"]})
+    assert _global_memory['key_facts'].version > version
+    second = get_memory_value('key_facts')
+    assert second is not first
+    assert "Second fact" in second
+
+    delete_key_facts.invoke({"fact_ids": [1]})
+    assert "First fact" not in get_memory_value('key_facts')
+
+def test_related_files_render_cache_returns_copies():
+    """Test cached related file listings cannot be mutated by callers."""
+    emit_related_files.invoke({"files": ["a.py"]})
+    files = get_related_files()
+    files.append("bogus")
+    assert get_related_files() == ["ID#1 a.py"]
+
+    emit_related_files.invoke({"files": ["b.py"]})
+    assert get_related_files() == ["ID#1 a.py", "ID#2 b.py"]
+
+def test_memory_store_context_isolation():
+    """Test a scoped memory store isolates reads and writes."""
+    emit_key_facts.invoke({"facts": ["Default fact"]})
+
+    with use_memory_store(MemoryStore()) as store:
+        assert get_memory_store() is store
+        assert get_memory_value('key_facts') == ""
+        emit_key_facts.invoke({"facts": ["Scoped fact"]})
+        assert "Scoped fact" in get_memory_value('key_facts')
+        assert _global_memory['key_fact_id_counter'] == 2
+
+    value = get_memory_value('key_facts')
+    assert "Default fact" in value
+    assert "Scoped fact" not in value
+
+def test_memory_store_threads_get_isolated_memory():
+    """Test concurrent agents in separate stores do not share state."""
+    barrier = threading.Barrier(4)
+
+    def worker(n):
+        with use_memory_store(MemoryStore()):
+            barrier.wait()
+            emit_task.invoke({"task": f"task {n}"})
+            _global_memory['completion_message'] = f"done {n}"
+            barrier.wait()
+            return dict(_global_memory['tasks']), _global_memory['completion_message']
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(worker, range(4)))
+
+    for n, (tasks, message) in enumerate(results):
+        assert tasks == {1: f"task {n}"}
+        assert message == f"done {n}"
+    assert _global_memory['tasks'] == {}
+
+def test_memory_store_counters_are_atomic():
+    """Test ID counters do not hand out duplicates under contention."""
+    store = MemoryStore()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(lambda _: store.next_id('task_id_counter'), range(500)))
+
+    assert sorted(ids) == list(range(1, 501))
+    assert store.increment('agent_depth') == 1
+    assert store.increment('agent_depth', -1) == 0
+
+def test_pack_memory_section_keeps_highest_priority_newest():
+    """Test packing fills the budget by priority, then recency."""
+    emit_key_facts.invoke({"facts": ["low " + "x" * 200], "priority": MemoryPriority.LOW})
+    emit_key_facts.invoke({"facts": ["critical fact"], "priority": MemoryPriority.CRITICAL})
+    emit_key_facts.invoke({"facts": ["old medium"], "priority": MemoryPriority.MEDIUM})
+    emit_key_facts.invoke({"facts": ["new medium"], "priority": MemoryPriority.MEDIUM})
+
+    packed = pack_memory_section('key_facts', budget=30)
+    assert packed.included == [2, 4]
+    assert packed.dropped == [1, 3]
+    assert "critical fact" in packed.text
+    assert "new medium" in packed.text
+    assert "old medium" not in packed.text
+    assert "2 lower-priority key facts omitted" in packed.text
+    # Kept items are rendered in ID order
+    assert packed.text.index("Key Fact #2") < packed.text.index("Key Fact #4")
+
+def test_pack_memory_section_within_budget_matches_full_render():
+    """Test packing is lossless when everything fits."""
+    emit_key_facts.invoke({"facts": ["a", "b"]})
+    packed = pack_memory_section('key_facts', budget=10000)
+    assert packed.dropped == []
+    assert packed.text == get_memory_value('key_facts')
+
+def test_pack_memory_section_note_fits_budget():
+    """Test the omitted-items note counts against the budget and lists few IDs."""
+    limit = MEMORY_LIMITS['key_facts']
+    emit_key_facts.invoke({"facts": [f"fact number {i}" for i in range(limit)]})
+
+    for budget in (5, 20, 50, 200):
+        packed = pack_memory_section('key_facts', budget=budget)
+        assert packed.tokens <= budget
+        assert len(packed.included) + len(packed.dropped) == limit
+
+    packed = pack_memory_section('key_facts', budget=200)
+    assert f"+{len(packed.dropped) - MAX_OMITTED_IDS_SHOWN} more" in packed.text
+
+def test_pack_memory_section_skips_oversized_items():
+    """Test an oversized item does not block smaller lower-ranked ones."""
+    emit_research_notes.invoke({"notes": "y" * 400, "priority": MemoryPriority.HIGH})
+    emit_research_notes.invoke({"notes": "short note", "priority": MemoryPriority.LOW})
+
+    packed = pack_memory_section('research_notes', budget=20)
+    assert packed.included == [1]
+    assert packed.dropped == [0]
+    assert packed.text.startswith("short note")
+
+    with pytest.raises(ValueError):
+        pack_memory_section('plans')
+
+def _snippet(line_number, snippet, filepath='mod.py', description=None):
+    return {
+        'filepath': filepath,
+        'line_number': line_number,
+        'snippet': snippet,
+        'description': description
+    }
+
+def test_key_snippets_merge_overlapping_and_adjacent():
+    """Test overlapping and adjacent snippets of a file merge into one entry."""
+    emit_key_snippets.invoke({"snippets": [_snippet(10, "a\nb\nc", description="first")]})
+    emit_key_snippets.invoke({"snippets": [_snippet(12, "C\nd", description="second")],
+                              "priority": MemoryPriority.HIGH})
+    emit_key_snippets.invoke({"snippets": [_snippet(14, "e")]})
+    emit_key_snippets.invoke({"snippets": [_snippet(30, "far away")]})
+    emit_key_snippets.invoke({"snippets": [_snippet(10, "a", filepath="other.py")]})
+
+    snippets = _global_memory['key_snippets']
+    assert sorted(snippets) == [1, 2, 3]
+    merged = snippets[1]
+    assert merged['line_number'] == 10
+    assert merged['snippet'] == "a\nb\nC\nd\ne"
+    assert merged['priority'] == MemoryPriority.HIGH
+    assert merged['description'] == "first\n\nsecond"
+    assert snippets.overlapping('./mod.py', 15, 15) == [1]
+    assert snippets.overlapping('mod.py', 16, 28) == []
+
+def test_key_snippets_bridge_and_duplicates():
+    """Test a snippet bridging two entries merges them, and duplicates are skipped."""
+    emit_key_snippets.invoke({"snippets": [_snippet(1, "one\ntwo")]})
+    emit_key_snippets.invoke({"snippets": [_snippet(5, "five")]})
+    emit_key_snippets.invoke({"snippets": [_snippet(3, "three\nfour")]})
+
+    snippets = _global_memory['key_snippets']
+    assert list(snippets) == [1]
+    assert snippets[1]['snippet'] == "one\ntwo\nthree\nfour\nfive"
+
+    version = snippets.version
+    emit_key_snippets.invoke({"snippets": [_snippet(2, "two\nthree")]})
+    assert snippets.version == version
+    emit_key_snippets.invoke({"snippets": [_snippet(2, "two\nthree")], "priority": MemoryPriority.CRITICAL})
+    assert snippets[1]['priority'] == MemoryPriority.CRITICAL
+    assert snippets[1]['snippet'] == "one\ntwo\nthree\nfour\nfive"
+
+    delete_key_snippets.invoke({"snippet_ids": [1]})
+    assert snippets.overlapping('mod.py', 1, 5) == []
+
+def _write_source(path, text, mtime):
+    path.write_text(text)
+    os.utime(path, (mtime, mtime))
+
+def test_key_snippets_follow_moved_lines(tmp_path):
+    """Test snippets are re-anchored when their file changes."""
+    source = tmp_path / "mod.py"
+    _write_source(source, "import os\n\ndef f():\n    return 1\n", 1000)
+    emit_key_snippets.invoke({"snippets": [_snippet(3, "def f():\n    return 1", filepath=str(source))]})
+    snippet = _global_memory['key_snippets'][1]
+    assert snippet['mtime'] == 1000
+    assert snippet['content_hash']
+
+    # Lines moved down
+    _write_source(source, "import os\nimport sys\n\ndef f():\n    return 1\n", 2000)
+    assert refresh_key_snippets() == [1]
+    assert _global_memory['key_snippets'][1]['line_number'] == 4
+
+    # Body changed, re-sliced around the first line
+    _write_source(source, "import os\nimport sys\n\ndef f():\n    return 2\n", 3000)
+    assert "return 2" in get_memory_value('key_snippets')
+
+    # Anchor gone
+    _write_source(source, "import os\n", 4000)
+    assert "Stale" in get_memory_value('key_snippets')
+    assert _global_memory['key_snippets'][1]['stale'] is True
+
+def test_key_snippets_unchanged_files_are_not_read(tmp_path):
+    """Test rendering only stats files whose snippets are up to date."""
+    source = tmp_path / "mod.py"
+    _write_source(source, "a = 1\n", 1000)
+    emit_key_snippets.invoke({"snippets": [_snippet(1, "a = 1", filepath=str(source))]})
+
+    with patch.object(memory_module, '_read_source', wraps=memory_module._read_source) as read:
+        get_memory_value('key_snippets')
+        assert read.call_count == 0
+        os.utime(source, (2000, 2000))  # Touched, contents unchanged
+        get_memory_value('key_snippets')
+        assert read.call_count == 1
+        assert not _global_memory['key_snippets'][1].get('stale')
+
+def test_key_snippets_drop_stale(tmp_path, monkeypatch):
+    """Test stale snippets are dropped when configured."""
+    monkeypatch.setattr(memory_module, 'STALE_SNIPPET_POLICY', 'drop')
+    source = tmp_path / "mod.py"
+    _write_source(source, "a = 1\n", 1000)
+    emit_key_snippets.invoke({"snippets": [_snippet(1, "a = 1", filepath=str(source))]})
+    source.unlink()
+    assert refresh_key_snippets() == [1]
+    assert len(_global_memory['key_snippets']) == 0
+
+def test_work_log_is_structured_ring_buffer():
+    """Test work log events carry structure and drop the oldest when full."""
+    memory_module._enforce_memory_limit('work_log')
+    emit_task.invoke({"task": "Task 1"})
+    log = _global_memory['work_log']
+    assert isinstance(log, memory_module.WorkLog)
+    assert log[-1]['kind'] == 'task'
+    assert log[-1]['tool'] == 'emit_task'
+    assert log[-1]['refs'] == {'tasks': [1]}
+
+    limit = MEMORY_LIMITS['work_log']
+    for i in range(limit + 5):
+        memory_module.log_work_event(f"Event {i}")
+    assert len(log) == limit
+    assert log[0]['event'] == "Event 5"
+    assert log[-1]['event'] == f"Event {limit + 4}"
+
+def test_work_span_and_jsonl_export(tmp_path):
+    """Test timed spans are logged with duration and exported as JSON lines."""
+    with memory_module.work_span('agent', "Research: db", tool='request_research') as span:
+        span['tokens'] = 42
+    entry = _global_memory['work_log'][-1]
+    assert entry['duration'] >= 0
+    assert entry['tokens'] == 42
+    assert "request_research" in get_work_log()
+
+    path = tmp_path / "work_log.jsonl"
+    jsonl = memory_module.export_work_log(str(path))
+    assert path.read_text() == jsonl
+    assert [json.loads(line)['kind'] for line in jsonl.splitlines()] == ['agent']
+
+def test_memory_diff_reports_only_changes():
+    """Test diffs against a snapshot include only new, changed and removed items."""
+    emit_key_facts.invoke({"facts": ["kept", "removed"]})
+    emit_research_notes.invoke({"notes": "old note"})
+    snapshot = snapshot_memory()
+    assert diff_memory(snapshot).empty
+
+    emit_key_facts.invoke({"facts": ["new fact"]})
+    delete_key_facts.invoke({"fact_ids": [2]})
+    emit_research_notes.invoke({"notes": "new note"})
+    emit_related_files.invoke({"files": ["a.py"]})
+
+    changes = render_memory_diff(diff_memory(snapshot))
+    assert "new fact" in changes['key_facts']
+    assert "kept" not in changes['key_facts']
+    assert changes['research_notes'] == "new note"
+    assert changes['related_files'] == ["ID#1 a.py"]
+    assert changes['removed'] == {'key_facts': [2]}
+    assert 'key_snippets' not in changes
+
+def test_read_memory_returns_full_sections():
+    """Test read_memory returns complete sections and rejects unknown ones."""
+    emit_key_facts.invoke({"facts": ["a fact"]})
+    view = read_memory.invoke({"sections": ["key_facts", "related_files"]})
+    assert view == {'key_facts': get_memory_value('key_facts'), 'related_files': []}
+    assert 'error' in read_memory.invoke({"sections": ["plans"]})
+
+def test_fork_and_merge_memory():
+    """Test a forked store is isolated and merges back without duplicates."""
+    from sparc_cli.tools.memory import fork_memory_store, merge_memory
+    emit_key_facts.invoke({"facts": ["shared fact"]})
+    child = fork_memory_store()
+    with use_memory_store(child):
+        snapshot = snapshot_memory()
+        emit_key_facts.invoke({"facts": ["shared fact", "child fact"]})
+        emit_related_files.invoke({"files": ["child.py"]})
+        diff = diff_memory(snapshot)
+    assert len(_global_memory['key_facts']) == 1
+
+    merged = merge_memory(diff, child['work_log'])
+    contents = [fact['content'] for fact in _global_memory['key_facts'].values()]
+    assert contents == ["shared fact", "child fact"]
+    assert merged['key_facts'] == [2]
+    assert get_related_files() == ["ID#1 child.py"]
+    assert len(_global_memory['work_log']) == 2
+
+def test_emit_task_dependencies():
+    """Test task dependencies are stored and kept consistent on delete and swap."""
+    emit_task.invoke({"task": "Add model", "files": ["./models.py"]})
+    emit_task.invoke({"task": "Add view", "depends_on": [1], "files": ["views.py"]})
+    emit_task.invoke({"task": "Add docs", "depends_on": [1, 2]})
+    assert _global_memory['task_deps'][2] == {'depends_on': [1], 'files': ["views.py"]}
+    assert _global_memory['task_deps'][1]['files'] == ["models.py"]
+
+    result = emit_task.invoke({"task": "Bad", "depends_on": [7]})
+    assert "Unknown task ID" in result
+    assert len(_global_memory['tasks']) == 3
+
+    swap_task_order.invoke({"id1": 1, "id2": 2})
+    assert _global_memory['tasks'][1] == "Add view"
+    assert _global_memory['task_deps'][1] == {'depends_on': [2], 'files': ["views.py"]}
+    assert _global_memory['task_deps'][3]['depends_on'] == [2, 1]
+
+    delete_tasks.invoke({"task_ids": [2]})
+    assert 2 not in _global_memory['task_deps']
+    assert _global_memory['task_deps'][1]['depends_on'] == []
+    assert _global_memory['task_deps'][3]['depends_on'] == [1]
@@ -0,0 +1,155 @@
+import json
+import stat
+import sys
+import time
+from unittest.mock import patch
+
+import pytest
+
+from sparc_cli.tools import ripgrep_search
+from sparc_cli.tools.ripgrep import run_json_search
+
+
+def message(kind, path=None, line=None, text=None, start=0):
+    data = {}
+    if path is not None:
+        data['path'] = {'text': path}
+    if line is not None:
+        data['line_number'] = line
+        data['lines'] = {'text': text + "\n"}
+    if kind == 'match':
+        data['submatches'] = [{'match': {'text': 'x'}, 'start': start, 'end': start + 1}]
+    return {'type': kind, 'data': data}
+
+
+def fake_rg(tmp_path, messages, repeat=False):
+    """An executable that prints rg --json messages, forever if repeat is set."""
+    script = tmp_path / "rg"
+    lines = "\n".join(json.dumps(m) for m in messages)
+    loop = "while True:" if repeat else "for _ in range(1):"
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        f"{loop}\n"
+        f"    sys.stdout.write({lines!r} + '\\n')\n"
+        "    sys.stdout.flush()\n"
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return str(script)
+
+
+def test_matches_with_context(tmp_path):
+    """Test matches are parsed into records with their context lines and per-file counts."""
+    rg = fake_rg(tmp_path, [
+        message('begin', 'a.py'),
+        message('context', 'a.py', 1, 'import os'),
+        message('match', 'a.py', 2, 'def foo():', start=4),
+        message('context', 'a.py', 3, '    pass'),
+        message('match', 'a.py', 4, 'foo()'),
+        message('end', 'a.py'),
+        message('begin', 'b.py'),
+        message('match', 'b.py', 10, 'foo = 1'),
+        message('end', 'b.py'),
+        {'type': 'summary', 'data': {}}
+    ])
+    result = run_json_search([rg], context_lines=1)
+
+    first, second, third = result['matches']
+    assert first == {
+        'path': 'a.py', 'line': 2, 'column': 5, 'text': 'def foo():',
+        'before': [{'line': 1, 'text': 'import os'}],
+        'after': [{'line': 3, 'text': '    pass'}]
+    }
+    # A line between two matches is context for both
+    assert second['before'] == [{'line': 3, 'text': '    pass'}]
+    assert third['path'] == 'b.py' and third['before'] == []
+    assert result['file_counts'] == {'a.py': 2, 'b.py': 1}
+    assert result['truncated'] is False
+    assert result['return_code'] == 0
+
+
+def test_stops_at_result_limit(tmp_path):
+    """Test rg is stopped once the result budget is used up, without reading the rest."""
+    rg = fake_rg(tmp_path, [
+        message('begin', 'big.txt'),
+        message('match', 'big.txt', 1, 'x' * 100),
+        message('end', 'big.txt')
+    ], repeat=True)
+
+    start = time.monotonic()
+    result = run_json_search([rg], max_results=5)
+    assert time.monotonic() - start < 10
+    assert len(result['matches']) == 5
+    assert result['truncated'] is True
+    assert result['return_code'] == 0
+
+    result = run_json_search([rg], max_results=1000, max_bytes=250)
+    assert len(result['matches']) == 3
+    assert result['truncated'] is True
+
+
+def test_long_lines_are_cut(tmp_path):
+    """Test overlong matching lines are shortened in records."""
+    rg = fake_rg(tmp_path, [message('begin', 'min.js'), message('match', 'min.js', 1, 'y' * 5000)])
+    text = run_json_search([rg])['matches'][0]['text']
+    assert len(text) < 600 and text.endswith(' ...')
+
+
+def test_ripgrep_search_structured(tmp_path):
+    """Test structured mode passes --json and returns records without a terminal wrapper."""
+    rg = fake_rg(tmp_path, [message('begin', 'a.py'), message('match', 'a.py', 3, 'foo'), message('end', 'a.py')])
+    with patch('sparc_cli.tools.ripgrep.get_rg_command', return_value=rg), \
+            patch('sparc_cli.tools.ripgrep.run_interactive_command') as interactive:
+        result = ripgrep_search.invoke({'pattern': 'foo', 'structured': True})
+
+    interactive.assert_not_called()
+    assert result['success'] is True
+    assert result['matches'][0]['line'] == 3
+    assert result['file_counts'] == {'a.py': 1}
+    assert result['output'] == "1 matching lines in 1 files"
+
+
+def test_ripgrep_search_index_engine(tmp_path, monkeypatch):
+    """Test the index engine searches only candidate files and skips rg when none can match."""
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "a.py").write_text("def load_config():\n    pass\n")
+    (project / "b.py").write_text("def other():\n    pass\n")
+    monkeypatch.chdir(project)
+
+    args_file = tmp_path / "args.json"
+    rg = tmp_path / "rg"
+    rg.write_text(f"#!{sys.executable}\nimport json, sys\njson.dump(sys.argv[1:], open({str(args_file)!r}, 'w'))\n")
+    rg.chmod(rg.stat().st_mode | stat.S_IEXEC)
+
+    with patch('sparc_cli.tools.ripgrep.get_rg_command', return_value=str(rg)):
+        result = ripgrep_search.invoke({'pattern': 'load_config', 'structured': True, 'engine': 'index'})
+        assert json.loads(args_file.read_text())[-2:] == ['load_config', 'a.py']
+        assert result['return_code'] == 0
+
+        args_file.unlink()
+        result = ripgrep_search.invoke({'pattern': 'save_config', 'structured': True, 'engine': 'index'})
+        assert not args_file.exists()
+        assert result['matches'] == [] and result['success'] is False
+
+        result = ripgrep_search.invoke({'pattern': 'x', 'engine': 'zoekt'})
+        assert result['success'] is False and 'Unknown search engine' in result['output']
+
+
+def test_ripgrep_search_index_engine_long_command_line(tmp_path, monkeypatch):
+    """Test the index engine searches the whole tree when candidate paths would overflow the command line."""
+    project = tmp_path / "project"
+    project.mkdir()
+    for i in range(20):
+        (project / f"module_{i:02d}_with_a_long_name.py").write_text("def load_config():\n    pass\n")
+    monkeypatch.chdir(project)
+    monkeypatch.setattr('sparc_cli.tools.ripgrep.MAX_INDEX_ARG_BYTES', 200)
+
+    args_file = tmp_path / "args.json"
+    rg = tmp_path / "rg"
+    rg.write_text(f"#!{sys.executable}\nimport json, sys\njson.dump(sys.argv[1:], open({str(args_file)!r}, 'w'))\n")
+    rg.chmod(rg.stat().st_mode | stat.S_IEXEC)
+
+    with patch('sparc_cli.tools.ripgrep.get_rg_command', return_value=str(rg)):
+        ripgrep_search.invoke({'pattern': 'load_config', 'structured': True, 'engine': 'index'})
+    assert json.loads(args_file.read_text())[-1] == 'load_config'